@@ -1,14 +1,11 @@
 import io
-from datetime import date, datetime
+from datetime import date
 from typing import Optional
 
 import pandas as pd
-import matplotlib.pyplot as plt
 import streamlit as st
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 
-from backend import db
+from backend import bulk_import, charts, db, exports
 
 # ---------- setup ----------
 st.set_page_config(page_title="AgroVet • Métricas", page_icon="🐄", layout="wide")
@@ -42,7 +39,32 @@ st.markdown(
     unsafe_allow_html=True,
 )
 
-db.init_db()
+@st.cache_resource
+def _init_db():
+    db.init_db()
+
+
+# Consultas em cache por (versão dos dados, filtros, ordem). A versão é um
+# contador incrementado por trigger a cada escrita em relatorios, então um
+# lançamento/importação (aqui ou pela API) invalida o cache sozinho.
+@st.cache_data(max_entries=64, show_spinner=False)
+def _primeira_pagina(versao, search, date_from, date_to, order, limit):
+    return db.page_relatorios(search=search, date_from=date_from, date_to=date_to, order=order, limit=limit)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def _kpis(versao, search, date_from, date_to):
+    return db.kpis(search=search, date_from=date_from, date_to=date_to)
+
+
+# PNG pronto (séries reduzidas, top fazendas + "Outras"): num acerto de cache
+# o rerun não toca o SQLite nem o matplotlib.
+@st.cache_data(max_entries=64, show_spinner=False)
+def _grafico(versao, campo, search, date_from, date_to):
+    return charts.grafico_png(campo, search=search, date_from=date_from, date_to=date_to)
+
+
+_init_db()
 
 st.title("🐄 AgroVet • Painel de Métricas (sem OCR)")
 st.caption("Lance métricas reprodutivas, acompanhe KPIs e gere relatórios (PDF/Excel).")
@@ -81,6 +103,26 @@ with st.expander("➕ Lançar métricas da fazenda", expanded=True):
                 )
                 st.success(f"Lançamento salvo (ID {rid}).")
 
+# ---------- importação em massa ----------
+with st.expander("📥 Importar histórico (CSV, XLSX ou NDJSON)"):
+    st.caption("Colunas: fazenda, data, taxa_prenhez, taxa_concepcao, taxa_servico, partos_estimados.")
+    arquivo = st.file_uploader("Arquivo", type=["csv", "xlsx", "ndjson", "jsonl"])
+    ignorar_dup = st.checkbox("Ignorar fazenda + data já cadastradas", value=True)
+    if arquivo is not None and st.button("📥 Importar", use_container_width=True):
+        try:
+            rel = bulk_import.importar(
+                arquivo, formato=bulk_import.detectar_formato(arquivo.name), dedup=ignorar_dup
+            )
+        except Exception as e:
+            st.error(f"Falha na importação: {e}")
+        else:
+            st.success(
+                f"{rel['inseridas']} inseridas, {rel['duplicadas']} duplicadas, "
+                f"{rel['invalidas']} inválidas em {rel['segundos']}s ({rel['linhas_por_s']} linhas/s)."
+            )
+            for erro in rel["erros"]:
+                st.warning(erro)
+
 # ---------- filtros de histórico ----------
 st.markdown("---")
 st.subheader("📚 Histórico & Análises")
@@ -97,18 +139,25 @@ with fcol4:
 
 order_map = {"Mais recentes":"recentes","Mais antigos":"antigos","Nome (A-Z)":"nome"}
 
-cols, rows = db.list_relatorios(
+filtros = dict(
     search=(filtro_nome or None),
     date_from=(str(d_ini) if isinstance(d_ini, date) else None),
     date_to=(str(d_fim) if isinstance(d_fim, date) else None),
-    order=order_map[orden],
-    limit=500
 )
 
-df = pd.DataFrame(rows, columns=cols)
+# Paginação por cursor: a primeira página vem ao mudar os filtros (ou os
+# dados) e "Carregar mais" acrescenta a seguinte sem reler as anteriores.
+PAGINA = 500
+versao = db.versao()
+chave_pag = (versao, tuple(filtros.values()), order_map[orden])
+if st.session_state.get("pag_chave") != chave_pag:
+    cols, rows, cursor = _primeira_pagina(versao, **filtros, order=order_map[orden], limit=PAGINA)
+    st.session_state.update(pag_chave=chave_pag, pag_cols=cols, pag_rows=rows, pag_cursor=cursor)
+
+df = pd.DataFrame(st.session_state.pag_rows, columns=st.session_state.pag_cols)
 
 # ---------- KPIs ----------
-k = db.kpis()
+k = _kpis(versao, **filtros)
 kcol1,kcol2,kcol3,kcol4,kcol5 = st.columns(5)
 kcol1.metric("Registros", k["total_registros"])
 kcol2.metric("Prenhez média", f"{k['media_prenhez']:.1f}%" if k['media_prenhez'] else "—")
@@ -122,121 +171,54 @@ if df.empty:
     st.info("Nenhum registro encontrado.")
 else:
     st.dataframe(df, use_container_width=True, hide_index=True)
+    if st.session_state.pag_cursor:
+        if st.button(f"Carregar mais {PAGINA} registros"):
+            _, mais, cursor = db.page_relatorios(
+                **filtros, order=order_map[orden], limit=PAGINA, cursor=st.session_state.pag_cursor
+            )
+            st.session_state.pag_rows = st.session_state.pag_rows + mais
+            st.session_state.pag_cursor = cursor
+            st.rerun()
 
 # ---------- gráficos ----------
 st.markdown("### 📈 Gráficos")
 
 if not df.empty:
-    df["data"] = pd.to_datetime(df["data"], errors="coerce")
-
     gcol1, gcol2 = st.columns(2)
-
-    # -------- Gráfico 1: Taxa de Prenhez --------
-    with gcol1:
-        fig, ax = plt.subplots(figsize=(6, 4))
-        for fazenda, grp in df.groupby("nome_da_fazenda"):
-            grp = grp.sort_values("data")
-            if "taxa_prenhez" in grp and not grp["taxa_prenhez"].isna().all():
-                ax.plot(
-                    grp["data"],
-                    grp["taxa_prenhez"],
-                    marker="o",
-                    linestyle="-",
-                    label=fazenda,
-                )
-        ax.set_title("Evolução da taxa de prenhez", fontsize=11, pad=12)
-        ax.set_xlabel("Data")
-        ax.set_ylabel("%")
-        ax.grid(True, linestyle="--", alpha=0.4)
-        plt.xticks(rotation=45, ha="right")  # rotação de 45° para evitar sobreposição
-        plt.tight_layout()
-        ax.legend(fontsize=8, loc="best")
-        st.pyplot(fig)
-
-    # -------- Gráfico 2: Taxa de Concepção --------
-    with gcol2:
-        fig2, ax2 = plt.subplots(figsize=(6, 4))
-        for fazenda, grp in df.groupby("nome_da_fazenda"):
-            grp = grp.sort_values("data")
-            if "taxa_concepcao" in grp and not grp["taxa_concepcao"].isna().all():
-                ax2.plot(
-                    grp["data"],
-                    grp["taxa_concepcao"],
-                    marker="o",
-                    linestyle="-",
-                    label=fazenda,
-                )
-        ax2.set_title("Evolução da taxa de concepção", fontsize=11, pad=12)
-        ax2.set_xlabel("Data")
-        ax2.set_ylabel("%")
-        ax2.grid(True, linestyle="--", alpha=0.4)
-        plt.xticks(rotation=45, ha="right")  # rotação aplicada aqui também
-        plt.tight_layout()
-        ax2.legend(fontsize=8, loc="best")
-        st.pyplot(fig2)
+    for coluna, campo in ((gcol1, "taxa_prenhez"), (gcol2, "taxa_concepcao")):
+        png = _grafico(versao, campo, **filtros)
+        with coluna:
+            if png:
+                st.image(png, use_container_width=True)
+            else:
+                st.info("Sem dados para o gráfico.")
 
 
 # ---------- exportações ----------
+# Geradas só ao clicar, sobre o resultado filtrado inteiro (lido do SQLite em
+# lotes); o arquivo fica na sessão enquanto filtros e dados não mudarem.
 st.markdown("### 📤 Exportar")
 
 colx, coly = st.columns(2)
-
-with colx:
-    if not df.empty:
-        buf_xlsx = io.BytesIO()
-        with pd.ExcelWriter(buf_xlsx, engine="openpyxl") as writer:
-            df.to_excel(writer, index=False, sheet_name="Relatórios")
-        buf_xlsx.seek(0)
-        st.download_button(
-            "⬇️ Baixar Excel",
-            data=buf_xlsx,
-            file_name=f"agrovet_relatorios_{datetime.now():%Y%m%d_%H%M}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        )
-    else:
-        st.button("⬇️ Baixar Excel", disabled=True)
-
-with coly:
-    if not df.empty:
-        # Gera PDF simples com ReportLab
-        pdf_bytes = io.BytesIO()
-        c = canvas.Canvas(pdf_bytes, pagesize=A4)
-        w, h = A4
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(40, h-40, "Relatório AgroVet")
-        c.setFont("Helvetica", 10)
-        c.drawString(40, h-60, f"Gerado em: {datetime.now():%d/%m/%Y %H:%M}")
-
-        # Tabela resumida (primeiros 25)
-        y = h-90
-        headers = ["ID","Fazenda","Data","Prenhez","Concepção","Serviço","Partos"]
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(40, y, " | ".join(headers))
-        c.setFont("Helvetica", 9)
-        y -= 16
-        for _, row in df.head(25).iterrows():
-            line = f"{row['id']} | {row['nome_da_fazenda']} | {row['data']:%Y-%m-%d} | " \
-                   f"{row['taxa_prenhez'] if pd.notna(row['taxa_prenhez']) else '—'} | " \
-                   f"{row['taxa_concepcao'] if pd.notna(row['taxa_concepcao']) else '—'} | " \
-                   f"{row['taxa_servico'] if pd.notna(row['taxa_servico']) else '—'} | " \
-                   f"{row['partos_estimados'] if pd.notna(row['partos_estimados']) else '—'}"
-            c.drawString(40, y, line)
-            y -= 14
-            if y < 60:
-                c.showPage()
-                y = h-40
-        c.showPage()
-        c.save()
-        pdf_bytes.seek(0)
-
-        st.download_button(
-            "⬇️ Baixar PDF",
-            data=pdf_bytes,
-            file_name=f"agrovet_relatorio_{datetime.now():%Y%m%d_%H%M}.pdf",
-            mime="application/pdf",
-        )
-    else:
-        st.button("⬇️ Baixar PDF", disabled=True)
+for coluna, formato, rotulo in ((colx, "xlsx", "Excel"), (coly, "pdf", "PDF")):
+    with coluna:
+        chave_exp = (chave_pag, formato)
+        pronto = st.session_state.get(f"export_{formato}")
+        if df.empty:
+            st.button(f"⬇️ Baixar {rotulo}", disabled=True)
+        elif pronto and pronto[0] == chave_exp:
+            st.download_button(
+                f"⬇️ Baixar {rotulo}",
+                data=pronto[1],
+                file_name=exports.nome_arquivo(formato),
+                mime=exports.FORMATOS[formato][0],
+            )
+        elif st.button(f"⚙️ Gerar {rotulo}"):
+            buf = io.BytesIO()
+            with st.spinner(f"Gerando {rotulo}..."):
+                exports.exportar(formato, buf, **filtros, order=order_map[orden])
+            st.session_state[f"export_{formato}"] = (chave_exp, buf.getvalue())
+            st.rerun()
 
 st.markdown("---")
 st.caption("Pronto para produção: SQLite + Excel/PDF + Gráficos. OCR pode ser plugado depois (Gemini/GPT-4o Vision).")
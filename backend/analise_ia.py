@@ -0,0 +1,297 @@
+"""
+Análise textual das métricas para os relatórios PDF.
+
+O texto heurístico (regras simples sobre as taxas) sai na hora. Se houver um
+modelo configurado (OpenAI ou qualquer servidor compatível via
+OPENAI_BASE_URL, como Ollama/LM Studio), a chamada roda em segundo plano e,
+quando a resposta chega, quem pediu é avisado por callback para trocar o texto
+(report_queue re-renderiza o PDF). Assim o tempo de geração do relatório
+nunca depende do modelo estar lento ou fora do ar.
+
+As respostas ficam na tabela ``analise_ia_cache`` do SQLite, indexadas pelas
+métricas normalizadas (+ endpoint, modelo e versão do prompt): o mesmo conjunto de
+indicadores não gera uma segunda chamada. Cada chamada tem timeout, sem
+retentativas, e um semáforo limita quantas rodam ao mesmo tempo.
+
+Configuração por variáveis de ambiente:
+  OPENAI_API_KEY / OPENAI_BASE_URL   habilitam o modelo (basta uma das duas)
+  OPENAI_MODEL                       modelo (padrão gpt-3.5-turbo)
+  IA_TIMEOUT                         segundos por chamada (padrão 15)
+  IA_MAX_CONCORRENTES                chamadas simultâneas (padrão 2)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from backend import db
+
+DDL = """
+CREATE TABLE IF NOT EXISTS analise_ia_cache (
+  chave TEXT PRIMARY KEY,
+  texto TEXT NOT NULL,
+  modelo TEXT,
+  segundos REAL,
+  criado_em REAL NOT NULL
+);
+"""
+
+# Sobe quando o prompt muda, para não servir respostas do prompt antigo
+PROMPT_VERSION = "1"
+MODELO = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+TIMEOUT_S = float(os.getenv("IA_TIMEOUT", "15"))
+MAX_CONCORRENTES = int(os.getenv("IA_MAX_CONCORRENTES", "2"))
+MAX_TOKENS = 250
+
+CAMPOS = ("nome_da_fazenda", "taxa_prenhez", "taxa_concepcao", "taxa_servico", "partos_estimados")
+
+_semaforo = threading.BoundedSemaphore(max(1, MAX_CONCORRENTES))
+_lock = threading.Lock()
+_em_andamento: Dict[str, list] = {}  # chave -> callbacks esperando a resposta
+_executor: Optional[ThreadPoolExecutor] = None
+_clientes: Dict[Optional[str], Any] = {}  # base_url -> cliente OpenAI
+_schema_pronto: set = set()
+_stats = {"cache_hits": 0, "chamadas": 0, "falhas": 0, "ocupado": 0}
+
+
+def habilitado(base_url: Optional[str] = None) -> bool:
+    return bool(base_url or os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_BASE_URL"))
+
+
+def _init() -> None:
+    if str(db.DB_PATH) not in _schema_pronto:
+        with db.conn() as c:
+            c.executescript(DDL)
+        _schema_pronto.add(str(db.DB_PATH))
+
+
+def _endpoint(base_url: Optional[str] = None) -> Optional[str]:
+    # ``base_url`` explícito (ex.: script apontando para um Ollama local) não
+    # mexe no ambiente do processo; sem ele vale OPENAI_BASE_URL
+    return base_url or os.getenv("OPENAI_BASE_URL") or None
+
+
+def _contar(evento: str) -> None:
+    with _lock:
+        _stats[evento] += 1
+
+
+def _get_cliente(base_url: Optional[str] = None):
+    url = _endpoint(base_url)
+    with _lock:
+        if url not in _clientes:
+            from openai import OpenAI
+
+            _clientes[url] = OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY") or "dummy-key",
+                base_url=url,
+                timeout=TIMEOUT_S,
+                max_retries=0,
+            )
+        return _clientes[url]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, MAX_CONCORRENTES), thread_name_prefix="analise-ia")
+        return _executor
+
+
+# ==========================================================
+# 🔑 Normalização e cache
+# ==========================================================
+def normalizar(metrics: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Só os campos que entram no prompt: nome sem espaços extras/minúsculo e
+    números arredondados a 1 casa (80 e 80.0 são a mesma análise).
+    """
+    norm: Dict[str, Any] = {}
+    for campo in CAMPOS:
+        v = metrics.get(campo)
+        if isinstance(v, (int, float)) and not isinstance(v, bool):
+            v = round(float(v), 1)
+        elif isinstance(v, str):
+            v = " ".join(v.split()).lower()
+        norm[campo] = v
+    return norm
+
+
+def chave(metrics: Dict[str, Any], base_url: Optional[str] = None) -> str:
+    # O endpoint entra na chave: o mesmo nome de modelo num Ollama local e na
+    # OpenAI são respostas diferentes
+    base = json.dumps(
+        [PROMPT_VERSION, _endpoint(base_url), MODELO, normalizar(metrics)], sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(base.encode()).hexdigest()
+
+
+def _cache_get(k: str) -> Optional[str]:
+    _init()
+    row = db.conn().execute("SELECT texto FROM analise_ia_cache WHERE chave=?", (k,)).fetchone()
+    return row[0] if row else None
+
+
+def _cache_put(k: str, texto: str, segundos: float) -> None:
+    with db.conn() as c:
+        c.execute(
+            "INSERT OR REPLACE INTO analise_ia_cache (chave, texto, modelo, segundos, criado_em) VALUES (?, ?, ?, ?, ?)",
+            (k, texto, MODELO, round(segundos, 3), time.time()),
+        )
+
+
+# ==========================================================
+# 🧮 Heurística
+# ==========================================================
+def heuristica(metrics: Dict[str, Any]) -> str:
+    farm = metrics.get("nome_da_fazenda", "Fazenda")
+    prenhez = metrics.get("taxa_prenhez")
+    concepcao = metrics.get("taxa_concepcao")
+    servico = metrics.get("taxa_servico")
+    partos = metrics.get("partos_estimados")
+
+    base = [f"Fazenda: {farm}."]
+    if prenhez is not None:
+        base.append(f"Taxa de prenhez: {prenhez}%.")
+    if concepcao is not None:
+        base.append(f"Taxa de concepcao: {concepcao}%.")
+    if servico is not None:
+        base.append(f"Taxa de servico: {servico}%.")
+    if partos is not None:
+        base.append(f"Partos estimados: {partos}.")
+
+    recomend = []
+    if isinstance(prenhez, (int, float)):
+        if prenhez >= 75:
+            recomend.append("Prenhez em bom patamar. Manter protocolo e sanidade.")
+        else:
+            recomend.append("Prenhez abaixo do ideal. Avaliar nutrição, cio e protocolos.")
+    if isinstance(concepcao, (int, float)) and concepcao < 70:
+        recomend.append("Concepcao moderada/baixa. Verificar manejo de IA e condição corporal.")
+    if isinstance(servico, (int, float)) and servico < 80:
+        recomend.append("Taxa de servico pode melhorar com detecção de cio e calendário mais rígido.")
+
+    return " ".join(base + ["Recomendações:"] + recomend) if recomend else " ".join(base)
+
+
+# ==========================================================
+# 🧠 Modelo
+# ==========================================================
+def _prompt(metrics: Dict[str, Any]) -> str:
+    # Só as métricas normalizadas entram no prompt, para a chave do cache
+    # cobrir tudo o que influencia a resposta.
+    indicadores = "\n".join(f"- {k}: {v}" for k, v in normalizar(metrics).items() if v is not None)
+    return (
+        "Você é um zootecnista. Analise os indicadores abaixo e gere um parecer "
+        f"curto, claro e acionável:\n{indicadores}"
+    )
+
+
+def consultar_modelo(
+    metrics: Dict[str, Any],
+    espera_vaga_s: float = 0.0,
+    base_url: Optional[str] = None,
+) -> Optional[str]:
+    """
+    Resposta do modelo (do cache, se houver). None se o modelo não estiver
+    configurado, falhar, estourar o timeout ou não houver vaga no semáforo
+    dentro de ``espera_vaga_s``. ``base_url`` troca o endpoint só nesta chamada.
+    """
+    k = chave(metrics, base_url)
+    texto = _cache_get(k)
+    if texto is not None:
+        _contar("cache_hits")
+        return texto
+    if not habilitado(base_url):
+        return None
+    if espera_vaga_s > 0:
+        vaga = _semaforo.acquire(timeout=espera_vaga_s)
+    else:
+        vaga = _semaforo.acquire(blocking=False)
+    if not vaga:
+        _contar("ocupado")
+        return None
+    try:
+        _contar("chamadas")
+        t0 = time.perf_counter()
+        resp = _get_cliente(base_url).chat.completions.create(
+            model=MODELO,
+            messages=[{"role": "user", "content": _prompt(metrics)}],
+            max_tokens=MAX_TOKENS,
+        )
+        texto = (resp.choices[0].message.content or "").strip()
+    except Exception:
+        _contar("falhas")
+        return None
+    finally:
+        _semaforo.release()
+    if not texto:
+        return None
+    _cache_put(k, texto, time.perf_counter() - t0)
+    return texto
+
+
+def _em_segundo_plano(k: str, metrics: Dict[str, Any], base_url: Optional[str] = None) -> None:
+    # Espera vaga no semáforo (estamos fora da requisição) e avisa todos os
+    # callbacks registrados para esta chave enquanto a chamada rodava.
+    texto = consultar_modelo(metrics, espera_vaga_s=TIMEOUT_S, base_url=base_url)
+    with _lock:
+        callbacks = _em_andamento.pop(k, [])
+    if texto is None:
+        return
+    for cb in callbacks:
+        try:
+            cb(texto)
+        except Exception:
+            pass
+
+
+def analisar(
+    metrics: Dict[str, Any],
+    ao_atualizar: Optional[Callable[[str], None]] = None,
+    esperar: bool = False,
+    base_url: Optional[str] = None,
+) -> str:
+    """
+    Texto de análise para o relatório, sem bloquear no modelo:
+    - resposta do modelo já em cache -> ela;
+    - ``esperar=True`` (scripts) -> chama o modelo agora, com timeout;
+    - senão -> heurística agora e, se houver modelo, consulta em segundo
+      plano; ``ao_atualizar(texto)`` é chamado quando a resposta chegar.
+    """
+    k = chave(metrics, base_url)
+    texto = _cache_get(k)
+    if texto is not None:
+        _contar("cache_hits")
+        return texto
+    if esperar:
+        return consultar_modelo(metrics, espera_vaga_s=TIMEOUT_S, base_url=base_url) or heuristica(metrics)
+    if habilitado(base_url):
+        with _lock:
+            novo = k not in _em_andamento
+            lista = _em_andamento.setdefault(k, [])
+            if ao_atualizar is not None:
+                lista.append(ao_atualizar)
+        if novo:
+            _get_executor().submit(_em_segundo_plano, k, metrics, base_url)
+    return heuristica(metrics)
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        contagens, em_andamento = dict(_stats), len(_em_andamento)
+    return {**contagens, "habilitado": habilitado(), "modelo": MODELO, "em_andamento": em_andamento}
+
+
+def shutdown(wait: bool = False) -> None:
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=not wait)
+            _executor = None
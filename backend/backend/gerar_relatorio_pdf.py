@@ -3,6 +3,10 @@ import json
 from datetime import datetime
 import os
 
+from backend import analise_ia
+
+BASE_URL_LOCAL = "http://127.0.0.1:11434/v1"
+
 class PDF(FPDF):
     def header(self):
         self.set_font("Arial", "B", 16)
@@ -10,12 +14,10 @@ class PDF(FPDF):
         self.ln(5)
 
 def gerar_relatorio_pdf(dados_ocr: dict, nome_arquivo="relatorio_agrovet.pdf"):
-    from openai import OpenAI
-
-    # 🔗 Detecta se há API local (Ollama/LM Studio) ou OpenAI oficial
-    base_url = os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:11434/v1")
-    api_key = os.getenv("OPENAI_API_KEY", "dummy-key")
-    client = OpenAI(api_key=api_key, base_url=base_url)
+    # 🔗 API local (Ollama/LM Studio) se não houver outra configurada, passada
+    # só para esta chamada (sem alterar o ambiente do processo); timeout,
+    # cache e limite de concorrência ficam em analise_ia
+    base_url = os.getenv("OPENAI_BASE_URL") or BASE_URL_LOCAL
 
     pdf = PDF()
     pdf.add_page()
@@ -28,37 +30,18 @@ def gerar_relatorio_pdf(dados_ocr: dict, nome_arquivo="relatorio_agrovet.pdf"):
     pdf.set_font("Arial", "", 12)
 
     metricas = dados_ocr.get("métricas", {})
-    texto_metricas = ""
     for chave, valor in metricas.items():
         linha = f"{chave.replace('_', ' ').capitalize()}: {valor}"
         pdf.cell(0, 10, linha, ln=True)
-        texto_metricas += linha + "\n"
 
     pdf.ln(8)
     pdf.set_font("Arial", "B", 14)
     pdf.cell(0, 10, "ANALISE INTELIGENTE (IA REAL):", ln=True)
     pdf.set_font("Arial", "", 12)
 
-    # 🧠 Geração da análise via modelo
-    prompt = f"""
-    Você é um assistente agropecuário. Analise os seguintes dados zootécnicos e gere um breve parecer técnico:
-    {texto_metricas}
-
-    Diga:
-    - Se os resultados estão dentro do esperado;
-    - O que pode estar bom ou ruim;
-    - Recomendações de manejo e observações.
-    """
-
-    try:
-        resposta = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-        )
-        texto_ia = resposta.choices[0].message.content.strip()
-    except Exception as e:
-        texto_ia = f"[ERRO] Não foi possível gerar análise via IA. Detalhe: {e}"
+    # 🧠 Geração da análise via modelo (script: espera a resposta, com timeout;
+    # se o modelo falhar, usa o texto heurístico)
+    texto_ia = analise_ia.analisar(metricas, esperar=True, base_url=base_url)
 
     pdf.multi_cell(0, 8, texto_ia)
     pdf.output(nome_arquivo)
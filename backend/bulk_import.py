@@ -0,0 +1,267 @@
+"""
+Importação em massa do histórico reprodutivo (CSV, XLSX ou NDJSON).
+
+As linhas são lidas em streaming, validadas uma a uma e gravadas em lotes
+grandes com ``executemany`` (backend/db.py::insert_relatorios_bulk). Com
+``dedup`` ligado, uma linha cuja fazenda + data já existe no banco (ou apareceu
+antes no mesmo arquivo) é ignorada.
+
+Uso pela linha de comando (na raiz do repositório):
+
+    python -m backend.bulk_import historico.xlsx [--sem-dedup] [--lote 5000]
+"""
+from __future__ import annotations
+
+import argparse
+import codecs
+import csv
+import itertools
+import json
+import time
+import unicodedata
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple, Union
+
+from backend import db
+from backend.metrics_parser import para_numero
+
+FORMATOS = ("csv", "xlsx", "ndjson")
+LOTE_PADRAO = 5000
+MAX_ERROS_RELATADOS = 20
+
+# Cabeçalho normalizado (sem acento, "de/da/do" e "%") -> coluna de relatorios
+_ALIASES = {
+    "nome_fazenda": "nome_da_fazenda", "fazenda": "nome_da_fazenda", "nome": "nome_da_fazenda",
+    "data": "data", "data_lancamento": "data", "dt": "data",
+    "taxa_prenhez": "taxa_prenhez", "prenhez": "taxa_prenhez",
+    "taxa_concepcao": "taxa_concepcao", "concepcao": "taxa_concepcao",
+    "taxa_servico": "taxa_servico", "servico": "taxa_servico",
+    "partos_estimados": "partos_estimados", "partos": "partos_estimados",
+}
+_TAXAS = ("taxa_prenhez", "taxa_concepcao", "taxa_servico")
+_FORMATOS_DATA = ("%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d %H:%M:%S", "%d-%m-%Y")
+
+Fonte = Union[str, Path, BinaryIO]
+
+
+def _normalizar_cabecalho(nome: Any) -> str:
+    txt = unicodedata.normalize("NFKD", str(nome or "")).encode("ascii", "ignore").decode()
+    txt = txt.strip().lower().replace("%", "").replace("(", "").replace(")", "")
+    return "_".join(p for p in txt.replace("_", " ").split() if p not in ("de", "da", "do"))
+
+
+def detectar_formato(nome_arquivo: str) -> str:
+    ext = Path(nome_arquivo).suffix.lower().lstrip(".")
+    if ext in ("jsonl", "ndjson", "json"):
+        return "ndjson"
+    if ext in ("xlsx", "xlsm"):
+        return "xlsx"
+    if ext in ("csv", "txt"):
+        return "csv"
+    raise ValueError(f"Formato não suportado: .{ext} (use CSV, XLSX ou NDJSON)")
+
+
+# ==========================================================
+# 📖 Leitores (streaming)
+# ==========================================================
+def _abrir_binario(fonte: Fonte) -> BinaryIO:
+    return open(fonte, "rb") if isinstance(fonte, (str, Path)) else fonte
+
+
+# Os leitores devolvem (nº da linha no arquivo, dict da linha); uma linha que não
+# dá para decodificar vem como ValueError e conta como inválida, sem
+# interromper a importação (lotes anteriores já foram gravados).
+Linha = Tuple[int, Union[Dict[str, Any], ValueError]]
+
+
+def _linhas_texto(fonte: Fonte) -> Iterator[str]:
+    # UTF-8 por padrão; linha que não é UTF-8 válido é lida como cp1252 (o
+    # CSV que o Excel exporta em português no Windows)
+    for i, bruta in enumerate(_abrir_binario(fonte)):
+        if i == 0 and bruta.startswith(codecs.BOM_UTF8):
+            bruta = bruta[len(codecs.BOM_UTF8):]
+        try:
+            yield bruta.decode("utf-8")
+        except UnicodeDecodeError:
+            yield bruta.decode("cp1252", errors="replace")
+
+
+def _ler_csv(fonte: Fonte) -> Iterator[Linha]:
+    linhas = _linhas_texto(fonte)
+    amostra = list(itertools.islice(linhas, 50))
+    try:
+        dialeto = csv.Sniffer().sniff("".join(amostra), delimiters=",;\t")
+    except csv.Error:
+        dialeto = csv.excel
+    leitor = csv.DictReader(itertools.chain(amostra, linhas), dialect=dialeto)
+    while True:
+        try:
+            bruta = next(leitor)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield leitor.line_num, ValueError(f"CSV malformado: {e}")
+            continue
+        yield leitor.line_num, bruta
+
+
+def _ler_xlsx(fonte: Fonte) -> Iterator[Linha]:
+    from openpyxl import load_workbook
+
+    wb = load_workbook(_abrir_binario(fonte), read_only=True, data_only=True)
+    try:
+        linhas = wb.active.iter_rows(values_only=True)
+        cabecalho = next(linhas, None) or ()
+        for n, valores in enumerate(linhas, start=2):
+            if any(v is not None for v in valores):
+                yield n, dict(zip(cabecalho, valores))
+    finally:
+        wb.close()
+
+
+def _ler_ndjson(fonte: Fonte) -> Iterator[Linha]:
+    for n, bruta in enumerate(_abrir_binario(fonte), start=1):
+        if n == 1 and bruta.startswith(codecs.BOM_UTF8):
+            bruta = bruta[len(codecs.BOM_UTF8):]
+        if not bruta.strip():
+            continue
+        try:
+            yield n, json.loads(bruta.decode("utf-8"))
+        except ValueError as e:  # UnicodeDecodeError e JSONDecodeError
+            yield n, ValueError(f"JSON inválido: {e}")
+
+
+_LEITORES = {"csv": _ler_csv, "xlsx": _ler_xlsx, "ndjson": _ler_ndjson}
+
+
+# ==========================================================
+# ✅ Validação
+# ==========================================================
+def _data(valor: Any) -> str:
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    if isinstance(valor, date):
+        return valor.isoformat()
+    txt = str(valor or "").strip()
+    for fmt in _FORMATOS_DATA:
+        try:
+            return datetime.strptime(txt, fmt).date().isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida: {valor!r}")
+
+
+def _numero(valor: Any, campo: str) -> Optional[float]:
+    if valor is None or (isinstance(valor, str) and not valor.strip()):
+        return None
+    if isinstance(valor, (int, float)):
+        num = float(valor)
+    else:
+        try:
+            num = float(para_numero(str(valor).strip().rstrip("%")))
+        except ValueError:
+            raise ValueError(f"{campo} não numérico: {valor!r}")
+    if campo in _TAXAS and not 0 <= num <= 100:
+        raise ValueError(f"{campo} fora de 0–100: {num}")
+    if num < 0:
+        raise ValueError(f"{campo} negativo: {num}")
+    return num
+
+
+def validar(bruta: Dict[str, Any]) -> Tuple[Any, ...]:
+    """
+    Linha do arquivo -> tupla na ordem de db.insert_relatorios; ValueError se inválida.
+    """
+    if not isinstance(bruta, dict):
+        raise ValueError(f"esperado um objeto, veio {type(bruta).__name__}")
+    linha = {}
+    for chave, valor in bruta.items():
+        coluna = _ALIASES.get(_normalizar_cabecalho(chave))
+        if coluna:
+            linha[coluna] = valor
+    nome = str(linha.get("nome_da_fazenda") or "").strip()
+    if not nome:
+        raise ValueError("nome da fazenda vazio")
+    return (
+        nome,
+        _data(linha.get("data")),
+        _numero(linha.get("taxa_prenhez"), "taxa_prenhez"),
+        _numero(linha.get("taxa_concepcao"), "taxa_concepcao"),
+        _numero(linha.get("taxa_servico"), "taxa_servico"),
+        _numero(linha.get("partos_estimados"), "partos_estimados"),
+    )
+
+
+# ==========================================================
+# 🚚 Importação
+# ==========================================================
+def importar(
+    fonte: Fonte,
+    formato: Optional[str] = None,
+    dedup: bool = True,
+    lote: int = LOTE_PADRAO,
+) -> Dict[str, Any]:
+    """
+    Importa o arquivo e devolve um relatório com contagens e vazão (linhas/s).
+    """
+    if formato is None:
+        nome = str(fonte) if isinstance(fonte, (str, Path)) else getattr(fonte, "name", "")
+        formato = detectar_formato(nome)
+    if formato not in _LEITORES:
+        raise ValueError(f"Formato não suportado: {formato}")
+
+    db.init_db()
+    t0 = time.perf_counter()
+    lidas = inseridas = invalidas = 0
+    erros: List[str] = []
+    pendentes: List[Tuple[Any, ...]] = []
+    for n, bruta in _LEITORES[formato](fonte):
+        lidas += 1
+        try:
+            if isinstance(bruta, ValueError):
+                raise bruta
+            pendentes.append(validar(bruta))
+        except (ValueError, AttributeError) as e:
+            invalidas += 1
+            if len(erros) < MAX_ERROS_RELATADOS:
+                erros.append(f"linha {n}: {e}")
+            continue
+        if len(pendentes) >= lote:
+            inseridas += db.insert_relatorios_bulk(pendentes, dedup=dedup)
+            pendentes.clear()
+    if pendentes:
+        inseridas += db.insert_relatorios_bulk(pendentes, dedup=dedup)
+
+    segundos = time.perf_counter() - t0
+    return {
+        "lidas": lidas,
+        "inseridas": inseridas,
+        "duplicadas": lidas - invalidas - inseridas,
+        "invalidas": invalidas,
+        "erros": erros,
+        "segundos": round(segundos, 3),
+        "linhas_por_s": round(lidas / segundos) if segundos > 0 else None,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Importa histórico de relatórios para o SQLite.")
+    ap.add_argument("arquivo")
+    ap.add_argument("--formato", choices=FORMATOS)
+    ap.add_argument("--sem-dedup", action="store_true", help="não ignora fazenda+data repetidas")
+    ap.add_argument("--lote", type=int, default=LOTE_PADRAO, help="linhas por transação")
+    args = ap.parse_args()
+
+    rel = importar(args.arquivo, formato=args.formato, dedup=not args.sem_dedup, lote=args.lote)
+    print(
+        f"✅ {rel['inseridas']} inseridas, {rel['duplicadas']} duplicadas, "
+        f"{rel['invalidas']} inválidas de {rel['lidas']} lidas "
+        f"em {rel['segundos']}s ({rel['linhas_por_s']} linhas/s)"
+    )
+    for erro in rel["erros"]:
+        print(f"   ⚠️ {erro}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Gráficos de evolução das métricas renderizados no servidor (PNG).
+
+Em vez de desenhar todos os pontos de todas as fazendas a cada rerun do
+dashboard, a série é lida direto do SQLite com os mesmos filtros do histórico,
+limitada às ``MAX_FAZENDAS`` com mais lançamentos (as demais viram uma linha
+"Outras" com a média por data) e reduzida por fazenda com LTTB
+(Largest-Triangle-Three-Buckets) para no máximo ``PONTOS_POR_SERIE`` pontos.
+O PNG resultante é pequeno e pode ser guardado em cache pela versão dos dados
+(db.versao()) + filtros.
+"""
+from __future__ import annotations
+
+import io
+import os
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from backend import db
+
+MAX_FAZENDAS = int(os.getenv("CHART_MAX_FAZENDAS", "8"))
+PONTOS_POR_SERIE = int(os.getenv("CHART_PONTOS", "200"))
+NOME_OUTRAS = "Outras"
+# Com poucos pontos vale marcar cada lançamento; acima disso só a linha
+MAX_PONTOS_MARCADOR = 60
+
+CAMPOS = {
+    "taxa_prenhez": "Evolução da taxa de prenhez",
+    "taxa_concepcao": "Evolução da taxa de concepção",
+    "taxa_servico": "Evolução da taxa de serviço",
+    "partos_estimados": "Evolução dos partos estimados",
+}
+
+Ponto = Tuple[float, float]
+
+
+# ==========================================================
+# 📉 Redução de pontos
+# ==========================================================
+def lttb(pontos: Sequence[Ponto], limite: int) -> List[Ponto]:
+    """
+    Largest-Triangle-Three-Buckets: mantém o primeiro e o último ponto e, em
+    cada balde intermediário, o ponto que forma o maior triângulo com o ponto
+    escolhido antes e a média do balde seguinte. Preserva picos e vales.
+    """
+    n = len(pontos)
+    if limite >= n or limite < 3:
+        return list(pontos)
+    saida = [pontos[0]]
+    passo = (n - 2) / (limite - 2)
+    a = 0
+    for i in range(limite - 2):
+        ini = int(i * passo) + 1
+        fim = int((i + 1) * passo) + 1
+        prox_ini, prox_fim = fim, min(int((i + 2) * passo) + 1, n)
+        prox = pontos[prox_ini:prox_fim] or [pontos[-1]]
+        mx = sum(p[0] for p in prox) / len(prox)
+        my = sum(p[1] for p in prox) / len(prox)
+        ax, ay = pontos[a]
+        melhor, area_max = ini, -1.0
+        for j in range(ini, fim):
+            x, y = pontos[j]
+            area = abs((ax - mx) * (y - ay) - (ax - x) * (my - ay))
+            if area > area_max:
+                melhor, area_max = j, area
+        saida.append(pontos[melhor])
+        a = melhor
+    saida.append(pontos[-1])
+    return saida
+
+
+def _media_por_data(pontos: List[Ponto]) -> List[Ponto]:
+    somas: Dict[float, List[float]] = defaultdict(lambda: [0.0, 0])
+    for x, y in pontos:
+        acc = somas[x]
+        acc[0] += y
+        acc[1] += 1
+    return [(x, s / n) for x, (s, n) in sorted(somas.items())]
+
+
+# ==========================================================
+# 📊 Séries
+# ==========================================================
+def series(
+    campo: str,
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    max_fazendas: int = MAX_FAZENDAS,
+    pontos_por_serie: int = PONTOS_POR_SERIE,
+) -> Dict[str, List[Ponto]]:
+    """
+    {fazenda: [(dia ordinal, valor), ...]} já limitado e reduzido, na ordem
+    de quem tem mais lançamentos; "Outras" por último.
+    """
+    if campo not in CAMPOS:
+        raise ValueError(f"campo inválido: {campo}")
+    por_fazenda: Dict[str, List[Ponto]] = defaultdict(list)
+    for nome, data, valor in db.serie_metrica(campo, search=search, date_from=date_from, date_to=date_to):
+        try:
+            x = float(date.fromisoformat(data[:10]).toordinal())
+        except ValueError:
+            continue
+        por_fazenda[nome].append((x, float(valor)))
+
+    ordem = sorted(por_fazenda, key=lambda f: len(por_fazenda[f]), reverse=True)
+    principais = ordem[:max_fazendas]
+    resultado = {f: sorted(por_fazenda[f]) for f in principais}
+    if len(ordem) > max_fazendas:
+        resto = [p for f in ordem[max_fazendas:] for p in por_fazenda[f]]
+        resultado[NOME_OUTRAS] = _media_por_data(resto)
+    return {f: lttb(pts, pontos_por_serie) for f, pts in resultado.items()}
+
+
+# ==========================================================
+# 🖼️ Renderização
+# ==========================================================
+def renderizar_png(titulo: str, dados: Dict[str, List[Ponto]], unidade: str = "%") -> bytes:
+    """
+    Desenha as séries numa Figure própria (backend Agg, sem pyplot/estado
+    global) e devolve o PNG.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(6, 4), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    for nome, pontos in dados.items():
+        if not pontos:
+            continue
+        xs = [date.fromordinal(int(x)) for x, _ in pontos]
+        ys = [y for _, y in pontos]
+        ax.plot(
+            xs, ys,
+            marker="o" if len(pontos) <= MAX_PONTOS_MARCADOR else None,
+            linestyle="--" if nome == NOME_OUTRAS else "-",
+            label=nome,
+        )
+    ax.set_title(titulo, fontsize=11, pad=12)
+    ax.set_xlabel("Data")
+    ax.set_ylabel(unidade)
+    ax.grid(True, linestyle="--", alpha=0.4)
+    for rotulo in ax.get_xticklabels():
+        rotulo.set_rotation(45)  # evita sobreposição das datas
+        rotulo.set_horizontalalignment("right")
+    if dados:
+        ax.legend(fontsize=8, loc="best")
+    fig.tight_layout()
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def grafico_png(
+    campo: str,
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> Optional[bytes]:
+    """
+    PNG do gráfico de ``campo`` para os filtros, ou None se não houver dados.
+    """
+    dados = series(campo, search=search, date_from=date_from, date_to=date_to)
+    if not dados:
+        return None
+    unidade = "%" if campo.startswith("taxa_") else "partos"
+    return renderizar_png(CAMPOS[campo], dados, unidade)
@@ -1,7 +1,14 @@
 from __future__ import annotations
+import base64
+import json
+import os
 import sqlite3
+import threading
+import uuid
 from pathlib import Path
-from typing import Optional, Tuple, Dict, Any, List
+from typing import Optional, Tuple, Dict, Any, Iterable, List
+
+from backend import telemetry
 
 DB_PATH = Path(__file__).resolve().parent / "relatorios.db"
 
@@ -17,17 +24,183 @@ CREATE TABLE IF NOT EXISTS relatorios (
 );
 """
 
-def conn() -> sqlite3.Connection:
+# Migrações aplicadas em ordem depois do DDL; PRAGMA user_version guarda
+# quantas já rodaram neste banco. Cada item é SQL ou uma função(conexão).
+def _migrar_fts(c: sqlite3.Connection) -> None:
+    # Busca por trecho do nome (LIKE '%x%') via FTS5 trigram; se o SQLite não
+    # tiver FTS5/trigram a busca continua no LIKE.
+    try:
+        c.executescript("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS relatorios_fts USING fts5(
+          nome_da_fazenda, content='relatorios', content_rowid='id', tokenize='trigram'
+        );
+        CREATE TRIGGER IF NOT EXISTS relatorios_fts_ai AFTER INSERT ON relatorios BEGIN
+          INSERT INTO relatorios_fts(rowid, nome_da_fazenda) VALUES (new.id, new.nome_da_fazenda);
+        END;
+        CREATE TRIGGER IF NOT EXISTS relatorios_fts_ad AFTER DELETE ON relatorios BEGIN
+          INSERT INTO relatorios_fts(relatorios_fts, rowid, nome_da_fazenda) VALUES ('delete', old.id, old.nome_da_fazenda);
+        END;
+        CREATE TRIGGER IF NOT EXISTS relatorios_fts_au AFTER UPDATE OF nome_da_fazenda ON relatorios BEGIN
+          INSERT INTO relatorios_fts(relatorios_fts, rowid, nome_da_fazenda) VALUES ('delete', old.id, old.nome_da_fazenda);
+          INSERT INTO relatorios_fts(rowid, nome_da_fazenda) VALUES (new.id, new.nome_da_fazenda);
+        END;
+        INSERT INTO relatorios_fts(relatorios_fts) VALUES ('rebuild');
+        """)
+    except sqlite3.OperationalError:
+        pass
+
+_KPI_COLS = [
+    ("prenhez", "taxa_prenhez"),
+    ("concepcao", "taxa_concepcao"),
+    ("servico", "taxa_servico"),
+    ("partos", "partos_estimados"),
+]
+
+def _kpi_sql(sinal: str, linha: str) -> str:
+    # UPSERT que soma (sinal '+') ou subtrai (sinal '-') uma linha de relatorios
+    cols = ", ".join(f"soma_{k}, n_{k}" for k, _ in _KPI_COLS)
+    vals = ", ".join(f"COALESCE({linha}.{c}, 0), {linha}.{c} IS NOT NULL" for _, c in _KPI_COLS)
+    upd = ", ".join(
+        f"soma_{k} = soma_{k} {sinal} excluded.soma_{k}, n_{k} = n_{k} {sinal} excluded.n_{k}"
+        for k, _ in _KPI_COLS
+    )
+    return f"""
+      INSERT INTO relatorios_kpi (nome_da_fazenda, mes, n, {cols})
+      VALUES ({linha}.nome_da_fazenda, substr({linha}.data, 1, 7), 1, {vals})
+      ON CONFLICT(nome_da_fazenda, mes) DO UPDATE SET n = n {sinal} excluded.n, {upd};
+    """
+
+def _migrar_kpi(c: sqlite3.Connection) -> None:
+    # Somas e contagens por fazenda e mês mantidas por triggers: kpis() lê
+    # estes agregados em vez de varrer relatorios a cada rerun do dashboard.
+    cols = ", ".join(f"soma_{k} REAL NOT NULL DEFAULT 0, n_{k} INTEGER NOT NULL DEFAULT 0" for k, _ in _KPI_COLS)
+    backfill = ", ".join(f"COALESCE(SUM({c}), 0), COUNT({c})" for _, c in _KPI_COLS)
+    limpar = "DELETE FROM relatorios_kpi WHERE n <= 0;"
+    c.executescript(f"""
+    CREATE TABLE IF NOT EXISTS relatorios_kpi (
+      nome_da_fazenda TEXT NOT NULL,
+      mes TEXT NOT NULL,
+      n INTEGER NOT NULL DEFAULT 0,
+      {cols},
+      PRIMARY KEY (nome_da_fazenda, mes)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_relatorios_kpi_mes ON relatorios_kpi(mes);
+    CREATE TRIGGER IF NOT EXISTS relatorios_kpi_ai AFTER INSERT ON relatorios BEGIN
+      {_kpi_sql('+', 'new')}
+    END;
+    CREATE TRIGGER IF NOT EXISTS relatorios_kpi_ad AFTER DELETE ON relatorios BEGIN
+      {_kpi_sql('-', 'old')}
+      {limpar}
+    END;
+    CREATE TRIGGER IF NOT EXISTS relatorios_kpi_au AFTER UPDATE ON relatorios BEGIN
+      {_kpi_sql('-', 'old')}
+      {_kpi_sql('+', 'new')}
+      {limpar}
+    END;
+    DELETE FROM relatorios_kpi;
+    INSERT INTO relatorios_kpi
+    SELECT nome_da_fazenda, substr(data, 1, 7), COUNT(*), {backfill}
+    FROM relatorios GROUP BY 1, 2;
+    """)
+
+# Contador de versão dos dados: qualquer escrita em relatorios o incrementa, e
+# quem guarda consultas em cache (dashboard) compara só este número.
+_MIGRAR_VERSAO = """
+CREATE TABLE IF NOT EXISTS relatorios_meta (
+  chave TEXT PRIMARY KEY,
+  valor INTEGER NOT NULL
+) WITHOUT ROWID;
+INSERT OR IGNORE INTO relatorios_meta VALUES ('versao', 0);
+""" + "".join(
+    f"""
+CREATE TRIGGER IF NOT EXISTS relatorios_versao_{sufixo} AFTER {evento} ON relatorios BEGIN
+  UPDATE relatorios_meta SET valor = valor + 1 WHERE chave = 'versao';
+END;
+"""
+    for sufixo, evento in (("ai", "INSERT"), ("ad", "DELETE"), ("au", "UPDATE"))
+)
+
+MIGRATIONS: List[Any] = [
+    # 1: índices para filtro/ordenação por data e por fazenda
+    """
+    CREATE INDEX IF NOT EXISTS idx_relatorios_data ON relatorios(data);
+    CREATE INDEX IF NOT EXISTS idx_relatorios_fazenda_data ON relatorios(nome_da_fazenda COLLATE NOCASE, data DESC);
+    """,
+    # 2: índice FTS5 do nome da fazenda
+    _migrar_fts,
+    # 3: agregados de KPI por fazenda/mês
+    _migrar_kpi,
+    # 4: contador de versão dos dados
+    _MIGRAR_VERSAO,
+]
+
+# Para as tabelas de fila (backend/ocr_jobs.py, backend/report_queue.py), que
+# têm o próprio DDL: acrescenta a coluna em bancos criados antes dela.
+def garantir_coluna(c: sqlite3.Connection, tabela: str, coluna: str, tipo: str) -> None:
+    if coluna not in {r[1] for r in c.execute(f"PRAGMA table_info({tabela})")}:
+        c.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+
+def _migrar(c: sqlite3.Connection) -> None:
+    versao = c.execute("PRAGMA user_version").fetchone()[0]
+    for i, passo in enumerate(MIGRATIONS[versao:], start=versao + 1):
+        if callable(passo):
+            passo(c)
+        else:
+            c.executescript(passo)
+        c.execute(f"PRAGMA user_version={i}")
+        c.commit()
+
+# Uma conexão por thread (e por processo: após um fork a conexão herdada é
+# descartada). As pragmas são aplicadas só na abertura e o cache de statements
+# do sqlite3 reaproveita os SQL já preparados daquela conexão.
+_local = threading.local()
+_schema_pronto: set = set()
+_schema_lock = threading.Lock()
+
+def _abrir() -> sqlite3.Connection:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    c = sqlite3.connect(DB_PATH)
+    c = sqlite3.connect(DB_PATH, timeout=10, cached_statements=256)
     c.execute("PRAGMA journal_mode=WAL;")
     c.execute("PRAGMA synchronous=NORMAL;")
+    c.execute("PRAGMA busy_timeout=10000;")
+    c.execute("PRAGMA temp_store=MEMORY;")
     return c
 
+def conn() -> sqlite3.Connection:
+    chave = (os.getpid(), str(DB_PATH))
+    if getattr(_local, "chave", None) != chave:
+        _local.conexao = _abrir()
+        _local.chave = chave
+    return _local.conexao
+
+# Dono dos itens em execução nas filas (ocr_jobs, report_artifacts): pid mais
+# um sufixo aleatório, para um processo novo com o mesmo pid (ex.: pid 1 num
+# contêiner reiniciado) não renovar o lease de itens do anterior.
+_donos: Dict[int, str] = {}
+
+def dono_processo() -> str:
+    pid = os.getpid()
+    if pid not in _donos:
+        _donos[pid] = f"{pid}-{uuid.uuid4().hex[:8]}"
+    return _donos[pid]
+
 def init_db() -> None:
-    with conn() as c:
-        c.executescript(DDL)
+    # Cria o schema uma vez por processo; chamadas seguintes não tocam o banco
+    if str(DB_PATH) in _schema_pronto:
+        return
+    with _schema_lock:
+        if str(DB_PATH) in _schema_pronto:
+            return
+        with conn() as c:
+            c.executescript(DDL)
+            _migrar(c)
+        _schema_pronto.add(str(DB_PATH))
+
+# Tempo de cada operação pública no histograma agrovet_db_segundos (/metrics)
+def _medido(fn):
+    return telemetry.medir("agrovet_db_segundos", consulta=fn.__name__)(fn)
 
+@_medido
 def insert_relatorio(
     nome_da_fazenda: str,
     data: str,
@@ -47,61 +220,283 @@ def insert_relatorio(
         )
         return cur.lastrowid
 
+# rows: (nome_da_fazenda, data, taxa_prenhez, taxa_concepcao, taxa_servico, partos_estimados)
+# Com ``c`` a inserção entra na transação já aberta por quem chama (sem commit)
+@_medido
+def insert_relatorios(rows: Iterable[Tuple[Any, ...]], c: Optional[sqlite3.Connection] = None) -> int:
+    sql = """
+        INSERT INTO relatorios
+        (nome_da_fazenda, data, taxa_prenhez, taxa_concepcao, taxa_servico, partos_estimados)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """
+    if c is not None:
+        return c.executemany(sql, rows).rowcount
+    with conn() as c:
+        return c.executemany(sql, rows).rowcount
+
+# Importação em massa: um executemany por lote, numa única transação. Com dedup
+# a linha só entra se não houver a mesma fazenda (sem diferenciar maiúsculas) na
+# mesma data; o NOT EXISTS usa idx_relatorios_fazenda_data e enxerga as linhas
+# já inseridas no próprio lote.
+@_medido
+def insert_relatorios_bulk(rows: List[Tuple[Any, ...]], dedup: bool = True) -> int:
+    if not dedup:
+        return insert_relatorios(rows)
+    with conn() as c:
+        cur = c.executemany(
+            """
+            INSERT INTO relatorios
+            (nome_da_fazenda, data, taxa_prenhez, taxa_concepcao, taxa_servico, partos_estimados)
+            SELECT ?1, ?2, ?3, ?4, ?5, ?6
+            WHERE NOT EXISTS (
+              SELECT 1 FROM relatorios WHERE nome_da_fazenda = ?1 COLLATE NOCASE AND data = ?2
+            )
+            """,
+            rows,
+        )
+        return cur.rowcount
+
+@_medido
 def delete_relatorio(_id: int) -> None:
     with conn() as c:
         c.execute("DELETE FROM relatorios WHERE id=?", (_id,))
 
-def list_relatorios(
-    search: Optional[str] = None,
-    date_from: Optional[str] = None,
-    date_to: Optional[str] = None,
-    order: str = "recentes",
-    limit: Optional[int] = 100,
-):
-    q = ["SELECT id, nome_da_fazenda, data, taxa_prenhez, taxa_concepcao, taxa_servico, partos_estimados FROM relatorios"]
+def versao() -> int:
+    row = conn().execute("SELECT valor FROM relatorios_meta WHERE chave = 'versao'").fetchone()
+    return row[0] if row else 0
+
+def tem_fts(c: sqlite3.Connection) -> bool:
+    return c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='relatorios_fts'"
+    ).fetchone() is not None
+
+def _filtros(
+    c: sqlite3.Connection,
+    search: Optional[str],
+    date_from: Optional[str],
+    date_to: Optional[str],
+) -> Tuple[List[str], List[Any]]:
+    # Comparações diretas na coluna (sem date(data)) para o índice ser usado;
+    # data é 'YYYY-MM-DD[ HH:MM:SS]', então a ordem do texto é a ordem da data.
+    wh: List[str] = []
     params: List[Any] = []
-    wh = []
     if search:
-        wh.append("nome_da_fazenda LIKE ?")
-        params.append(f"%{search}%")
+        if len(search) >= 3 and tem_fts(c):
+            wh.append("id IN (SELECT rowid FROM relatorios_fts WHERE relatorios_fts MATCH ?)")
+            params.append('"' + search.replace('"', '""') + '"')
+        else:
+            wh.append("nome_da_fazenda LIKE ?")
+            params.append(f"%{search}%")
     if date_from:
-        wh.append("date(data) >= date(?)")
+        wh.append("data >= date(?)")
         params.append(date_from)
     if date_to:
-        wh.append("date(data) <= date(?)")
+        wh.append("data < date(?, '+1 day')")
         params.append(date_to)
-    if wh:
-        q.append("WHERE " + " AND ".join(wh))
+    return wh, params
+
+ORDENS = {
+    "recentes": "ORDER BY data DESC, id DESC",
+    "antigos": "ORDER BY data ASC, id ASC",
+    "nome": "ORDER BY nome_da_fazenda COLLATE NOCASE ASC, data DESC, id ASC",
+}
+
+# Condição de keyset por ordem: linhas estritamente depois da última da página
+# anterior, na mesma ordem de ORDENS (os índices cobrem as três).
+_APOS = {
+    "recentes": ("(data, id) < (?, ?)", ("data", "id")),
+    "antigos": ("(data, id) > (?, ?)", ("data", "id")),
+    "nome": (
+        # o primeiro termo (>=) é só para o SQLite achar o ponto de partida no índice
+        "nome_da_fazenda >= ? COLLATE NOCASE AND (nome_da_fazenda > ? COLLATE NOCASE"
+        " OR data < ? OR (data = ? AND id > ?))",
+        ("nome_da_fazenda", "nome_da_fazenda", "data", "data", "id"),
+    ),
+}
+
+def encode_cursor(order: str, row: Dict[str, Any]) -> str:
+    chave = [order] + [row[col] for col in dict.fromkeys(_APOS[order][1])]
+    return base64.urlsafe_b64encode(json.dumps(chave).encode()).decode().rstrip("=")
 
-    if order == "nome":
-        q.append("ORDER BY nome_da_fazenda COLLATE NOCASE ASC, date(data) DESC")
-    elif order == "antigos":
-        q.append("ORDER BY date(data) ASC")
-    else:
-        q.append("ORDER BY date(data) DESC")
+def decode_cursor(order: str, cursor: str) -> List[Any]:
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("cursor inválido")
+    if not isinstance(dados, list) or not dados or dados[0] != order or order not in _APOS:
+        raise ValueError("cursor não corresponde à ordenação pedida")
+    colunas = list(dict.fromkeys(_APOS[order][1]))
+    if len(dados) != 1 + len(colunas):
+        raise ValueError("cursor inválido")
+    if not all(v is None or (isinstance(v, (str, int, float)) and not isinstance(v, bool)) for v in dados[1:]):
+        raise ValueError("cursor inválido")
+    valores = dict(zip(colunas, dados[1:]))
+    return [valores[col] for col in _APOS[order][1]]
 
+def consulta_relatorios(
+    c: sqlite3.Connection,
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    order: str = "recentes",
+    limit: Optional[int] = 100,
+    apos: Optional[List[Any]] = None,
+) -> Tuple[str, List[Any]]:
+    order = order if order in ORDENS else "recentes"
+    q = ["SELECT id, nome_da_fazenda, data, taxa_prenhez, taxa_concepcao, taxa_servico, partos_estimados FROM relatorios"]
+    wh, params = _filtros(c, search, date_from, date_to)
+    if apos is not None:
+        wh.append(_APOS[order][0])
+        params.extend(apos)
+    if wh:
+        q.append("WHERE " + " AND ".join(wh))
+    q.append(ORDENS[order])
     if limit and limit > 0:
-        q.append(f"LIMIT {int(limit)}")
+        q.append("LIMIT ?")
+        params.append(int(limit))
+    return " ".join(q), params
 
-    sql = " ".join(q)
+@_medido
+def list_relatorios(
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    order: str = "recentes",
+    limit: Optional[int] = 100,
+):
     with conn() as c:
+        sql, params = consulta_relatorios(c, search, date_from, date_to, order, limit)
         cur = c.execute(sql, params)
         cols = [d[0] for d in cur.description]
         rows = cur.fetchall()
     return cols, rows
 
-def kpis():
-    sql = """
-    SELECT
-      COUNT(*) AS total_registros,
-      AVG(taxa_prenhez)    AS media_prenhez,
-      AVG(taxa_concepcao)  AS media_concepcao,
-      AVG(taxa_servico)    AS media_servico,
-      AVG(partos_estimados) AS media_partos
-    FROM relatorios;
-    """
+@_medido
+def page_relatorios(
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    order: str = "recentes",
+    limit: int = 100,
+    cursor: Optional[str] = None,
+):
+    # Paginação por keyset: custo por página constante, independente da
+    # profundidade. Devolve (cols, rows, next_cursor); next_cursor None = fim.
+    order = order if order in ORDENS else "recentes"
+    limit = max(1, int(limit))
+    apos = decode_cursor(order, cursor) if cursor else None
     with conn() as c:
-        cur = c.execute(sql)
-        row = cur.fetchone()
-    keys = ["total_registros","media_prenhez","media_concepcao","media_servico","media_partos"]
-    return dict(zip(keys, row or [0, None, None, None, None]))
+        sql, params = consulta_relatorios(c, search, date_from, date_to, order, limit + 1, apos)
+        cur = c.execute(sql, params)
+        cols = [d[0] for d in cur.description]
+        rows = cur.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(order, dict(zip(cols, rows[-1])))
+    return cols, rows, next_cursor
+
+def iter_relatorios(
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    order: str = "recentes",
+    lote: int = 2000,
+) -> Iterable[Tuple[Any, ...]]:
+    # Todas as linhas do filtro, buscadas em páginas de keyset: cada lote é uma
+    # consulta curta (nenhuma leitura fica aberta entre lotes), então o gerador
+    # pode ser consumido de threads diferentes (StreamingResponse).
+    cursor = None
+    while True:
+        _, rows, cursor = page_relatorios(search, date_from, date_to, order, lote, cursor)
+        yield from rows
+        if cursor is None:
+            return
+
+# (nome_da_fazenda, data, valor) de uma métrica para os gráficos, sem nulos
+@_medido
+def serie_metrica(
+    campo: str,
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> Iterable[Tuple[str, str, float]]:
+    if campo not in dict(_KPI_COLS).values():
+        raise ValueError(f"campo inválido: {campo}")
+    c = conn()
+    wh, params = _filtros(c, search, date_from, date_to)
+    wh.append(f"{campo} IS NOT NULL")
+    return c.execute(
+        f"SELECT nome_da_fazenda, data, {campo} FROM relatorios WHERE {' AND '.join(wh)}",
+        params,
+    )
+
+def explain(sql: str, params: Iterable[Any] = ()) -> List[str]:
+    with conn() as c:
+        return [r[3] for r in c.execute("EXPLAIN QUERY PLAN " + sql, list(params))]
+
+def _somar_kpi(c: sqlite3.Connection, sql: str, params: List[Any], tot: List[float]) -> None:
+    row = c.execute(sql, params).fetchone()
+    for i, v in enumerate(row):
+        tot[i] += v or 0
+
+@_medido
+def kpis(
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    # Meses inteiros do intervalo saem de relatorios_kpi; só os meses das
+    # pontas (cobertos em parte por date_from/date_to) vão à tabela base,
+    # pelo índice de data. O custo não cresce com o histórico. O filtro de
+    # nome é o mesmo de _filtros (FTS ou LIKE), para bater com a tabela: o
+    # FTS só indexa o nome, então filtrar os agregados pelos nomes que casam
+    # equivale a filtrar as linhas.
+    agg_cols = ", ".join(f"SUM(soma_{k}), SUM(n_{k})" for k, _ in _KPI_COLS)
+    base_cols = ", ".join(f"SUM({col}), COUNT({col})" for _, col in _KPI_COLS)
+    tot = [0.0] * (1 + 2 * len(_KPI_COLS))
+    vazio = bool(date_from and date_to and date_from[:10] > date_to[:10])
+    with conn() as c:
+        mes_ini = date_from[:7] if date_from else None
+        mes_fim = date_to[:7] if date_to else None
+
+        wh, params = [], []
+        if search:
+            wh_nome, params = _filtros(c, search, None, None)
+            wh.append(
+                "nome_da_fazenda IN (SELECT nome_da_fazenda FROM relatorios WHERE "
+                + " AND ".join(wh_nome) + ")"
+            )
+        if mes_ini:
+            wh.append("mes > ?")
+            params.append(mes_ini)
+        if mes_fim:
+            wh.append("mes < ?")
+            params.append(mes_fim)
+        sql = f"SELECT SUM(n), {agg_cols} FROM relatorios_kpi"
+        if wh:
+            sql += " WHERE " + " AND ".join(wh)
+        pontas = []
+        if vazio:
+            pass  # intervalo invertido: nenhuma linha, como na tabela
+        elif mes_ini and mes_ini == mes_fim:
+            pontas.append(_filtros(c, search, date_from, date_to))
+        else:
+            _somar_kpi(c, sql, params, tot)
+            if mes_ini:
+                wh, params = _filtros(c, search, date_from, None)
+                wh.append("data < date(?, 'start of month', '+1 month')")
+                pontas.append((wh, params + [date_from]))
+            if mes_fim:
+                wh, params = _filtros(c, search, None, date_to)
+                wh.append("data >= date(?, 'start of month')")
+                pontas.append((wh, params + [date_to]))
+        for wh, params in pontas:
+            sql = f"SELECT COUNT(*), {base_cols} FROM relatorios WHERE " + " AND ".join(wh)
+            _somar_kpi(c, sql, params, tot)
+
+    out: Dict[str, Any] = {"total_registros": int(tot[0])}
+    for i, (k, _) in enumerate(_KPI_COLS):
+        soma, n = tot[1 + 2 * i], tot[2 + 2 * i]
+        out[f"media_{k}"] = soma / n if n else None
+    return out
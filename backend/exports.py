@@ -0,0 +1,154 @@
+"""
+Exportação do histórico filtrado para Excel (XLSX) e PDF, sob demanda.
+
+As linhas saem do SQLite em lotes por keyset (db.iter_relatorios), então nem o
+resultado inteiro nem um DataFrame ficam em memória. O XLSX usa o modo
+write-only do openpyxl (memória constante, as linhas vão direto para o
+arquivo) e o PDF pagina a tabela inteira com o cabeçalho repetido em cada
+página, em vez de cortar nas primeiras linhas.
+
+Usado pelo dashboard (botões "Gerar") e pela rota GET /relatorios/exportar.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional, Union
+
+from backend import db
+
+FORMATOS = {
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "agrovet_relatorios"),
+    "pdf": ("application/pdf", "agrovet_relatorio"),
+}
+LOTE = int(os.getenv("EXPORT_LOTE", "2000"))
+
+CABECALHO = ["ID", "Fazenda", "Data", "Prenhez", "Concepção", "Serviço", "Partos"]
+# Posição x de cada coluna na tabela do PDF e largura máxima do nome
+_X_COLUNAS = (40, 80, 250, 320, 380, 450, 510)
+_MAX_CHARS_FAZENDA = 30
+
+Destino = Union[str, Path, BinaryIO]
+
+
+def nome_arquivo(formato: str) -> str:
+    return f"{FORMATOS[formato][1]}_{datetime.now():%Y%m%d_%H%M}.{formato}"
+
+
+def _linhas(filtros: Dict[str, Any]):
+    return db.iter_relatorios(lote=LOTE, **filtros)
+
+
+# ==========================================================
+# 📗 Excel
+# ==========================================================
+def escrever_xlsx(destino: Destino, **filtros) -> int:
+    """
+    Grava o XLSX em ``destino`` e devolve quantas linhas foram exportadas.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Relatórios")
+    ws.append(CABECALHO)
+    n = 0
+    for row in _linhas(filtros):
+        ws.append(row)
+        n += 1
+    wb.save(destino)
+    return n
+
+
+# ==========================================================
+# 📕 PDF
+# ==========================================================
+def _fmt(valor: Any) -> str:
+    if valor is None:
+        return "—"
+    if isinstance(valor, float):
+        return f"{valor:g}"
+    return str(valor)
+
+
+def escrever_pdf(destino: Destino, **filtros) -> int:
+    """
+    Grava o PDF em ``destino`` (tabela completa, paginada) e devolve quantas
+    linhas foram exportadas.
+    """
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(destino, pagesize=A4)
+    w, h = A4
+    pagina = 1
+
+    def _cabecalho(y):
+        c.setFont("Helvetica-Bold", 9)
+        for x, titulo in zip(_X_COLUNAS, CABECALHO):
+            c.drawString(x, y, titulo)
+        c.setFont("Helvetica", 9)
+        return y - 16
+
+    def _rodape():
+        c.setFont("Helvetica", 8)
+        c.drawRightString(w - 40, 30, f"Página {pagina}")
+
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(40, h - 40, "Relatório AgroVet")
+    c.setFont("Helvetica", 10)
+    c.drawString(40, h - 60, f"Gerado em: {datetime.now():%d/%m/%Y %H:%M}")
+    y = _cabecalho(h - 90)
+
+    n = 0
+    for rid, fazenda, data, prenhez, concepcao, servico, partos in _linhas(filtros):
+        if y < 60:
+            _rodape()
+            c.showPage()
+            pagina += 1
+            y = _cabecalho(h - 40)
+        valores = (
+            str(rid), str(fazenda)[:_MAX_CHARS_FAZENDA], str(data)[:10],
+            _fmt(prenhez), _fmt(concepcao), _fmt(servico), _fmt(partos),
+        )
+        for x, txt in zip(_X_COLUNAS, valores):
+            c.drawString(x, y, txt)
+        y -= 14
+        n += 1
+
+    if n == 0:
+        c.drawString(40, y, "Nenhum registro encontrado.")
+    _rodape()
+    c.showPage()
+    c.save()
+    return n
+
+
+_ESCRITORES = {"xlsx": escrever_xlsx, "pdf": escrever_pdf}
+
+
+def exportar(formato: str, destino: Destino, **filtros) -> int:
+    if formato not in _ESCRITORES:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+    return _ESCRITORES[formato](destino, **filtros)
+
+
+def exportar_arquivo(
+    formato: str,
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    order: str = "recentes",
+) -> Path:
+    """
+    Exporta para um arquivo temporário (quem chama remove depois de enviar).
+    """
+    fd, caminho = tempfile.mkstemp(suffix=f".{formato}", prefix="agrovet_export_")
+    os.close(fd)
+    try:
+        exportar(formato, caminho, search=search, date_from=date_from, date_to=date_to, order=order)
+    except Exception:
+        os.remove(caminho)
+        raise
+    return Path(caminho)
@@ -0,0 +1,118 @@
+"""
+Entrega de arquivos gravados em disco (PDFs dos relatórios) sem carregar o
+arquivo em memória.
+
+- resposta completa via FileResponse, que o servidor pode mandar com
+  sendfile (extensão zerocopysend do ASGI) ou em blocos;
+- ETag e Last-Modified a partir de um único ``stat`` e GET condicional
+  (If-None-Match / If-Modified-Since -> 304);
+- um intervalo ``Range: bytes=...`` por pedido (206, ou 416 fora do arquivo),
+  respeitando If-Range, lido em blocos de ``BLOCO`` bytes.
+"""
+from __future__ import annotations
+
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+BLOCO = 64 * 1024
+
+
+def _etag(st: os.stat_result) -> str:
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+
+
+def _nao_modificado(request: Request, etag: str, st: os.stat_result) -> bool:
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        return etag in [t.strip().removeprefix("W/") for t in inm.split(",")] or inm.strip() == "*"
+    ims = request.headers.get("if-modified-since")
+    if ims:
+        try:
+            return int(st.st_mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _intervalo(valor: str, tamanho: int) -> Optional[Tuple[int, int]]:
+    """
+    (início, fim inclusivo) de um único intervalo ``bytes=``; None se o
+    cabeçalho não for suportado (vários intervalos, outra unidade) e
+    ValueError se estiver fora do arquivo.
+    """
+    unidade, _, spec = valor.partition("=")
+    if unidade.strip().lower() != "bytes" or "," in spec:
+        return None
+    ini, _, fim = spec.strip().partition("-")
+    try:
+        if ini == "":
+            n = int(fim)  # sufixo: últimos n bytes
+            if n <= 0:
+                raise ValueError
+            return max(0, tamanho - n), tamanho - 1
+        a = int(ini)
+        b = int(fim) if fim else tamanho - 1
+    except ValueError:
+        raise ValueError("Range inválido")
+    if a >= tamanho or b < a:
+        raise ValueError("Range fora do arquivo")
+    return a, min(b, tamanho - 1)
+
+
+def _ler(caminho: str, inicio: int, tamanho: int) -> Iterator[bytes]:
+    with open(caminho, "rb") as f:
+        f.seek(inicio)
+        while tamanho > 0:
+            bloco = f.read(min(BLOCO, tamanho))
+            if not bloco:
+                break
+            tamanho -= len(bloco)
+            yield bloco
+
+
+def servir_arquivo(
+    request: Request,
+    caminho: str,
+    media_type: str,
+    filename: Optional[str] = None,
+    max_age: int = 0,
+) -> Response:
+    try:
+        st = os.stat(caminho)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+
+    etag = _etag(st)
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": f"private, max-age={max_age}",
+    }
+    if _nao_modificado(request, etag, st):
+        return Response(status_code=304, headers=headers)
+
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if rng and (if_range is None or if_range.strip() in (etag, headers["Last-Modified"])):
+        try:
+            intervalo = _intervalo(rng, st.st_size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{st.st_size}"})
+        if intervalo is not None:
+            a, b = intervalo
+            headers.update({
+                "Content-Range": f"bytes {a}-{b}/{st.st_size}",
+                "Content-Length": str(b - a + 1),
+            })
+            if filename:
+                headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return StreamingResponse(
+                _ler(caminho, a, b - a + 1), status_code=206, media_type=media_type, headers=headers
+            )
+
+    return FileResponse(caminho, media_type=media_type, filename=filename, headers=headers, stat_result=st)
@@ -1,14 +1,20 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-import io, re, sqlite3
+from typing import List, Optional
+import asyncio, io, json, zipfile
 from datetime import datetime
-from PIL import Image, ImageEnhance, ImageFilter
-import numpy as np, cv2
-import pytesseract
+import os
 # from paddleocr import PaddleOCR
-from easyocr import Reader
-import easyocr
+
+from backend.ocr import processar_imagem
+from backend.ocr_pool import pool, PoolSaturado
+from backend import analise_ia, bulk_import, db, exports, ocr_cache, ocr_jobs, telemetry, upload
+from backend.metrics_parser import NOME_PADRAO
+from backend.routes import history as history_routes
+from backend.routes import reports as reports_routes
 
 # ==========================================================
 # 🚀 Configuração principal da API
@@ -23,97 +29,169 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ==========================================================
-# 🧠 Motores OCR (Paddle + EasyOCR + Tesseract)
-# ==========================================================
-ocr_engine = Reader(['pt'], gpu=False)
-easy_engine = easyocr.Reader(['pt', 'en'], gpu=False)
+# Tempo de cada etapa no cabeçalho Server-Timing (backend/telemetry.py)
+app.middleware("http")(telemetry.middleware_server_timing)
 
+# Relatórios PDF: geração em fila (backend/report_queue.py), download por ID
+app.include_router(reports_routes.router)
+app.include_router(history_routes.router)
 
 # ==========================================================
-# 🧩 Pré-processamento da imagem
+# 🧠 Motores OCR (EasyOCR + Tesseract)
 # ==========================================================
-def preprocess_image(image_bytes):
+# Os readers EasyOCR são carregados sob demanda pelo registro em
+# backend/ocr_engines.py, dentro dos processos do pool (backend/ocr_pool.py);
+# o aquecimento começa no startup sem bloquear as demais rotas.
+@app.on_event("startup")
+def _aquecer_ocr():
+    if os.getenv("OCR_WARMUP", "1") != "0":
+        pool.warmup()
+
+
+@app.on_event("startup")
+async def _iniciar_fila_ocr():
+    # Schema criado uma vez aqui; as rotas só usam as conexões do backend/db.py
+    db.init_db()
+    ocr_cache.init_cache()
+    ocr_jobs.init_jobs()
+    ocr_jobs.iniciar_workers(
+        int(os.getenv("OCR_JOB_WORKERS", str(max(1, pool.workers)))),
+        executar=lambda image_bytes: _ocr_com_cache(image_bytes, esperar=True),
+        ao_concluir=_salvar_relatorio_job,
+    )
+
+
+@app.on_event("shutdown")
+def _encerrar_ocr():
+    ocr_jobs.parar_workers()
+    pool.shutdown()
+
+
+@app.get("/ocr_status")
+def ocr_status():
+    """
+    Informa a ocupação do pool de OCR e o estado de carga dos motores.
+    """
+    return pool.status()
+
+
+@app.get("/memoria")
+def memoria():
+    """
+    RSS/PSS/memória compartilhada deste processo e dos irmãos sob o mesmo
+    mestre (backend/serve.py); PSS somado é o custo real dos modelos em RAM.
+    """
+    from backend.serve import memoria_arvore
+
+    return memoria_arvore(int(os.getenv("SERVE_MESTRE_PID", os.getpid())))
+
+
+@app.get("/ocr_cache/stats")
+def ocr_cache_stats():
     """
-    Melhora contraste, remove ruído e binariza imagem para melhorar OCR manuscrito.
+    Acertos/erros do cache de OCR por conteúdo e ocupação atual.
     """
-    image = Image.open(io.BytesIO(image_bytes)).convert("L")  # escala de cinza
-    image = ImageEnhance.Contrast(image).enhance(2.5)         # aumenta contraste
-    image = image.filter(ImageFilter.MedianFilter(size=3))    # suaviza ruído
+    return ocr_cache.stats()
 
-    # binarização com OpenCV
-    np_img = np.array(image)
-    _, thresh = cv2.threshold(np_img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-    return Image.fromarray(thresh)
+
+async def _ocr_com_cache(image_bytes, esperar=False):
+    """
+    Consulta o cache pelo hash da imagem antes de mandar a imagem ao pool.
+    O cache é SQLite (busy_timeout de 10s): get/put rodam numa thread para
+    não travar o event loop.
+    """
+    k = ocr_cache.chave(image_bytes)
+    with telemetry.medir("agrovet_etapa_segundos", etapa="cache"):
+        resultado = await asyncio.to_thread(ocr_cache.get, k)
+    if resultado is None:
+        with telemetry.medir("agrovet_etapa_segundos", etapa="ocr_total"):
+            resultado = await pool.run(processar_imagem, image_bytes, esperar=esperar)
+        telemetry.registrar_ocr(resultado)  # tempos medidos dentro do worker
+        await asyncio.to_thread(ocr_cache.put, k, resultado)
+    return resultado
 
 
 # ==========================================================
-# 🧠 Extração de texto híbrida
+# 📊 Métricas para o Prometheus: /metrics
 # ==========================================================
-def extract_text_from_image(image_bytes):
+def _coletar():
     """
-    Extrai texto da imagem com fallback híbrido e pré-processamento.
+    Valores lidos na hora da coleta: filas, cache de OCR e serviço de IA.
     """
-    text = ""
-    image = preprocess_image(image_bytes)
-    buf = io.BytesIO()
-    image.save(buf, format="PNG")
-    processed_bytes = buf.getvalue()
+    st = pool.status()
+    yield "agrovet_ocr_pool_pendentes", "gauge", {}, st["pendentes"]
+    yield "agrovet_ocr_pool_max_pendentes", "gauge", {}, st["max_pendentes"]
+    cache = ocr_cache.stats()
+    for origem in ("memoria", "sqlite"):
+        yield "agrovet_ocr_cache_hits_total", "counter", {"origem": origem}, cache[f"hits_{origem}"]
+    yield "agrovet_ocr_cache_misses_total", "counter", {}, cache["misses"]
+    yield "agrovet_ocr_cache_itens", "gauge", {"nivel": "memoria"}, cache["itens_memoria"]
+    yield "agrovet_ocr_cache_itens", "gauge", {"nivel": "sqlite"}, cache["itens_sqlite"]
+    ia = analise_ia.stats()
+    for campo in ("cache_hits", "chamadas", "falhas", "ocupado"):
+        yield "agrovet_analise_ia_total", "counter", {"evento": campo}, ia[campo]
+    yield "agrovet_analise_ia_em_andamento", "gauge", {}, ia["em_andamento"]
+    with db.conn() as c:
+        for tabela, fila in (("ocr_jobs", "ocr_jobs"), ("report_artifacts", "relatorios_pdf")):
+            for status, n in c.execute(f"SELECT status, COUNT(*) FROM {tabela} GROUP BY status"):
+                yield "agrovet_fila_itens", "gauge", {"fila": fila, "status": status}, n
 
-    # 1️⃣ PaddleOCR
-    try:
-        results =ocr_engine.readtext(processed_bytes)
-        if results and len(results[0]) > 0:
-            text = " ".join([line[1][0] for line in results[0]])
-    except Exception:
-        text = ""
-
-    # 2️⃣ EasyOCR
-    if len(text.strip()) < 10 or not re.search(r"\d+%", text):
-        try:
-            result = easy_engine.readtext(np.array(image), detail=0)
-            if result:
-                text = " ".join(result)
-        except Exception:
-            pass
-
-    # 3️⃣ Tesseract
-    if len(text.strip()) < 10 or not re.search(r"\d+%", text):
-        try:
-            text = pytesseract.image_to_string(image, lang="por")
-        except Exception:
-            pass
 
-    # 4️⃣ Limpeza final
-    text = text.replace("\n", " ").replace("  ", " ").strip()
-    return text
+telemetry.registrar_coletor(_coletar)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """
+    Contadores, histogramas de tempo por etapa/motor/consulta e filas, no
+    formato texto do Prometheus (deste processo).
+    """
+    return PlainTextResponse(telemetry.exportar(), media_type="text/plain; version=0.0.4")
 
 
 # ==========================================================
-# 🧮 Extração de métricas (regex inteligente)
+# 💾 Persistência das métricas extraídas
 # ==========================================================
-def parse_metrics(texto):
+def _linhas_relatorio(lista_metrics):
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [
+        (
+            metrics.get("nome_da_fazenda") or NOME_PADRAO,
+            agora,
+            metrics.get("taxa_prenhez"),
+            metrics.get("taxa_concepcao"),
+            metrics.get("taxa_servico"),
+            metrics.get("partos_estimados"),
+        )
+        for metrics in lista_metrics
+    ]
+
+
+def _salvar_relatorio(metrics):
     """
-    Usa expressões regulares para extrair métricas do texto OCR.
+    Grava as métricas de um OCR na tabela relatorios.
     """
+    _salvar_relatorios([metrics])
+
+
+def _salvar_relatorios(lista_metrics):
+    """
+    Grava várias métricas numa única transação (usado pelo lote).
+    """
+    if not lista_metrics:
+        return
     try:
-        nome = re.search(r"(?i)(fazenda[:\- ]*)([A-Za-zÀ-ÿ0-9 ]+)", texto)
-        prenhez = re.search(r"(?i)prenhe[z|s]?.*?(\d{1,3})\s*%", texto)
-        concepcao = re.search(r"(?i)concep[cç][aã]o.*?(\d{1,3})\s*%", texto)
-        servico = re.search(r"(?i)servi[cç]o.*?(\d{1,3})\s*%", texto)
-        partos = re.search(r"(?i)parto[s]?.*?(\d{1,3})", texto)
-
-        metrics = {
-            "nome_da_fazenda": nome.group(2).strip() if nome else "Extraído via OCR",
-            "taxa_prenhez": int(prenhez.group(1)) if prenhez else None,
-            "taxa_concepcao": int(concepcao.group(1)) if concepcao else None,
-            "taxa_servico": int(servico.group(1)) if servico else None,
-            "partos_estimados": int(partos.group(1)) if partos else None,
-        }
-        return metrics
+        db.insert_relatorios(_linhas_relatorio(lista_metrics))
     except Exception as e:
-        print(f"Erro ao extrair métricas: {e}")
-        return {}
+        print(f"⚠️ Erro ao salvar no banco: {e}")
+
+
+def _salvar_relatorio_job(c, metrics):
+    """
+    Grava as métricas de um job de OCR na transação que conclui o job
+    (backend/ocr_jobs.py); um erro aqui marca o job como erro.
+    """
+    db.insert_relatorios(_linhas_relatorio([metrics]), c=c)
 
 
 # ==========================================================
@@ -125,44 +203,19 @@ async def ocr_upload(file: UploadFile = File(...)):
     Recebe uma imagem, realiza OCR e salva resultados no SQLite.
     """
     try:
-        image_bytes = await file.read()
-        texto_extraido = extract_text_from_image(image_bytes)
-        metrics = parse_metrics(texto_extraido)
-
-        # --- Salva no banco SQLite ---
+        image_bytes = await upload.ler_upload(file)
         try:
-            conn = sqlite3.connect("backend/relatorios.db")
-            cur = conn.cursor()
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS relatorios (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    nome_da_fazenda TEXT,
-                    taxa_prenhez REAL,
-                    taxa_concepcao REAL,
-                    taxa_servico REAL,
-                    partos_estimados REAL,
-                    data TEXT
-                )
-            """)
-            conn.commit()
-
-            cur.execute("""
-                INSERT INTO relatorios (
-                    nome_da_fazenda, taxa_prenhez, taxa_concepcao,
-                    taxa_servico, partos_estimados, data
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                metrics.get("nome_da_fazenda"),
-                metrics.get("taxa_prenhez"),
-                metrics.get("taxa_concepcao"),
-                metrics.get("taxa_servico"),
-                metrics.get("partos_estimados"),
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            ))
-            conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"⚠️ Erro ao salvar no banco: {e}")
+            resultado = await _ocr_com_cache(image_bytes)
+        except PoolSaturado as e:
+            return JSONResponse(
+                status_code=503,
+                content={"erro": "⏳ OCR ocupado, tente novamente em instantes."},
+                headers={"Retry-After": str(e.retry_after)},
+            )
+        texto_extraido = resultado["texto_extraido"]
+        metrics = resultado["metricas"]
+
+        await asyncio.to_thread(_salvar_relatorio, metrics)
 
         return {
             "status": "✅ OCR processado com sucesso!",
@@ -170,28 +223,220 @@ async def ocr_upload(file: UploadFile = File(...)):
             "métricas": metrics
         }
 
+    except upload.UploadInvalido as e:
+        return JSONResponse(status_code=e.status_code, content={"erro": f"❌ {e}"})
     except Exception as e:
         return {"erro": f"❌ Falha no processamento: {str(e)}"}
 
 
+# ==========================================================
+# 📦 Lote de fichas: /ocr_upload/batch
+# ==========================================================
+EXTENSOES_IMAGEM = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+MAX_ARQUIVOS_LOTE = int(os.getenv("OCR_BATCH_MAX_FILES", "200"))
+
+
+def _expandir_arquivos(nome, conteudo, restante):
+    """
+    Devolve [(nome, bytes)]; arquivos .zip (pela assinatura, não pelo nome)
+    são abertos e só as imagens entram. ``restante`` ({"arquivos", "bytes"})
+    é o que ainda cabe no lote inteiro: o tamanho descompactado declarado de
+    cada membro é conferido (e descontado) antes de qualquer leitura, então
+    um .zip pequeno e muito compressível não expande além do limite. Membro
+    com extensão de imagem mas sem assinatura de imagem é recusado (415).
+
+    Descompacta de forma síncrona: quem chama roda numa thread.
+    """
+    if upload.formato(conteudo[:16]) != "zip":
+        _descontar(restante, nome, len(conteudo))
+        return [(nome, conteudo)]
+    with zipfile.ZipFile(io.BytesIO(conteudo)) as zf:
+        membros = [
+            info for info in zf.infolist()
+            if not info.is_dir()
+            and not info.filename.startswith("__MACOSX/")  # metadados do Finder, não imagens
+            and info.filename.lower().endswith(EXTENSOES_IMAGEM)
+        ]
+        for info in membros:
+            _descontar(restante, info.filename, info.file_size)
+        imagens = []
+        for info in membros:
+            dados = zf.read(info)
+            if upload.formato(dados[:16]) not in upload.IMAGENS:
+                raise upload.UploadInvalido(415, f"{info.filename}: não é uma imagem suportada")
+            imagens.append((info.filename, dados))
+        return imagens
+
+
+def _descontar(restante, nome, tamanho):
+    if tamanho > upload.MAX_BYTES:
+        raise upload.UploadInvalido(413, f"{nome}: maior que o limite por imagem")
+    restante["arquivos"] -= 1
+    restante["bytes"] -= tamanho
+    if restante["arquivos"] < 0:
+        raise upload.UploadInvalido(413, f"Máximo de {MAX_ARQUIVOS_LOTE} imagens por lote")
+    if restante["bytes"] < 0:
+        raise upload.UploadInvalido(413, f"Lote maior que {upload.MAX_LOTE_BYTES // (1024 * 1024)} MB descompactado")
+
+
+@app.post("/ocr_upload/batch")
+async def ocr_upload_batch(files: List[UploadFile] = File(...)):
+    """
+    Recebe várias imagens (ou .zip) e devolve NDJSON, uma linha por ficha,
+    na ordem em que cada uma termina. As fichas rodam em paralelo no pool de
+    OCR e as métricas são gravadas juntas numa única transação no final.
+    """
+    arquivos = []
+    restante = {"arquivos": MAX_ARQUIVOS_LOTE, "bytes": upload.MAX_LOTE_BYTES}
+    try:
+        for f in files:
+            conteudo = await upload.ler_upload(f, limite=upload.MAX_ZIP_BYTES, formatos=upload.IMAGENS + ("zip",))
+            arquivos.extend(await asyncio.to_thread(_expandir_arquivos, f.filename, conteudo, restante))
+    except upload.UploadInvalido as e:
+        raise HTTPException(status_code=e.status_code, detail=f"{f.filename}: {e}")
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Arquivo .zip inválido")
+    if not arquivos:
+        raise HTTPException(status_code=400, detail="Nenhuma imagem recebida")
+    if pool.status()["pendentes"] >= pool.max_pendentes:
+        return JSONResponse(
+            status_code=503,
+            content={"erro": "⏳ OCR ocupado, tente novamente em instantes."},
+            headers={"Retry-After": str(pool.retry_after)},
+        )
+
+    async def _processar(indice, nome, conteudo):
+        try:
+            resultado = await _ocr_com_cache(conteudo, esperar=True)
+            return {
+                "indice": indice,
+                "arquivo": nome,
+                "ok": True,
+                "texto_extraido": resultado["texto_extraido"],
+                "métricas": resultado["metricas"],
+            }
+        except Exception as e:
+            return {"indice": indice, "arquivo": nome, "ok": False, "erro": str(e)}
+
+    async def _stream():
+        tarefas = [
+            asyncio.ensure_future(_processar(i, nome, conteudo))
+            for i, (nome, conteudo) in enumerate(arquivos)
+        ]
+        extraidas = []
+        try:
+            for proxima in asyncio.as_completed(tarefas):
+                item = await proxima
+                if item["ok"]:
+                    extraidas.append(item["métricas"])
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            for t in tarefas:
+                t.cancel()
+            # shield: se o cliente desconectou, a gravação termina mesmo com o
+            # stream cancelado
+            await asyncio.shield(asyncio.to_thread(_salvar_relatorios, extraidas))
+
+    return StreamingResponse(_stream(), media_type="application/x-ndjson")
+
+
+# ==========================================================
+# 🧾 Jobs assíncronos de OCR: /ocr_jobs
+# ==========================================================
+@app.post("/ocr_jobs", status_code=202)
+async def criar_ocr_job(file: UploadFile = File(...)):
+    """
+    Enfileira a imagem e devolve o ID do job na hora; o OCR roda em segundo plano.
+    """
+    try:
+        image_bytes = await upload.ler_upload(file)
+    except upload.UploadInvalido as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    job_id = await ocr_jobs.criar_job(image_bytes, file.filename)
+    return {"job_id": job_id, "status": ocr_jobs.NA_FILA, "url": f"/ocr_jobs/{job_id}"}
+
+
+@app.get("/ocr_jobs/{job_id}")
+async def consultar_ocr_job(job_id: str, wait: float = 0):
+    """
+    Consulta o job. Com ``wait`` (segundos, máx. 60) segura a resposta até o
+    job terminar (long-poll).
+    """
+    job = await ocr_jobs.aguardar_job(job_id, min(max(wait, 0), 60))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
 # ==========================================================
 # 🔍 Endpoint de histórico (consulta SQLite)
 # ==========================================================
 @app.get("/relatorios")
 def listar_relatorios():
     try:
-        conn = sqlite3.connect("backend/relatorios.db")
-        cur = conn.cursor()
-        cur.execute("SELECT * FROM relatorios ORDER BY id DESC LIMIT 50")
-        rows = cur.fetchall()
-        conn.close()
-
-        colunas = [
-            "id", "nome_da_fazenda", "taxa_prenhez",
-            "taxa_concepcao", "taxa_servico",
-            "partos_estimados", "data"
-        ]
-
-        return [dict(zip(colunas, r)) for r in rows]
+        cols, rows = db.list_relatorios(limit=50)
+        return [dict(zip(cols, r)) for r in rows]
     except Exception as e:
         return {"erro": str(e)}
+
+
+@app.get("/relatorios/pagina")
+def paginar_relatorios(
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    order: str = "recentes",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+):
+    """
+    Histórico paginado por cursor (keyset sobre data + id). Passe o
+    ``next_cursor`` da resposta para buscar a página seguinte; ``None`` indica
+    que não há mais registros.
+    """
+    try:
+        cols, rows, next_cursor = db.page_relatorios(
+            search=search, date_from=date_from, date_to=date_to,
+            order=order, limit=min(max(limit, 1), 500), cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": [dict(zip(cols, r)) for r in rows], "next_cursor": next_cursor}
+
+
+@app.post("/relatorios/importar")
+def importar_relatorios(file: UploadFile = File(...), dedup: bool = True):
+    """
+    Importação em massa do histórico (CSV, XLSX ou NDJSON). O arquivo é lido
+    em streaming do upload e gravado em lotes; devolve contagens e vazão.
+    """
+    try:
+        formato = bulk_import.detectar_formato(file.filename or "")
+        return bulk_import.importar(file.file, formato=formato, dedup=dedup)
+    except (ValueError, zipfile.BadZipFile) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/relatorios/exportar")
+def exportar_relatorios(
+    formato: str = "xlsx",
+    search: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    order: str = "recentes",
+):
+    """
+    Exporta o histórico filtrado inteiro em XLSX ou PDF. As linhas saem do
+    SQLite em lotes e o arquivo é gerado em disco e removido após o envio.
+    """
+    if formato not in exports.FORMATOS:
+        raise HTTPException(status_code=400, detail="formato deve ser xlsx ou pdf")
+    caminho = exports.exportar_arquivo(
+        formato, search=search, date_from=date_from, date_to=date_to, order=order
+    )
+    return FileResponse(
+        caminho,
+        media_type=exports.FORMATOS[formato][0],
+        filename=exports.nome_arquivo(formato),
+        background=BackgroundTask(os.remove, caminho),
+    )
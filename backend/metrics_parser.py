@@ -0,0 +1,235 @@
+"""
+Extrator de métricas em uma única passada sobre o texto do OCR.
+
+O texto é quebrado em tokens por uma única regex compilada (palavra ou
+número) e percorrido uma vez por uma pequena máquina de estados: um rótulo
+(prenhez, concepção, serviço, partos, fazenda) abre o campo e o primeiro
+número que vem depois, antes do próximo rótulo, vira o valor. Assim um valor
+nunca "pula" para o campo vizinho, e não há ``.*?`` para retroceder em textos
+longos do Tesseract.
+
+Os rótulos são reconhecidos por um vocabulário normalizado (sem acento,
+minúsculo), com prefixos e distância de edição 1 para as grafias trocadas pelo
+OCR (prenhes/prenhez, concepcao/concepção, seruico...).
+"""
+from __future__ import annotations
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+NOME_PADRAO = "Extraído via OCR"
+CAMPOS_NUMERICOS = ("taxa_prenhez", "taxa_concepcao", "taxa_servico", "partos_estimados")
+
+# Número com milhar pt-BR ("1.200", "1.200,5") ou decimal com vírgula/ponto
+PADRAO_NUMERO = r"\d{1,3}(?:\.\d{3})+(?:,\d+)?|\d+(?:[.,]\d+)?"
+_MILHAR = re.compile(r"\d{1,3}(?:\.\d{3})+")
+
+_TOKEN = re.compile(rf"(?P<num>{PADRAO_NUMERO})(?P<pct>\s*%)?|(?P<palavra>[^\W\d_]+)")
+
+_VOCABULARIO = {
+    "fazenda": "nome_da_fazenda",
+    "prenhez": "taxa_prenhez",
+    "prenhes": "taxa_prenhez",
+    "prenhe": "taxa_prenhez",
+    "concepcao": "taxa_concepcao",
+    "concepcoes": "taxa_concepcao",
+    "servico": "taxa_servico",
+    "servicos": "taxa_servico",
+    "parto": "partos_estimados",
+    "partos": "partos_estimados",
+}
+_PREFIXOS = (
+    ("prenh", "taxa_prenhez"),
+    ("concep", "taxa_concepcao"),
+    ("servi", "taxa_servico"),
+    ("parto", "partos_estimados"),
+    ("fazend", "nome_da_fazenda"),
+)
+# Palavras comuns que começam com um prefixo de rótulo ou ficam a uma edição
+# de um: nunca são rótulo ("parte do lote 12" não é partos=12)
+_NAO_ROTULOS = frozenset({
+    "parte", "partes", "partir", "partiu", "partida", "partidas",
+    "servido", "servidos", "servir", "serviu", "servia", "servidor",
+    "fazendo", "conceicao",
+})
+# Distância de edição 1 só a partir deste tamanho: abaixo dele casa palavras
+# comuns demais (porto/parto)
+_MIN_APROXIMADO = 6
+# Confiança do rótulo conforme a forma como foi reconhecido
+_CONF_EXATO, _CONF_PREFIXO, _CONF_APROXIMADO = 1.0, 0.9, 0.7
+
+# Quantos tokens depois do rótulo ainda aceitamos o valor
+JANELA_VALOR = 8
+# Palavras máximas no nome da fazenda e o que encerra o nome antes disso
+MAX_PALAVRAS_NOME = 6
+_PARADAS_NOME = {"taxa", "taxas", "indice", "data", "media", "total"}
+_SEPARADORES_NOME = re.compile(r"[,;|\n]")
+
+
+def _normalizar(palavra: str) -> str:
+    return unicodedata.normalize("NFKD", palavra).encode("ascii", "ignore").decode().lower()
+
+
+def _dist_ate_1(a: str, b: str) -> bool:
+    """
+    True se a e b diferem por no máximo uma edição (troca, inserção ou remoção).
+    """
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = j = dif = 0
+    while i < len(a) and j < len(b):
+        if a[i] != b[j]:
+            dif += 1
+            if dif > 1:
+                return False
+            if len(a) == len(b):
+                i += 1
+            j += 1
+        else:
+            i += 1
+            j += 1
+    return dif + (len(b) - j) <= 1
+
+
+@lru_cache(maxsize=4096)
+def classificar_rotulo(palavra: str) -> Optional[Tuple[str, float]]:
+    """
+    Devolve (campo, confiança do rótulo) se a palavra for um rótulo conhecido.
+    """
+    norm = _normalizar(palavra)
+    campo = _VOCABULARIO.get(norm)
+    if campo:
+        return campo, _CONF_EXATO
+    if len(norm) < 5 or norm in _NAO_ROTULOS:
+        return None
+    for prefixo, campo in _PREFIXOS:
+        if norm.startswith(prefixo):
+            return campo, _CONF_PREFIXO
+    if len(norm) < _MIN_APROXIMADO:
+        return None
+    for termo, campo in _VOCABULARIO.items():
+        if len(termo) >= 5 and _dist_ate_1(norm, termo):
+            return campo, _CONF_APROXIMADO
+    return None
+
+
+def _tokens(texto: str) -> Iterator[Tuple[str, Any, int, int, bool]]:
+    for m in _TOKEN.finditer(texto):
+        if m.lastgroup == "palavra":
+            yield "palavra", m.group("palavra"), m.start(), m.end(), False
+        else:
+            yield "num", m.group("num"), m.start(), m.end(), m.group("pct") is not None
+
+
+def para_numero(bruto: str):
+    """
+    Texto numérico -> int/float, no formato brasileiro: com vírgula, "." é
+    milhar e "," decimal ("1.200,5"); sem vírgula, "." seguido de grupos de
+    exatamente três dígitos é milhar ("1.200" = 1200) e nos demais casos é
+    decimal ("78.5"). ValueError se não for número.
+    """
+    txt = bruto.strip()
+    if "," in txt:
+        txt = txt.replace(".", "").replace(",", ".")
+    elif _MILHAR.fullmatch(txt):
+        txt = txt.replace(".", "")
+    valor = float(txt)
+    return int(valor) if valor.is_integer() else valor
+
+
+def extrair_metricas(texto: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Uma passada pelo texto. Devolve ``{campo: {"valor", "inicio", "fim",
+    "confianca"}}`` só para os campos encontrados; ``inicio``/``fim`` vão do
+    rótulo até o valor.
+    """
+    achados: Dict[str, Dict[str, Any]] = {}
+    campo: Optional[str] = None  # campo aberto pelo último rótulo
+    conf_rotulo = 0.0
+    inicio_rotulo = 0
+    distancia = 0
+    nome_partes = []
+    nome_fim = 0
+    fim_anterior = 0
+
+    def _fechar_nome():
+        if nome_partes and "nome_da_fazenda" not in achados:
+            achados["nome_da_fazenda"] = {
+                "valor": " ".join(nome_partes),
+                "inicio": inicio_rotulo,
+                "fim": nome_fim,
+                "confianca": conf_rotulo,
+            }
+        nome_partes.clear()
+
+    texto = texto or ""
+    for tipo, valor, ini, fim, pct in _tokens(texto):
+        gap, fim_anterior = texto[fim_anterior:ini], fim
+        rotulo = classificar_rotulo(valor) if tipo == "palavra" else None
+        if rotulo is not None:
+            if campo == "nome_da_fazenda":
+                _fechar_nome()
+            campo, conf_rotulo = rotulo
+            inicio_rotulo, distancia = ini, 0
+            continue
+        if campo is None:
+            continue
+        distancia += 1
+
+        if campo == "nome_da_fazenda":
+            if (
+                (tipo == "num" and pct)
+                or len(nome_partes) >= MAX_PALAVRAS_NOME
+                or (nome_partes and _SEPARADORES_NOME.search(gap))
+                or _normalizar(valor) in _PARADAS_NOME
+            ):
+                _fechar_nome()
+                campo = None
+            else:
+                nome_partes.append(valor)
+                nome_fim = fim
+            continue
+
+        if tipo != "num" or distancia > JANELA_VALOR:
+            if distancia > JANELA_VALOR:
+                campo = None
+            continue
+
+        numero = para_numero(valor)
+        taxa = campo.startswith("taxa_")
+        if taxa and not 0 <= numero <= 100:
+            continue
+        conf = conf_rotulo * (1.0 if (pct or not taxa) else 0.8) * max(0.5, 1 - 0.05 * (distancia - 1))
+        atual = achados.get(campo)
+        # Taxa sem % fica provisória: um número com % logo depois a substitui
+        if atual is None or (atual.get("provisorio") and pct):
+            achados[campo] = {
+                "valor": numero,
+                "inicio": inicio_rotulo,
+                "fim": fim,
+                "confianca": round(conf, 3),
+                "provisorio": taxa and not pct,
+            }
+        if pct or not taxa:
+            campo = None
+
+    if campo == "nome_da_fazenda":
+        _fechar_nome()
+    for v in achados.values():
+        v.pop("provisorio", None)
+    return achados
+
+
+def metricas_simples(texto: str) -> Dict[str, Any]:
+    """
+    Mesmo formato que parse_metrics sempre devolveu: só os valores.
+    """
+    achados = extrair_metricas(texto)
+    metrics = {"nome_da_fazenda": achados.get("nome_da_fazenda", {}).get("valor") or NOME_PADRAO}
+    for campo in CAMPOS_NUMERICOS:
+        metrics[campo] = achados[campo]["valor"] if campo in achados else None
+    return metrics
@@ -0,0 +1,364 @@
+"""
+Pipeline OCR: pré-processamento, extração de texto e parsing das métricas.
+
+Fica separado de main.py para que os workers do pool de processos
+(backend/ocr_pool.py) importem só o pipeline, sem criar a aplicação FastAPI.
+"""
+import json, os, re, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np, cv2
+
+from backend import ocr_roi, tesseract_engine, upload
+from backend.metrics_parser import NOME_PADRAO, PADRAO_NUMERO, para_numero, extrair_metricas, metricas_simples
+from backend.ocr_engines import registry, LANGS_PT, LANGS_PT_EN
+
+# Versão do pipeline (pré-processamento + motores + parser). Faz parte da chave
+# do cache de OCR: altere sempre que uma mudança puder alterar o resultado.
+PIPELINE_VERSION = "7"
+
+
+def assinatura_config():
+    """
+    Configuração lida do ambiente que muda o resultado do OCR (cascata,
+    limiar, resolução, ROI, modo de inferência, backend do Tesseract). Entra
+    na chave do cache junto com PIPELINE_VERSION: trocar qualquer uma delas
+    não serve resultado antigo.
+    """
+    from backend import ocr_quant
+
+    return json.dumps({
+        "cascata": CASCADE,
+        "cascata_modo": CASCADE_MODE,
+        "min_conf": MIN_CONFIANCA,
+        "dpi": TARGET_DPI,
+        "roi": ocr_roi.ROI_ATIVO,
+        "roi_template": ocr_roi.TEMPLATE,
+        "inferencia": ocr_quant.MODO,
+        "gpu": registry.gpu,
+        "tesseract": [tesseract_engine.tesserocr is not None, tesseract_engine.LANG],
+    }, sort_keys=True, default=str)
+
+# Quantas regiões de texto detectadas vão juntas para o reconhecedor
+# (o padrão do EasyOCR é 1, ou seja, uma inferência por região).
+RECOG_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "16"))
+
+
+# ==========================================================
+# 🧩 Pré-processamento da imagem
+# ==========================================================
+# Fotos de celular (12MP+) são reduzidas para a resolução útil de uma folha A4
+# digitalizada: o lado maior da folha (11,69") na resolução alvo.
+TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "200"))
+LADO_MAX_PX = int(11.69 * TARGET_DPI)
+
+# Decodificação reduzida por fator (o JPEG é reduzido já na DCT, sem expandir
+# a foto em resolução cheia)
+_IMREAD_REDUZIDO = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+def preprocess_image(image_bytes, etapas=None):
+    """
+    Melhora contraste, remove ruído e binariza imagem para melhorar OCR manuscrito.
+
+    Decodifica direto para um array em escala de cinza e faz todas as etapas
+    no mesmo buffer; o array resultante é entregue a todos os motores. Fotos
+    muito acima de LADO_MAX_PX já são decodificadas em 1/2, 1/4 ou 1/8.
+    Com ``etapas`` (dict), grava o tempo de "decode" e "preprocess".
+    """
+    t0 = time.perf_counter()
+    flag = _IMREAD_REDUZIDO[upload.fator_reducao(image_bytes, LADO_MAX_PX)]
+    img = cv2.imdecode(np.frombuffer(image_bytes, dtype=np.uint8), flag)
+    if img is None:
+        raise ValueError("Imagem inválida ou formato não suportado")
+    t1 = time.perf_counter()
+
+    h, w = img.shape
+    escala = LADO_MAX_PX / max(h, w)
+    if escala < 1:
+        img = cv2.resize(img, (int(w * escala), int(h * escala)), interpolation=cv2.INTER_AREA)
+
+    # contraste 2.5x em torno da média (mesma fórmula do ImageEnhance.Contrast)
+    media = float(img.mean())
+    cv2.addWeighted(img, 2.5, img, 0, -1.5 * media, dst=img)
+    cv2.medianBlur(img, 3, dst=img)                            # suaviza ruído
+    cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=img)
+    if etapas is not None:
+        etapas["decode"] = round(t1 - t0, 4)
+        etapas["preprocess"] = round(time.perf_counter() - t1, 4)
+    return img
+
+
+# ==========================================================
+# 🔌 Motores OCR
+# ==========================================================
+# Cada motor recebe a imagem pré-processada e devolve [(texto, confiança 0..1)],
+# uma entrada por linha/região reconhecida. Novos motores entram via
+# registrar_motor() e passam a valer na cascata pelo nome em OCR_CASCADE.
+MOTORES = {}
+
+
+def registrar_motor(nome, fn):
+    MOTORES[nome] = fn
+
+
+def _motor_easyocr(langs):
+    def _run(image):
+        linhas = registry.get_reader(langs).readtext(
+            np.asarray(image), detail=1, batch_size=RECOG_BATCH_SIZE
+        )
+        return [(texto, float(conf)) for _, texto, conf in linhas]
+    return _run
+
+
+registrar_motor("easyocr_pt", _motor_easyocr(LANGS_PT))
+registrar_motor("easyocr_pt_en", _motor_easyocr(LANGS_PT_EN))
+# Tesseract no próprio processo (tesserocr), com fallback para pytesseract
+registrar_motor("tesseract", tesseract_engine.reconhecer)
+
+
+# ==========================================================
+# 🪜 Cascata por confiança
+# ==========================================================
+# Ordem do mais barato para o mais caro; a cascata para no primeiro motor que
+# encontra todos os campos obrigatórios com confiança suficiente.
+CASCADE = [m.strip() for m in os.getenv("OCR_CASCADE", "tesseract,easyocr_pt,easyocr_pt_en").split(",") if m.strip()]
+CASCADE_MODE = os.getenv("OCR_CASCADE_MODE", "sequencial")  # sequencial | paralelo
+MIN_CONFIANCA = float(os.getenv("OCR_MIN_CONF", "0.5"))
+CAMPOS_OBRIGATORIOS = ("taxa_prenhez", "taxa_concepcao", "taxa_servico", "partos_estimados")
+
+
+def _juntar_linhas(linhas):
+    """
+    Junta as linhas num texto só, guardando o intervalo de cada uma para
+    mapear depois cada campo encontrado de volta à confiança da linha.
+    """
+    partes, spans, pos = [], [], 0
+    for texto, conf in linhas:
+        texto = texto.replace("\n", " ").strip()
+        if not texto:
+            continue
+        partes.append(texto)
+        spans.append((pos, pos + len(texto), conf))
+        pos += len(texto) + 1
+    return " ".join(partes), spans
+
+
+def _avaliar(linhas):
+    texto, spans = _juntar_linhas(linhas)
+    confianca = {}
+    for campo, achado in extrair_metricas(texto).items():
+        if campo not in CAMPOS_OBRIGATORIOS:
+            continue
+        inicio, fim = achado["inicio"], achado["fim"]
+        confs = [c for a, b, c in spans if a < fim and b > inicio]
+        confianca[campo] = round(min(confs) * achado["confianca"], 3) if confs else 0.0
+    aprovado = all(confianca.get(c, 0.0) >= MIN_CONFIANCA for c in CAMPOS_OBRIGATORIOS)
+    return {"texto": texto, "confianca": confianca, "aprovado": aprovado}
+
+
+def _executar_motor(nome, image):
+    t0 = time.perf_counter()
+    try:
+        resultado = _avaliar(MOTORES[nome](image))
+    except Exception as e:
+        resultado = {"texto": "", "confianca": {}, "aprovado": False, "erro": str(e)}
+    resultado["motor"] = nome
+    resultado["tempo_s"] = round(time.perf_counter() - t0, 4)
+    return resultado
+
+
+def _melhor(resultados):
+    # Nenhum motor aprovado: fica com o que achou mais campos (e mais confiantes)
+    return max(
+        resultados,
+        key=lambda r: (len(r["confianca"]), sum(r["confianca"].values())),
+    )
+
+
+# Threads do modo paralelo: um executor por processo, reaproveitado entre
+# imagens, para que cada thread mantenha o seu handle do Tesseract
+# (backend/tesseract_engine.py) em vez de recarregar o traineddata.
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _executor_cascata():
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=max(1, len(CASCADE)), thread_name_prefix="ocr-cascata")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def run_cascade(image):
+    """
+    Roda os motores de OCR_CASCADE sobre a imagem pré-processada e devolve o
+    primeiro resultado aprovado (ou o melhor, se nenhum for). No modo
+    ``paralelo`` todos disparam juntos e vale o primeiro aprovado a terminar.
+    """
+    motores = [m for m in CASCADE if m in MOTORES]
+    resultados = []
+    if CASCADE_MODE == "paralelo" and len(motores) > 1:
+        futuros = [_executor_cascata().submit(_executar_motor, m, image) for m in motores]
+        try:
+            for fut in as_completed(futuros):
+                resultados.append(fut.result())
+                if resultados[-1]["aprovado"]:
+                    break
+        finally:
+            for fut in futuros:
+                fut.cancel()  # os que já começaram terminam na própria thread
+    else:
+        for m in motores:
+            resultados.append(_executar_motor(m, image))
+            if resultados[-1]["aprovado"]:
+                break
+
+    if not resultados:
+        return {"texto": "", "motor": None, "aprovado": False, "confianca": {}, "tempos": {}}
+    escolhido = resultados[-1] if resultados[-1]["aprovado"] else _melhor(resultados)
+    return {
+        "texto": escolhido["texto"],
+        "motor": escolhido["motor"],
+        "aprovado": escolhido["aprovado"],
+        "confianca": escolhido["confianca"],
+        "tempos": {r["motor"]: r["tempo_s"] for r in resultados},
+    }
+
+
+# ==========================================================
+# 🧠 Extração de texto
+# ==========================================================
+def _extrair_por_roi(image):
+    """
+    Reconhece só as linhas da tabela de métricas (backend/ocr_roi.py). Devolve
+    o resultado no formato da cascata, com ``campos`` rotulados, ou None se
+    algum campo obrigatório não foi achado com confiança suficiente.
+    """
+    t0 = time.perf_counter()
+    try:
+        lidos = ocr_roi.extrair_campos(image, batch_size=RECOG_BATCH_SIZE)
+    except Exception:
+        return None, round(time.perf_counter() - t0, 4)
+    tempo = round(time.perf_counter() - t0, 4)
+
+    campos = {campo: texto for campo, (texto, _) in lidos.items()}
+    valores = parse_metrics(campos)
+    confianca = {
+        campo: round(lidos[campo][1], 3)
+        for campo in CAMPOS_OBRIGATORIOS
+        if campo in lidos and valores.get(campo) is not None
+    }
+    if not all(confianca.get(c, 0.0) >= MIN_CONFIANCA for c in CAMPOS_OBRIGATORIOS):
+        return None, tempo
+    return {
+        "texto": " ".join(campos.values()),
+        "campos": campos,
+        "motor": "roi",
+        "aprovado": True,
+        "confianca": confianca,
+        "tempos": {"roi": tempo},
+    }, tempo
+
+
+def extrair_texto_detalhado(image_bytes):
+    """
+    Pré-processa e tenta primeiro só as regiões da tabela; se faltar campo,
+    roda a cascata na imagem inteira. Devolve texto, motor usado, confiança
+    por campo, o tempo de cada motor (``tempos``) e do pré-processamento
+    (``etapas``) e, quando veio das regiões, os ``campos`` rotulados.
+    """
+    etapas = {}
+    image = preprocess_image(image_bytes, etapas)
+    tempos = {}
+    if ocr_roi.ROI_ATIVO:
+        resultado, tempos["roi"] = _extrair_por_roi(image)
+        if resultado is not None:
+            resultado["etapas"] = etapas
+            return resultado
+    resultado = run_cascade(image)
+    resultado["tempos"] = {**tempos, **resultado["tempos"]}
+    resultado["etapas"] = etapas
+    resultado["texto"] = re.sub(r"\s+", " ", resultado["texto"]).strip()
+    return resultado
+
+
+def extract_text_from_image(image_bytes):
+    """
+    Extrai texto da imagem com a cascata de motores e pré-processamento.
+    """
+    return extrair_texto_detalhado(image_bytes)["texto"]
+
+
+# ==========================================================
+# 🧮 Extração de métricas
+# ==========================================================
+_PRIMEIRO_NUMERO = re.compile(f"({PADRAO_NUMERO})")
+_ROTULO_FAZENDA = re.compile(r"(?i)fazenda[:\- ]*(.*)")
+
+
+def _parse_campos(campos):
+    """
+    Métricas a partir de campos já rotulados ({campo: texto da região}): cada
+    região passa pelo extrator e, se o rótulo veio ilegível, vale o primeiro
+    número da região.
+    """
+    metrics = {"nome_da_fazenda": NOME_PADRAO}
+    nome = campos.get("nome_da_fazenda")
+    if nome:
+        m = _ROTULO_FAZENDA.search(nome)
+        metrics["nome_da_fazenda"] = (m.group(1) if m else nome).strip() or NOME_PADRAO
+    for campo in CAMPOS_OBRIGATORIOS:
+        texto = campos.get(campo) or ""
+        achado = extrair_metricas(texto).get(campo)
+        if achado is not None:
+            metrics[campo] = achado["valor"]
+        else:
+            m = _PRIMEIRO_NUMERO.search(texto)
+            metrics[campo] = para_numero(m.group(1)) if m else None
+    return metrics
+
+
+def parse_metrics(texto):
+    """
+    Extrai as métricas do texto OCR numa única passada (backend/metrics_parser.py).
+    Aceita também um dict de campos rotulados (saída das regiões de interesse).
+    """
+    try:
+        if isinstance(texto, dict):
+            return _parse_campos(texto)
+        return metricas_simples(texto)
+    except Exception as e:
+        print(f"Erro ao extrair métricas: {e}")
+        return {}
+
+
+# ==========================================================
+# ⚙️ Ponto de entrada dos workers
+# ==========================================================
+def processar_imagem(image_bytes):
+    """
+    Executa OCR + parsing numa única chamada (usada pelo pool de processos).
+    Os tempos voltam no resultado: o processo da API os registra na
+    telemetria (backend/telemetry.py), já que o worker não é coletado.
+    """
+    resultado = extrair_texto_detalhado(image_bytes)
+    t0 = time.perf_counter()
+    metricas = parse_metrics(resultado.get("campos") or resultado["texto"])
+    etapas = {**resultado["etapas"], "parse": round(time.perf_counter() - t0, 4)}
+    return {
+        "texto_extraido": resultado["texto"],
+        "metricas": metricas,
+        "motor": resultado["motor"],
+        "aprovado": resultado["aprovado"],
+        "confianca": resultado["confianca"],
+        "tempos": resultado["tempos"],
+        "etapas": etapas,
+    }
@@ -0,0 +1,174 @@
+"""
+Cache de resultados de OCR por conteúdo da imagem.
+
+A chave é o SHA-256 dos bytes enviados combinado com ``PIPELINE_VERSION`` e a
+configuração que afeta o resultado (``assinatura_config()`` em backend/ocr.py),
+então mudanças no pré-processamento, nos motores ou nas variáveis OCR_* invalidam
+o cache sozinhas. Os resultados ficam na tabela ``ocr_cache`` do SQLite, com
+um LRU em memória na frente; a limpeza respeita idade, quantidade e tamanho.
+
+Configuração por variáveis de ambiente:
+  OCR_CACHE_MEM_ITEMS    entradas no LRU em memória
+  OCR_CACHE_MAX_ITEMS    entradas no SQLite
+  OCR_CACHE_MAX_MB       tamanho total (texto + métricas) no SQLite
+  OCR_CACHE_MAX_DIAS     idade máxima de uma entrada
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from backend import db
+from backend.ocr import PIPELINE_VERSION, assinatura_config
+
+DDL = """
+CREATE TABLE IF NOT EXISTS ocr_cache (
+  chave TEXT PRIMARY KEY,
+  texto_extraido TEXT,
+  metricas TEXT,
+  tamanho INTEGER NOT NULL,
+  criado_em REAL NOT NULL,
+  acessado_em REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_cache_acesso ON ocr_cache(acessado_em);
+"""
+
+MEM_ITEMS = int(os.getenv("OCR_CACHE_MEM_ITEMS", "256"))
+MAX_ITEMS = int(os.getenv("OCR_CACHE_MAX_ITEMS", "20000"))
+MAX_BYTES = int(float(os.getenv("OCR_CACHE_MAX_MB", "64")) * 1024 * 1024)
+MAX_IDADE_S = float(os.getenv("OCR_CACHE_MAX_DIAS", "30")) * 86400
+LIMPAR_A_CADA = 50  # gravações entre duas passadas de limpeza
+
+_lock = threading.Lock()
+_lru: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()  # chave -> (criado_em, resultado)
+_stats = {"hits_memoria": 0, "hits_sqlite": 0, "misses": 0, "gravacoes": 0, "removidas": 0}
+_gravacoes_desde_limpeza = 0
+
+
+def init_cache() -> None:
+    with db.conn() as c:
+        c.executescript(DDL)
+
+
+_PREFIXO_CHAVE: Optional[bytes] = None
+
+
+def chave(image_bytes: bytes) -> str:
+    global _PREFIXO_CHAVE
+    if _PREFIXO_CHAVE is None:
+        _PREFIXO_CHAVE = hashlib.sha256((PIPELINE_VERSION + assinatura_config()).encode()).digest()
+    h = hashlib.sha256(_PREFIXO_CHAVE)
+    h.update(image_bytes)
+    return h.hexdigest()
+
+
+def _lembrar(k: str, resultado: Dict[str, Any], criado_em: float) -> None:
+    with _lock:
+        _lru[k] = (criado_em, resultado)
+        _lru.move_to_end(k)
+        while len(_lru) > MEM_ITEMS:
+            _lru.popitem(last=False)
+
+
+def get(k: str) -> Optional[Dict[str, Any]]:
+    agora = time.time()
+    with _lock:
+        item = _lru.get(k)
+        if item is not None:
+            if agora - item[0] <= MAX_IDADE_S:
+                _lru.move_to_end(k)
+                _stats["hits_memoria"] += 1
+                return item[1]
+            del _lru[k]  # vencida: a do SQLite também está
+    with db.conn() as c:
+        row = c.execute(
+            "SELECT texto_extraido, metricas, criado_em FROM ocr_cache WHERE chave=?", (k,)
+        ).fetchone()
+        if row is not None and agora - row[2] <= MAX_IDADE_S:
+            c.execute("UPDATE ocr_cache SET acessado_em=? WHERE chave=?", (agora, k))
+    if row is None or agora - row[2] > MAX_IDADE_S:
+        with _lock:
+            _stats["misses"] += 1
+        return None
+
+    resultado = {"texto_extraido": row[0], "metricas": json.loads(row[1]) if row[1] else {}}
+    _lembrar(k, resultado, row[2])
+    with _lock:
+        _stats["hits_sqlite"] += 1
+    return resultado
+
+
+def put(k: str, resultado: Dict[str, Any]) -> None:
+    global _gravacoes_desde_limpeza
+    texto = resultado.get("texto_extraido") or ""
+    metricas = json.dumps(resultado.get("metricas") or {}, ensure_ascii=False)
+    agora = time.time()
+    with db.conn() as c:
+        c.execute(
+            """
+            INSERT OR REPLACE INTO ocr_cache
+            (chave, texto_extraido, metricas, tamanho, criado_em, acessado_em)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (k, texto, metricas, len(texto.encode()) + len(metricas.encode()), agora, agora),
+        )
+    _lembrar(k, {"texto_extraido": texto, "metricas": resultado.get("metricas") or {}}, agora)
+    with _lock:
+        _stats["gravacoes"] += 1
+        _gravacoes_desde_limpeza += 1
+        limpar_agora = _gravacoes_desde_limpeza >= LIMPAR_A_CADA
+        if limpar_agora:
+            _gravacoes_desde_limpeza = 0
+    if limpar_agora:
+        limpar()
+
+
+def limpar() -> int:
+    """
+    Remove entradas vencidas e, se preciso, as menos acessadas até caber nos
+    limites de quantidade e tamanho. Devolve quantas foram removidas.
+    """
+    removidas = 0
+    limite = time.time() - MAX_IDADE_S
+    corte = []
+    with db.conn() as c:
+        cur = c.execute("DELETE FROM ocr_cache WHERE criado_em < ?", (limite,))
+        removidas += cur.rowcount
+        total, tamanho = c.execute("SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM ocr_cache").fetchone()
+        if total > MAX_ITEMS or tamanho > MAX_BYTES:
+            # Percorre do acesso mais antigo acumulando o que precisa sair
+            excesso_itens = max(0, total - MAX_ITEMS)
+            excesso_bytes = max(0, tamanho - MAX_BYTES)
+            for k, t in c.execute("SELECT chave, tamanho FROM ocr_cache ORDER BY acessado_em"):
+                if excesso_itens <= 0 and excesso_bytes <= 0:
+                    break
+                corte.append((k,))
+                excesso_itens -= 1
+                excesso_bytes -= t
+            c.executemany("DELETE FROM ocr_cache WHERE chave=?", corte)
+            removidas += len(corte)
+    # O LRU em memória acompanha: sem entradas vencidas nem removidas do SQLite
+    cortadas = {k for k, in corte}
+    with _lock:
+        for k in [k for k, (criado, _) in _lru.items() if criado < limite or k in cortadas]:
+            del _lru[k]
+        _stats["removidas"] += removidas
+    return removidas
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        s = dict(_stats)
+        s["itens_memoria"] = len(_lru)
+    consultas = s["hits_memoria"] + s["hits_sqlite"] + s["misses"]
+    s["taxa_acerto"] = round((s["hits_memoria"] + s["hits_sqlite"]) / consultas, 3) if consultas else None
+    with db.conn() as c:
+        s["itens_sqlite"], s["bytes_sqlite"] = c.execute(
+            "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM ocr_cache"
+        ).fetchone()
+    return s
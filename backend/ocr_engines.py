@@ -0,0 +1,126 @@
+"""
+Registro preguiçoso dos motores OCR (EasyOCR).
+
+Os modelos só são carregados no primeiro uso ou numa chamada explícita de
+``warmup()``; todos os conjuntos de idiomas compartilham o mesmo detector CRAFT,
+de modo que só os reconhecedores são carregados por idioma.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from backend import ocr_quant
+
+# Conjuntos de idiomas usados pelo pipeline (passe principal e fallback)
+LANGS_PT: Tuple[str, ...] = ("pt",)
+LANGS_PT_EN: Tuple[str, ...] = ("pt", "en")
+DEFAULT_LANGS: Tuple[Tuple[str, ...], ...] = (LANGS_PT, LANGS_PT_EN)
+
+# Atributos do Reader que pertencem ao detector e podem ser compartilhados
+_DETECTOR_ATTRS = ("detector", "get_textbox", "get_detector", "detect_network")
+
+
+class EngineRegistry:
+    """
+    Mantém um Reader por conjunto de idiomas, carregados sob demanda.
+    """
+
+    def __init__(self, gpu: bool = False):
+        self.gpu = gpu
+        self._lock = threading.Lock()
+        self._readers: Dict[Tuple[str, ...], Any] = {}
+        self._detector_owner: Optional[Any] = None
+        self._load_seconds: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._warmup_thread: Optional[threading.Thread] = None
+
+    def get_reader(self, langs: Iterable[str] = LANGS_PT):
+        key = tuple(langs)
+        reader = self._readers.get(key)
+        if reader is not None:
+            return reader
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is None:
+                reader = self._load(key)
+                self._readers[key] = reader
+        return reader
+
+    def _load(self, key: Tuple[str, ...]):
+        import easyocr
+
+        nome = "+".join(key)
+        t0 = time.perf_counter()
+        try:
+            # Modo de inferência (float32/int8/ONNX) e threads: backend/ocr_quant.py
+            kwargs = {}
+            if not self.gpu:
+                ocr_quant.configurar_threads()
+                kwargs = ocr_quant.reader_kwargs()
+            if self._detector_owner is None:
+                reader = easyocr.Reader(list(key), gpu=self.gpu, **kwargs)
+                if not self.gpu:
+                    ocr_quant.preparar_reader(reader, com_detector=True)
+                self._detector_owner = reader
+            else:
+                # Reaproveita o detector já carregado: só o reconhecedor é novo
+                reader = easyocr.Reader(list(key), gpu=self.gpu, detector=False, **kwargs)
+                if not self.gpu:
+                    ocr_quant.preparar_reader(reader, com_detector=False)
+                for attr in _DETECTOR_ATTRS:
+                    if hasattr(self._detector_owner, attr):
+                        setattr(reader, attr, getattr(self._detector_owner, attr))
+        except Exception as e:
+            self._errors[nome] = str(e)
+            raise
+        self._load_seconds[nome] = round(time.perf_counter() - t0, 3)
+        self._errors.pop(nome, None)
+        return reader
+
+    def warmup(self, langs: Iterable[Tuple[str, ...]] = DEFAULT_LANGS, background: bool = False) -> None:
+        """
+        Carrega antecipadamente os motores; com ``background=True`` roda numa
+        thread para não atrasar o início do servidor.
+        """
+        langs = list(langs)
+
+        def _run():
+            for key in langs:
+                try:
+                    self.get_reader(key)
+                except Exception:
+                    pass  # erro fica registrado em status()
+
+        if not background:
+            _run()
+            return
+        if self._warmup_thread and self._warmup_thread.is_alive():
+            return
+        self._warmup_thread = threading.Thread(target=_run, name="ocr-warmup", daemon=True)
+        self._warmup_thread.start()
+
+    def is_ready(self, langs: Iterable[Tuple[str, ...]] = DEFAULT_LANGS) -> bool:
+        return all(tuple(k) in self._readers for k in langs)
+
+    def status(self) -> Dict[str, Any]:
+        engines = {}
+        for key in DEFAULT_LANGS + tuple(k for k in self._readers if k not in DEFAULT_LANGS):
+            nome = "+".join(key)
+            engines[nome] = {
+                "carregado": key in self._readers,
+                "tempo_carga_s": self._load_seconds.get(nome),
+                "erro": self._errors.get(nome),
+            }
+        return {
+            "pronto": self.is_ready(),
+            "aquecendo": bool(self._warmup_thread and self._warmup_thread.is_alive()),
+            "detector_compartilhado": self._detector_owner is not None,
+            "inferencia": ocr_quant.status() if not self.gpu else {"modo": "gpu"},
+            "motores": engines,
+        }
+
+
+registry = EngineRegistry(gpu=os.getenv("OCR_GPU", "0") == "1")
@@ -0,0 +1,281 @@
+"""
+Fila de jobs de OCR persistida no SQLite (mesmo banco de backend/db.py).
+
+O upload só grava a imagem na tabela ``ocr_jobs`` e devolve o ID; workers
+assíncronos do próprio servidor retiram os jobs da fila, executam o pipeline
+no pool de processos e gravam o resultado. Como a fila está no banco, jobs
+sobrevivem a reinícios e vários processos uvicorn podem consumi-la juntos.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from backend import db
+
+DDL = """
+CREATE TABLE IF NOT EXISTS ocr_jobs (
+  id TEXT PRIMARY KEY,
+  status TEXT NOT NULL,
+  nome_arquivo TEXT,
+  imagem BLOB,
+  texto_extraido TEXT,
+  metricas TEXT,
+  erro TEXT,
+  criado_em TEXT NOT NULL,
+  iniciado_em TEXT,
+  concluido_em TEXT,
+  dono TEXT,
+  heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS idx_ocr_jobs_status ON ocr_jobs(status, criado_em);
+"""
+
+NA_FILA, PROCESSANDO, CONCLUIDO, ERRO = "na_fila", "processando", "concluido", "erro"
+FINAIS = (CONCLUIDO, ERRO)
+
+# Intervalo máximo entre consultas à fila quando não há aviso de job novo
+# (jobs criados por outro processo só são vistos por polling).
+POLL_SEGUNDOS = float(os.getenv("OCR_JOBS_POLL", "1.0"))
+
+# Job em execução tem dono (db.dono_processo) e heartbeat renovado a cada
+# LEASE_SEGUNDOS/3. Só volta para a fila o job cujo heartbeat venceu: um worker
+# que sobe não retoma o que os irmãos (backend/serve.py) ainda processam.
+LEASE_SEGUNDOS = float(os.getenv("OCR_JOBS_LEASE", "60"))
+
+_novo_job: Optional[asyncio.Event] = None
+_eventos: Dict[str, asyncio.Event] = {}
+_esperando: Dict[str, int] = {}  # long-polls ativos por job; o evento sai com o último
+_tarefas: List[asyncio.Task] = []
+
+
+def _agora() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def init_jobs() -> None:
+    with db.conn() as c:
+        c.executescript(DDL)
+        db.garantir_coluna(c, "ocr_jobs", "dono", "TEXT")
+        db.garantir_coluna(c, "ocr_jobs", "heartbeat", "REAL")
+    _recolocar_vencidos()
+
+
+def _recolocar_vencidos() -> int:
+    # Jobs de processos que morreram (heartbeat vencido) voltam para a fila
+    with db.conn() as c:
+        return c.execute(
+            """
+            UPDATE ocr_jobs SET status=?, iniciado_em=NULL, dono=NULL, heartbeat=NULL
+            WHERE status=? AND COALESCE(heartbeat, 0) < ?
+            """,
+            (NA_FILA, PROCESSANDO, time.time() - LEASE_SEGUNDOS),
+        ).rowcount
+
+
+def _renovar_lease() -> None:
+    with db.conn() as c:
+        c.execute(
+            "UPDATE ocr_jobs SET heartbeat=? WHERE dono=? AND status=?",
+            (time.time(), db.dono_processo(), PROCESSANDO),
+        )
+
+
+def _inserir_job(image_bytes: bytes, nome_arquivo: Optional[str]) -> str:
+    job_id = uuid.uuid4().hex
+    with db.conn() as c:
+        c.execute(
+            "INSERT INTO ocr_jobs (id, status, nome_arquivo, imagem, criado_em) VALUES (?, ?, ?, ?, ?)",
+            (job_id, NA_FILA, nome_arquivo, image_bytes, _agora()),
+        )
+    return job_id
+
+
+async def criar_job(image_bytes: bytes, nome_arquivo: Optional[str] = None) -> str:
+    # O SQLite roda numa thread para não travar o event loop (busy_timeout de 10s)
+    job_id = await asyncio.to_thread(_inserir_job, image_bytes, nome_arquivo)
+    if _novo_job is not None:
+        _novo_job.set()
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    with db.conn() as c:
+        row = c.execute(
+            """
+            SELECT id, status, nome_arquivo, texto_extraido, metricas, erro,
+                   criado_em, iniciado_em, concluido_em
+            FROM ocr_jobs WHERE id=?
+            """,
+            (job_id,),
+        ).fetchone()
+    if row is None:
+        return None
+    keys = ["id", "status", "nome_arquivo", "texto_extraido", "métricas", "erro",
+            "criado_em", "iniciado_em", "concluido_em"]
+    job = dict(zip(keys, row))
+    job["métricas"] = json.loads(job["métricas"]) if job["métricas"] else None
+    return job
+
+
+def _pegar_proximo() -> Optional[Tuple[str, bytes]]:
+    c = db.conn()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        row = c.execute(
+            "SELECT id, imagem FROM ocr_jobs WHERE status=? ORDER BY criado_em, rowid LIMIT 1",
+            (NA_FILA,),
+        ).fetchone()
+        if row is not None:
+            c.execute(
+                "UPDATE ocr_jobs SET status=?, iniciado_em=?, dono=?, heartbeat=? WHERE id=?",
+                (PROCESSANDO, _agora(), db.dono_processo(), time.time(), row[0]),
+            )
+        c.commit()
+        return row
+    except Exception:
+        c.rollback()
+        raise
+
+
+def _finalizar(
+    job_id: str,
+    resultado: Optional[Dict[str, Any]],
+    erro: Optional[str],
+    ao_concluir: Optional[Callable] = None,
+) -> None:
+    """
+    Grava o resultado do job e, no sucesso, chama ``ao_concluir(c, metricas)``
+    na mesma transação: o job só aparece concluído se o relatório entrou. Se o
+    lease venceu e outro processo retomou o job, nada é gravado.
+    """
+    c = db.conn()
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        cur = c.execute(
+            """
+            UPDATE ocr_jobs
+            SET status=?, texto_extraido=?, metricas=?, erro=?, concluido_em=?, imagem=NULL,
+                dono=NULL, heartbeat=NULL
+            WHERE id=? AND dono=? AND status=?
+            """,
+            (
+                ERRO if erro else CONCLUIDO,
+                resultado["texto_extraido"] if resultado else None,
+                json.dumps(resultado["metricas"], ensure_ascii=False) if resultado else None,
+                erro,
+                _agora(),
+                job_id,
+                db.dono_processo(),
+                PROCESSANDO,
+            ),
+        )
+        if cur.rowcount and resultado and ao_concluir is not None:
+            ao_concluir(c, resultado["metricas"])
+        c.commit()
+    except Exception:
+        c.rollback()
+        raise
+
+
+def _avisar(job_id: str) -> None:
+    ev = _eventos.get(job_id)
+    if ev is not None:
+        ev.set()
+
+
+async def _worker(executar: Callable, ao_concluir: Optional[Callable]) -> None:
+    while True:
+        try:
+            job = await asyncio.to_thread(_pegar_proximo)
+        except Exception as e:
+            print(f"⚠️ Erro ao consultar fila de OCR: {e}")
+            job = None
+        if job is None:
+            _novo_job.clear()
+            try:
+                await asyncio.wait_for(_novo_job.wait(), timeout=POLL_SEGUNDOS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+
+        job_id, imagem = job
+        try:
+            resultado = await executar(imagem)
+            await asyncio.to_thread(_finalizar, job_id, resultado, None, ao_concluir)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            try:
+                await asyncio.to_thread(_finalizar, job_id, None, str(e) or e.__class__.__name__)
+            except Exception as e2:
+                print(f"⚠️ Erro ao gravar falha do job {job_id}: {e2}")
+        _avisar(job_id)
+
+
+async def _manter_lease() -> None:
+    while True:
+        await asyncio.sleep(LEASE_SEGUNDOS / 3)
+        try:
+            await asyncio.to_thread(_renovar_lease)
+            if await asyncio.to_thread(_recolocar_vencidos):
+                _novo_job.set()
+        except Exception as e:
+            print(f"⚠️ Erro ao renovar lease dos jobs de OCR: {e}")
+
+
+def iniciar_workers(n: int, executar: Callable, ao_concluir: Optional[Callable] = None) -> None:
+    """
+    Sobe ``n`` consumidores da fila no event loop atual. ``executar`` recebe os
+    bytes da imagem e devolve ``{"texto_extraido", "metricas"}``; ``ao_concluir``
+    recebe a conexão e as métricas de cada job bem-sucedido, dentro da
+    transação que conclui o job (ex.: gravar em relatorios).
+    """
+    global _novo_job
+    _novo_job = asyncio.Event()
+    for _ in range(max(0, n)):
+        _tarefas.append(asyncio.create_task(_worker(executar, ao_concluir)))
+    if n > 0:
+        _tarefas.append(asyncio.create_task(_manter_lease()))
+
+
+def parar_workers() -> None:
+    while _tarefas:
+        _tarefas.pop().cancel()
+
+
+async def aguardar_job(job_id: str, timeout: float = 0) -> Optional[Dict[str, Any]]:
+    """
+    Long-poll: devolve o job assim que ele terminar ou quando ``timeout``
+    segundos se esgotarem, o que vier primeiro.
+    """
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + max(0.0, timeout)
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None or job["status"] in FINAIS or timeout <= 0:
+        return job
+    ev = _eventos.setdefault(job_id, asyncio.Event())
+    _esperando[job_id] = _esperando.get(job_id, 0) + 1
+    try:
+        while True:
+            restante = limite - loop.time()
+            if restante <= 0:
+                return job
+            try:
+                await asyncio.wait_for(ev.wait(), timeout=min(POLL_SEGUNDOS, restante))
+            except asyncio.TimeoutError:
+                pass
+            job = await asyncio.to_thread(get_job, job_id)
+            if job is None or job["status"] in FINAIS:
+                return job
+    finally:
+        # Cliente que desiste (timeout, desconexão) não deixa o evento para trás
+        _esperando[job_id] -= 1
+        if not _esperando[job_id]:
+            del _esperando[job_id]
+            _eventos.pop(job_id, None)
@@ -0,0 +1,129 @@
+"""
+Pool de processos para o trabalho de OCR (CPU-bound).
+
+Tira o pipeline do event loop do uvicorn e limita quantas imagens podem ficar
+pendentes; acima do limite, ``run()`` levanta ``PoolSaturado`` e a rota responde
+503 com Retry-After.
+
+Configuração por variáveis de ambiente:
+  OCR_WORKERS      nº de processos (0 = uma thread no próprio processo)
+  OCR_QUEUE_SIZE   máximo de imagens pendentes (em execução + na fila)
+  OCR_RETRY_AFTER  segundos sugeridos ao cliente quando o pool está cheio
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class PoolSaturado(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Pool de OCR saturado")
+        self.retry_after = retry_after
+
+
+def _init_worker() -> None:
+    # Cada processo carrega os modelos uma vez, antes de receber imagens
+    from backend import tesseract_engine
+    from backend.ocr_engines import registry
+    registry.warmup()
+    tesseract_engine.warmup()  # handle da thread que vai executar o OCR
+
+
+def _worker_status() -> Dict[str, Any]:
+    from backend import tesseract_engine
+    from backend.ocr_engines import registry
+    return {"pid": os.getpid(), **registry.status(), "tesseract": tesseract_engine.status()}
+
+
+class OCRPool:
+    def __init__(self, workers: int, max_pendentes: int, retry_after: int):
+        self.workers = workers
+        self.max_pendentes = max(1, max_pendentes)
+        self.retry_after = retry_after
+        self._executor: Optional[Executor] = None
+        self._pendentes = 0
+        self._status_workers: Dict[int, Dict[str, Any]] = {}
+        self._vaga: Optional[asyncio.Condition] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_worker
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr")
+        return self._executor
+
+    async def run(self, fn: Callable, *args, esperar: bool = False):
+        """
+        Executa ``fn(*args)`` no pool. Só é chamado a partir do event loop,
+        então o contador de pendentes dispensa lock. Com ``esperar=True``
+        (workers da fila de jobs) aguarda vaga em vez de levantar PoolSaturado.
+        """
+        if self._pendentes >= self.max_pendentes:
+            if not esperar:
+                raise PoolSaturado(self.retry_after)
+            async with self._get_vaga():
+                await self._vaga.wait_for(lambda: self._pendentes < self.max_pendentes)
+        self._pendentes += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self._pendentes -= 1
+            if self._vaga is not None:
+                async with self._vaga:
+                    self._vaga.notify()
+
+    def _get_vaga(self) -> asyncio.Condition:
+        if self._vaga is None:
+            self._vaga = asyncio.Condition()
+        return self._vaga
+
+    def warmup(self) -> None:
+        """
+        Sobe os processos já no startup para que o carregamento dos modelos
+        aconteça antes do primeiro upload.
+        """
+        if self.workers > 0:
+            ex = self._get_executor()
+            for _ in range(self.workers):
+                ex.submit(_worker_status).add_done_callback(self._guardar_status)
+        else:
+            from backend.ocr_engines import registry
+            registry.warmup(background=True)
+
+    def _guardar_status(self, fut) -> None:
+        if not fut.cancelled() and fut.exception() is None:
+            st = fut.result()
+            self._status_workers[st["pid"]] = st
+
+    def status(self) -> Dict[str, Any]:
+        if self.workers > 0:
+            motores = list(self._status_workers.values())
+        else:
+            from backend.ocr_engines import registry
+            motores = [registry.status()]
+        return {
+            "workers": self.workers,
+            "pendentes": self._pendentes,
+            "max_pendentes": self.max_pendentes,
+            "motores": motores,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_workers = int(os.getenv("OCR_WORKERS", str(min(2, os.cpu_count() or 1))))
+pool = OCRPool(
+    workers=_workers,
+    max_pendentes=int(os.getenv("OCR_QUEUE_SIZE", str(max(1, _workers) * 4))),
+    retry_after=int(os.getenv("OCR_RETRY_AFTER", "5")),
+)
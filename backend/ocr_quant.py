@@ -0,0 +1,192 @@
+"""
+Modo de inferência em CPU dos modelos do EasyOCR, escolhido por OCR_INFERENCE:
+
+  torch   pesos originais em float32 (referência para comparação)
+  int8    reconhecedor com quantização dinâmica int8 (LSTM + Linear); é o que
+          o EasyOCR já fazia por padrão em CPU, agora explícito e configurável
+  onnx    int8 no reconhecedor + detector CRAFT exportado para ONNX e
+          executado no ONNX Runtime
+
+O detector CRAFT é quase todo convolução, onde a quantização dinâmica do
+PyTorch não atua; por isso ele ganha com o ONNX Runtime e não com int8.
+
+OCR_THREADS fixa as threads intra-op do PyTorch/ONNX Runtime por processo.
+Sem ela, os núcleos são divididos entre os workers do pool (OCR_WORKERS),
+evitando que N processos disputem todos os núcleos ao mesmo tempo.
+
+O modelo ONNX é exportado uma vez para OCR_ONNX_DIR (padrão
+~/.EasyOCR/onnx) e reaproveitado pelos demais processos.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+MODOS = ("torch", "int8", "onnx")
+MODO = os.getenv("OCR_INFERENCE", "int8")
+if MODO not in MODOS:
+    raise ValueError(f"OCR_INFERENCE inválido: {MODO} (use {', '.join(MODOS)})")
+
+ONNX_DIR = Path(os.getenv("OCR_ONNX_DIR", str(Path.home() / ".EasyOCR" / "onnx")))
+ONNX_OPSET = 17
+
+_lock = threading.Lock()
+_threads: Optional[int] = None
+_detector_onnx: Optional["DetectorOnnx"] = None
+_erro: Optional[str] = None
+
+
+def threads_por_processo() -> int:
+    if os.getenv("OCR_THREADS"):
+        return max(1, int(os.environ["OCR_THREADS"]))
+    cpus = os.cpu_count() or 1
+    workers = int(os.getenv("OCR_WORKERS", str(min(2, cpus)))) or 1
+    return max(1, cpus // workers)
+
+
+def configurar_threads() -> int:
+    """
+    Aplica o limite de threads do PyTorch (uma vez por processo).
+    """
+    global _threads
+    with _lock:
+        if _threads is None:
+            import torch
+
+            _threads = threads_por_processo()
+            torch.set_num_threads(_threads)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # só pode ser chamado antes do primeiro trabalho paralelo
+        return _threads
+
+
+def apos_fork() -> None:
+    """
+    Reaplica o limite de threads num processo filho (fork a partir de um
+    processo que já carregou os modelos, ex.: backend/serve.py). A sessão do
+    ONNX Runtime não sobrevive ao fork (o pool de threads fica no pai), então
+    é reaberta; o arquivo .onnx continua o mesmo.
+    """
+    global _threads
+    with _lock:
+        _threads = None
+    n = configurar_threads()
+    if _detector_onnx is not None:
+        _detector_onnx.abrir(n)
+
+
+def reader_kwargs() -> Dict[str, Any]:
+    # O EasyOCR quantiza sozinho com quantize=True; aqui os pesos chegam em
+    # float32 e cada modo aplica (ou não) a sua conversão.
+    return {"quantize": False}
+
+
+# ==========================================================
+# 🔢 int8
+# ==========================================================
+def quantizar_reconhecedor(reader) -> None:
+    import torch
+
+    reader.recognizer = torch.quantization.quantize_dynamic(
+        reader.recognizer, {torch.nn.LSTM, torch.nn.Linear}, dtype=torch.qint8
+    )
+
+
+# ==========================================================
+# 📦 ONNX Runtime
+# ==========================================================
+class DetectorOnnx:
+    """
+    Substitui o CRAFT do Reader: recebe o mesmo tensor (1, 3, H, W) que
+    easyocr.detection.test_net passa e devolve (y, feature) como tensores.
+    """
+
+    def __init__(self, caminho: Path, threads: int):
+        self.caminho = caminho
+        self.abrir(threads)
+
+    def abrir(self, threads: int) -> None:
+        import onnxruntime as ort
+
+        opcoes = ort.SessionOptions()
+        opcoes.intra_op_num_threads = threads
+        opcoes.inter_op_num_threads = 1
+        opcoes.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.sessao = ort.InferenceSession(str(self.caminho), opcoes, providers=["CPUExecutionProvider"])
+        self.entrada = self.sessao.get_inputs()[0].name
+
+    def __call__(self, x):
+        import torch
+
+        y, feature = self.sessao.run(None, {self.entrada: x.detach().cpu().numpy()})
+        return torch.from_numpy(y), torch.from_numpy(feature)
+
+    def eval(self):
+        return self
+
+
+def _exportar_craft(detector, destino: Path) -> None:
+    import torch
+
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_suffix(f".{os.getpid()}.tmp")
+    modelo = getattr(detector, "module", detector)  # DataParallel -> modelo
+    modelo.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            modelo,
+            torch.zeros(1, 3, 640, 640),
+            str(tmp),
+            input_names=["input"],
+            output_names=["y", "feature"],
+            dynamic_axes={
+                "input": {0: "n", 2: "h", 3: "w"},
+                "y": {0: "n", 1: "h2", 2: "w2"},
+                "feature": {0: "n", 2: "h2", 3: "w2"},
+            },
+            opset_version=ONNX_OPSET,
+        )
+    os.replace(tmp, destino)  # outro processo exportando ao mesmo tempo não lê arquivo pela metade
+
+
+def detector_onnx(detector) -> "DetectorOnnx":
+    global _detector_onnx
+    with _lock:
+        if _detector_onnx is None:
+            caminho = ONNX_DIR / f"craft_opset{ONNX_OPSET}.onnx"
+            if not caminho.exists():
+                _exportar_craft(detector, caminho)
+            _detector_onnx = DetectorOnnx(caminho, threads_por_processo())
+        return _detector_onnx
+
+
+# ==========================================================
+# 🔧 Aplicação no Reader
+# ==========================================================
+def preparar_reader(reader, com_detector: bool) -> None:
+    """
+    Aplica o modo configurado num Reader recém-criado. ``com_detector`` é
+    False para os readers que só reaproveitam o detector do primeiro.
+    """
+    global _erro
+    if MODO in ("int8", "onnx"):
+        quantizar_reconhecedor(reader)
+    if MODO == "onnx" and com_detector:
+        try:
+            reader.detector = detector_onnx(reader.detector)
+        except Exception as e:
+            # Sem onnxruntime ou falha na exportação: segue com o CRAFT do PyTorch
+            _erro = str(e)
+
+
+def status() -> Dict[str, Any]:
+    return {
+        "modo": MODO,
+        "threads": _threads,
+        "detector_onnx": str(_detector_onnx.caminho) if _detector_onnx else None,
+        "erro": _erro,
+    }
@@ -0,0 +1,154 @@
+"""
+Regiões de interesse da ficha de controle reprodutivo.
+
+Em vez de passar a foto inteira pelo detector, localiza a folha (contorno +
+correção de perspectiva), recorta as linhas da tabela de métricas e manda só
+esses recortes ao reconhecedor do EasyOCR. Cada linha é classificada pelo
+rótulo (fazenda, prenhez, concepção, serviço, partos) e o resultado volta como
+campos rotulados para parse_metrics.
+
+Se OCR_ROI_TEMPLATE apontar para um JSON ``{campo: [x0, y0, x1, y1]}`` com
+coordenadas relativas (0..1) na folha corrigida, os recortes vêm direto do
+modelo e nem a segmentação de linhas é feita.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend.metrics_parser import classificar_rotulo
+from backend.ocr_engines import registry, LANGS_PT
+
+ROI_ATIVO = os.getenv("OCR_ROI", "1") != "0"
+_TEMPLATE_PATH = os.getenv("OCR_ROI_TEMPLATE", "")
+
+_PALAVRA = re.compile(r"[^\W\d_]+")
+
+Caixa = Tuple[int, int, int, int]  # x_min, x_max, y_min, y_max (formato do EasyOCR)
+
+
+def _carregar_template() -> Optional[Dict[str, List[float]]]:
+    if not _TEMPLATE_PATH:
+        return None
+    with open(_TEMPLATE_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+TEMPLATE = _carregar_template()
+
+
+# ==========================================================
+# 📄 Folha: contorno e perspectiva
+# ==========================================================
+def _ordenar_cantos(pts: np.ndarray) -> np.ndarray:
+    soma = pts.sum(axis=1)
+    dif = np.diff(pts, axis=1).ravel()
+    return np.array(
+        [pts[np.argmin(soma)], pts[np.argmin(dif)], pts[np.argmax(soma)], pts[np.argmax(dif)]],
+        dtype=np.float32,
+    )
+
+
+def localizar_documento(img: np.ndarray) -> np.ndarray:
+    """
+    Recorta e endireita a folha se houver um quadrilátero grande o bastante;
+    senão devolve a imagem como veio.
+    """
+    h, w = img.shape[:2]
+    contornos, _ = cv2.findContours(img, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for c in sorted(contornos, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(c) < 0.2 * h * w:
+            break
+        aprox = cv2.approxPolyDP(c, 0.02 * cv2.arcLength(c, True), True)
+        if len(aprox) != 4:
+            continue
+        tl, tr, br, bl = cantos = _ordenar_cantos(aprox.reshape(4, 2).astype(np.float32))
+        largura = int(max(np.linalg.norm(br - bl), np.linalg.norm(tr - tl)))
+        altura = int(max(np.linalg.norm(tr - br), np.linalg.norm(tl - bl)))
+        destino = np.array([[0, 0], [largura - 1, 0], [largura - 1, altura - 1], [0, altura - 1]], np.float32)
+        m = cv2.getPerspectiveTransform(cantos, destino)
+        return cv2.warpPerspective(img, m, (largura, altura), borderValue=255)
+    return img
+
+
+# ==========================================================
+# ✂️ Linhas da tabela
+# ==========================================================
+def segmentar_linhas(img: np.ndarray) -> List[Caixa]:
+    """
+    Agrupa o texto em faixas horizontais (rótulo + valor na mesma linha) por
+    dilatação morfológica e devolve uma caixa por faixa, de cima para baixo.
+    """
+    h, w = img.shape[:2]
+    tinta = cv2.bitwise_not(img)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, w // 12), max(1, h // 300)))
+    faixas = cv2.dilate(tinta, kernel)
+    contornos, _ = cv2.findContours(faixas, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    caixas: List[Caixa] = []
+    for c in contornos:
+        x, y, bw, bh = cv2.boundingRect(c)
+        if bh < h / 150 or bh > h / 6 or bw < w / 15:
+            continue  # ruído, bordas da folha ou blocos que não são linhas
+        pad = max(2, bh // 6)
+        caixas.append((max(0, x - pad), min(w, x + bw + pad), max(0, y - pad), min(h, y + bh + pad)))
+    return sorted(caixas, key=lambda b: b[2])
+
+
+def _caixas_template(img: np.ndarray) -> Dict[str, Caixa]:
+    h, w = img.shape[:2]
+    return {
+        campo: (int(x0 * w), int(x1 * w), int(y0 * h), int(y1 * h))
+        for campo, (x0, y0, x1, y1) in TEMPLATE.items()
+    }
+
+
+def classificar(texto: str) -> Optional[str]:
+    """
+    Campo da linha pelo primeiro rótulo reconhecido no vocabulário do extrator.
+    """
+    for palavra in _PALAVRA.findall(texto):
+        rotulo = classificar_rotulo(palavra)
+        if rotulo is not None:
+            return rotulo[0]
+    return None
+
+
+# ==========================================================
+# 🔎 Reconhecimento só nos recortes
+# ==========================================================
+def extrair_campos(img: np.ndarray, batch_size: int = 16) -> Dict[str, Tuple[str, float]]:
+    """
+    Devolve ``{campo: (texto da região, confiança)}`` para os campos achados.
+    """
+    folha = localizar_documento(img)
+    reader = registry.get_reader(LANGS_PT)
+
+    if TEMPLATE:
+        caixas = _caixas_template(folha)
+        lidos = reader.recognize(folha, horizontal_list=list(caixas.values()), free_list=[],
+                                 batch_size=batch_size)
+        # O EasyOCR reordena as regiões; cada resultado volta ao campo cuja
+        # caixa tem o canto superior esquerdo mais próximo.
+        campos = {}
+        for box, texto, conf in lidos:
+            x, y = box[0]
+            campo = min(caixas, key=lambda n: abs(caixas[n][0] - x) + abs(caixas[n][2] - y))
+            campos[campo] = (texto, float(conf))
+        return campos
+
+    caixas = segmentar_linhas(folha)
+    if not caixas:
+        return {}
+    lidos = reader.recognize(folha, horizontal_list=caixas, free_list=[], batch_size=batch_size)
+    campos: Dict[str, Tuple[str, float]] = {}
+    for _, texto, conf in sorted(lidos, key=lambda r: r[0][0][1]):
+        campo = classificar(texto)
+        if campo and campo not in campos:
+            campos[campo] = (texto, float(conf))
+    return campos
@@ -0,0 +1,325 @@
+"""
+Fila de renderização dos relatórios PDF (backend/pdf_report.py).
+
+A rota só registra o pedido e devolve o ID; um pool local de threads gera o
+PDF (layout + análise, que pode chamar a OpenAI) fora da requisição. Cada
+artefato é endereçado pelo hash das métricas: pedir de novo o mesmo relatório
+devolve o mesmo ID e reaproveita o arquivo já gerado. O índice fica na tabela
+``report_artifacts`` do SQLite e os arquivos em ``REPORTS_DIR``.
+
+Com vários workers web no mesmo banco, cada renderização em andamento tem
+dono (o processo) e heartbeat; só volta para a fila a que ficou sem heartbeat
+por REPORT_LEASE segundos, então um worker que sobe não refaz os PDFs que os
+irmãos ainda estão gerando.
+
+Configuração por variáveis de ambiente:
+  REPORTS_DIR        pasta dos PDFs (padrão data/history)
+  REPORT_WORKERS     threads de renderização (padrão 2)
+  REPORT_LEASE       segundos sem heartbeat até a renderização voltar à fila (padrão 120)
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from backend import db, telemetry
+
+DDL = """
+CREATE TABLE IF NOT EXISTS report_artifacts (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  hash TEXT NOT NULL UNIQUE,
+  nome_da_fazenda TEXT,
+  metricas TEXT NOT NULL,
+  texto_fonte TEXT,
+  status TEXT NOT NULL,
+  arquivo TEXT,
+  tamanho INTEGER,
+  erro TEXT,
+  criado_em TEXT NOT NULL,
+  concluido_em TEXT,
+  dono TEXT,
+  heartbeat REAL
+);
+CREATE INDEX IF NOT EXISTS idx_report_artifacts_concluidos ON report_artifacts(status, concluido_em);
+"""
+
+NA_FILA, PROCESSANDO, CONCLUIDO, ERRO = "na_fila", "processando", "concluido", "erro"
+
+# Sobe quando o layout do PDF muda, para não reaproveitar artefatos antigos
+RENDER_VERSION = "1"
+REPORTS_DIR = Path(os.getenv("REPORTS_DIR", "data/history"))
+WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+LEASE_SEGUNDOS = float(os.getenv("REPORT_LEASE", "120"))
+
+_COLUNAS = "id, hash, nome_da_fazenda, status, arquivo, tamanho, erro, criado_em, concluido_em"
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_lease: Optional[threading.Thread] = None
+_parar_lease = threading.Event()
+
+
+def _agora() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, WORKERS), thread_name_prefix="relatorio-pdf")
+        return _executor
+
+
+def hash_metricas(metrics: Dict[str, Any]) -> str:
+    """
+    SHA-256 das métricas normalizadas (chaves ordenadas, números como float)
+    mais RENDER_VERSION.
+    """
+    norm = {
+        k: float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+        for k, v in metrics.items()
+    }
+    h = hashlib.sha256(RENDER_VERSION.encode())
+    h.update(json.dumps(norm, sort_keys=True, ensure_ascii=False, default=str).encode())
+    return h.hexdigest()
+
+
+def init_reports() -> None:
+    global _lease
+    REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+    with db.conn() as c:
+        c.executescript(DDL)
+        db.garantir_coluna(c, "report_artifacts", "dono", "TEXT")
+        db.garantir_coluna(c, "report_artifacts", "heartbeat", "REAL")
+    _indexar_legado()
+    _recolocar_vencidos()
+    # Pendentes são submetidos aqui e nos irmãos; _renderizar só roda para quem
+    # ganhar o UPDATE de na_fila para processando.
+    pendentes = [r[0] for r in db.conn().execute("SELECT id FROM report_artifacts WHERE status=?", (NA_FILA,))]
+    for rid in pendentes:
+        _get_executor().submit(_renderizar, rid)
+    with _lock:
+        if _lease is None or not _lease.is_alive():
+            _parar_lease.clear()
+            _lease = threading.Thread(target=_manter_lease, name="relatorio-pdf-lease", daemon=True)
+            _lease.start()
+
+
+def _indexar_legado() -> None:
+    # Uma vez por banco: PDFs gravados em REPORTS_DIR antes do índice entram em
+    # report_artifacts como concluídos, para continuarem em /history. O hash
+    # "legado:<arquivo>" não colide com o SHA-256 das métricas.
+    c = db.conn()
+    if c.execute("SELECT 1 FROM relatorios_meta WHERE chave = 'historico_indexado'").fetchone():
+        return
+    indexados = {os.path.basename(r[0]) for r in c.execute("SELECT arquivo FROM report_artifacts WHERE arquivo IS NOT NULL")}
+    linhas = []
+    for arq in REPORTS_DIR.glob("*.pdf"):
+        if arq.name in indexados:
+            continue
+        st = arq.stat()
+        data = datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M:%S")
+        linhas.append((f"legado:{arq.name}", "{}", CONCLUIDO, str(arq), st.st_size, data, data))
+    with c:
+        c.executemany(
+            """
+            INSERT INTO report_artifacts (hash, metricas, status, arquivo, tamanho, criado_em, concluido_em)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(hash) DO NOTHING
+            """,
+            linhas,
+        )
+        c.execute("INSERT OR IGNORE INTO relatorios_meta VALUES ('historico_indexado', 1)")
+
+
+def _recolocar_vencidos() -> None:
+    # Renderizações de processos que morreram (heartbeat vencido) voltam para a fila
+    limite = time.time() - LEASE_SEGUNDOS
+    vencidos = [
+        r[0] for r in db.conn().execute(
+            "SELECT id FROM report_artifacts WHERE status=? AND COALESCE(heartbeat, 0) < ?",
+            (PROCESSANDO, limite),
+        )
+    ]
+    for rid in vencidos:
+        with db.conn() as c:
+            cur = c.execute(
+                """
+                UPDATE report_artifacts SET status=?, dono=NULL, heartbeat=NULL
+                WHERE id=? AND status=? AND COALESCE(heartbeat, 0) < ?
+                """,
+                (NA_FILA, rid, PROCESSANDO, limite),
+            )
+        if cur.rowcount:
+            _get_executor().submit(_renderizar, rid)
+
+
+def _manter_lease() -> None:
+    while not _parar_lease.wait(LEASE_SEGUNDOS / 3):
+        try:
+            with db.conn() as c:
+                c.execute(
+                    "UPDATE report_artifacts SET heartbeat=? WHERE dono=? AND status=?",
+                    (time.time(), db.dono_processo(), PROCESSANDO),
+                )
+            _recolocar_vencidos()
+        except Exception as e:
+            print(f"⚠️ Erro ao renovar lease dos relatórios: {e}")
+
+
+def _row(row) -> Optional[Dict[str, Any]]:
+    return dict(zip(_COLUNAS.split(", "), row)) if row else None
+
+
+def get_artifact(report_id: int) -> Optional[Dict[str, Any]]:
+    row = db.conn().execute(f"SELECT {_COLUNAS} FROM report_artifacts WHERE id=?", (report_id,)).fetchone()
+    return _row(row)
+
+
+def listar(limit: int = 100) -> List[Dict[str, Any]]:
+    cur = db.conn().execute(f"SELECT {_COLUNAS} FROM report_artifacts ORDER BY id DESC LIMIT ?", (limit,))
+    return [_row(r) for r in cur]
+
+
+def historico(limit: int = 500) -> List[Dict[str, Any]]:
+    """
+    PDFs prontos, mais recentes primeiro. Nome e tamanho vêm do índice
+    gravado junto com o arquivo, sem listar nem dar stat na pasta.
+    """
+    cur = db.conn().execute(
+        """
+        SELECT id, arquivo, tamanho, concluido_em FROM report_artifacts
+        WHERE status=? ORDER BY concluido_em DESC LIMIT ?
+        """,
+        (CONCLUIDO, limit),
+    )
+    return [
+        {"id": rid, "arquivo": os.path.basename(arquivo), "tamanho_kb": round((tamanho or 0) / 1024, 1),
+         "gerado_em": concluido_em}
+        for rid, arquivo, tamanho, concluido_em in cur
+    ]
+
+
+def enfileirar(metrics: Dict[str, Any], source_text: str = "") -> Dict[str, Any]:
+    """
+    Registra o relatório e agenda a renderização se ainda não existir um
+    artefato válido com o mesmo hash. Devolve o registro (id, status, ...).
+    """
+    h = hash_metricas(metrics)
+    with db.conn() as c:
+        novo = c.execute(
+            """
+            INSERT INTO report_artifacts (hash, nome_da_fazenda, metricas, texto_fonte, status, criado_em)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(hash) DO NOTHING
+            """,
+            (h, metrics.get("nome_da_fazenda"), json.dumps(metrics, ensure_ascii=False, default=str),
+             source_text, NA_FILA, _agora()),
+        ).rowcount == 1
+        row = c.execute(f"SELECT {_COLUNAS} FROM report_artifacts WHERE hash=?", (h,)).fetchone()
+    art = _row(row)
+
+    perdido = art["status"] == CONCLUIDO and not (art["arquivo"] and os.path.exists(art["arquivo"]))
+    if art["status"] == ERRO or perdido:
+        with db.conn() as c:
+            c.execute("UPDATE report_artifacts SET status=?, erro=NULL WHERE id=?", (NA_FILA, art["id"]))
+        art["status"], novo = NA_FILA, True
+    if novo:
+        _get_executor().submit(_renderizar, art["id"])
+    return art
+
+
+def _gerar_arquivo(h: str, metricas: str, texto: Optional[str], ao_atualizar=None) -> Path:
+    from backend.pdf_report import gerar_relatorio_pdf
+
+    destino = REPORTS_DIR / f"relatorio_{h[:16]}.pdf"
+    tmp = destino.with_suffix(f".{threading.get_ident()}.tmp")
+    try:
+        REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+        with telemetry.medir("agrovet_etapa_segundos", etapa="pdf"):
+            gerar_relatorio_pdf(json.loads(metricas), texto or "", str(tmp), ao_atualizar=ao_atualizar)
+        os.replace(tmp, destino)  # troca atômica: quem baixa nunca vê PDF pela metade
+    finally:
+        tmp.unlink(missing_ok=True)
+    return destino
+
+
+def _renderizar(report_id: int) -> None:
+    with db.conn() as c:
+        cur = c.execute(
+            "UPDATE report_artifacts SET status=?, dono=?, heartbeat=? WHERE id=? AND status=?",
+            (PROCESSANDO, db.dono_processo(), time.time(), report_id, NA_FILA),
+        )
+        if cur.rowcount == 0:
+            return  # outro worker já pegou
+        h, metricas, texto = c.execute(
+            "SELECT hash, metricas, texto_fonte FROM report_artifacts WHERE id=?", (report_id,)
+        ).fetchone()
+
+    # O PDF sai com a análise heurística; quando o modelo responder
+    # (backend/analise_ia.py), o mesmo artefato é re-renderizado com o texto novo.
+    atualizado = threading.Event()
+
+    def _ao_atualizar(_texto: str) -> None:
+        atualizado.set()
+        _get_executor().submit(_rerenderizar, report_id)
+
+    try:
+        destino = _gerar_arquivo(h, metricas, texto, _ao_atualizar)
+    except Exception as e:
+        with db.conn() as c:
+            c.execute(
+                """
+                UPDATE report_artifacts SET status=?, erro=?, concluido_em=?, dono=NULL, heartbeat=NULL
+                WHERE id=? AND dono=?
+                """,
+                (ERRO, str(e), _agora(), report_id, db.dono_processo()),
+            )
+        return
+    with db.conn() as c:
+        c.execute(
+            """
+            UPDATE report_artifacts SET status=?, arquivo=?, tamanho=?, concluido_em=?, dono=NULL, heartbeat=NULL
+            WHERE id=? AND dono=?
+            """,
+            (CONCLUIDO, str(destino), destino.stat().st_size, _agora(), report_id, db.dono_processo()),
+        )
+    if atualizado.is_set():
+        # a resposta chegou antes do "concluido": _rerenderizar não viu o artefato
+        _get_executor().submit(_rerenderizar, report_id)
+
+
+def _rerenderizar(report_id: int) -> None:
+    # Só troca o arquivo de um artefato pronto; status continua "concluido"
+    row = db.conn().execute(
+        "SELECT hash, metricas, texto_fonte FROM report_artifacts WHERE id=? AND status=?",
+        (report_id, CONCLUIDO),
+    ).fetchone()
+    if row is None:
+        return
+    try:
+        destino = _gerar_arquivo(*row)
+    except Exception:
+        return  # mantém o PDF com a análise heurística
+    with db.conn() as c:
+        c.execute(
+            "UPDATE report_artifacts SET tamanho=?, concluido_em=? WHERE id=?",
+            (destino.stat().st_size, _agora(), report_id),
+        )
+
+
+def shutdown(wait: bool = True) -> None:
+    global _executor
+    _parar_lease.set()
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait, cancel_futures=not wait)
+            _executor = None
@@ -1,23 +1,16 @@
 from fastapi import APIRouter
-import os
-from glob import glob
+
+from backend import report_queue
 
 router = APIRouter()
 
 @router.get("/history")
-def listar_historico():
+def listar_historico(limit: int = 500):
     """
     Lista os relatórios PDF salvos em data/history/.
-    Retorna nome e tamanho em KB de cada arquivo.
+    Retorna nome e tamanho em KB de cada arquivo, lidos do índice
+    report_artifacts (gravado junto com o PDF) em vez de varrer a pasta.
+    O PDF de cada item sai em GET /reports/{id}/pdf.
     """
-    os.makedirs("data/history", exist_ok=True)
-    arquivos = sorted(glob("data/history/*.pdf"), reverse=True)
-    historico = []
-    for arq in arquivos:
-        nome = os.path.basename(arq)
-        tamanho_kb = round(os.path.getsize(arq) / 1024, 1)
-        historico.append({
-            "arquivo": nome,
-            "tamanho_kb": tamanho_kb
-        })
+    historico = report_queue.historico(limit=min(max(limit, 1), 5000))
     return {"ok": True, "historico": historico}
@@ -1,13 +1,11 @@
 from fastapi import APIRouter, UploadFile, File
 from fastapi.responses import JSONResponse
 from loguru import logger
-import tempfile
-import shutil
 import os
 
-# Importa o pipeline e o gerador de PDF
+# Importa o pipeline; o PDF é gerado em segundo plano pela fila de relatórios
 from ai.ocr_pipeline import run_pipeline
-from ai.pdf_report import gerar_pdf_relatorio
+from backend import report_queue, telemetry, upload
 
 router = APIRouter()
 
@@ -15,21 +13,20 @@ router = APIRouter()
 async def upload_image(file: UploadFile = File(...)):
     """
     Endpoint que recebe imagem, executa OCR neural + parser
-    e gera automaticamente o PDF.
+    e enfileira o PDF (baixado depois em GET /reports/{id}/pdf).
     """
     tmp_path = None
 
     try:
-        # Salvar arquivo temporário
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmp_path = tmp.name
+        # Salvar arquivo temporário (em blocos, com limite e checagem do formato)
+        tmp_path = str(await upload.salvar_upload(file))
 
         logger.info(f"📥 Imagem recebida: {file.filename}")
         logger.info(f"📂 Caminho temporário: {tmp_path}")
 
         # Executar pipeline completo
-        result = run_pipeline(tmp_path)
+        with telemetry.medir("agrovet_etapa_segundos", etapa="pipeline"):
+            result = run_pipeline(tmp_path)
         logger.info(f"🔍 Retorno pipeline: {result}")
 
         # ✅ Adaptação: aceita ambos formatos (com ou sem 'data')
@@ -38,9 +35,9 @@ async def upload_image(file: UploadFile = File(...)):
 
         # Verifica se há métricas válidas
         if metrics and isinstance(metrics, dict):
-            # Gera o PDF automaticamente
-            nome_pdf = gerar_pdf_relatorio(metrics)
-            logger.info(f"📄 Relatório PDF gerado: {nome_pdf}")
+            # Enfileira o PDF; a resposta não espera layout nem análise de IA
+            art = report_queue.enfileirar(metrics, result.get("text", ""))
+            logger.info(f"📄 Relatório PDF #{art['id']} ({art['status']})")
 
             return JSONResponse(
                 {
@@ -48,7 +45,8 @@ async def upload_image(file: UploadFile = File(...)):
                     "message": "Processado com sucesso!",
                     "metrics": metrics,
                     "confidence": conf,
-                    "pdf": nome_pdf,
+                    "report_id": art["id"],
+                    "pdf": f"/reports/{art['id']}/pdf",
                 }
             )
 
@@ -59,6 +57,10 @@ async def upload_image(file: UploadFile = File(...)):
                 {"ok": False, "error": "Nenhum dado reconhecido na imagem."}
             )
 
+    except upload.UploadInvalido as e:
+        logger.warning(f"⚠️ Upload recusado ({e.status_code}): {e}")
+        return JSONResponse({"ok": False, "error": str(e)}, status_code=e.status_code)
+
     except Exception as e:
         logger.error(f"❌ Erro no upload OCR: {e}")
         return JSONResponse({"ok": False, "error": str(e)})
@@ -1,53 +1,64 @@
-import io
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse, JSONResponse
-from loguru import logger
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import JSONResponse
 
-from backend.db import init_db, save_report, list_reports, get_pdf_path
-from ai.pdf_dashboard import gerar_pdf
+from backend import db, report_queue
+from backend.file_serving import servir_arquivo
 
 router = APIRouter()
 
 @router.on_event("startup")
 def _startup():
-    init_db()
-    logger.info("SQLite inicializado.")
+    db.init_db()
+    report_queue.init_reports()
 
-@router.post("/reports/save")
-async def reports_save(payload: dict):
+@router.on_event("shutdown")
+def _shutdown():
+    report_queue.shutdown(wait=False)
+
+@router.post("/reports/save", status_code=202)
+def reports_save(payload: dict):
     """
     Corpo esperado:
     {
       "metrics": {...},
       "raw_text": "texto ocr"
     }
-    Gera o PDF, salva no SQLite + filesystem e retorna o id.
+    Enfileira a geração do PDF e retorna o id na hora; o arquivo fica
+    disponível em GET /reports/{id}/pdf quando o status for "concluido".
+    Métricas idênticas devolvem o mesmo id (o PDF não é gerado de novo).
     """
     metrics = payload.get("metrics") or {}
     raw_text = payload.get("raw_text") or ""
-    farm_name = str(metrics.get("nome_da_fazenda", "Fazenda"))
-
-    try:
-        pdf_bytes = gerar_pdf(metrics)
-        report_id = save_report(farm_name=farm_name, metrics=metrics, ocr_text=raw_text, pdf_bytes=pdf_bytes)
-        return {"ok": True, "id": report_id}
-    except Exception as e:
-        logger.exception("Falha ao salvar relatório")
-        raise HTTPException(status_code=500, detail=f"Erro ao salvar: {e}")
+    art = report_queue.enfileirar(metrics, raw_text)
+    return {"ok": True, "id": art["id"], "status": art["status"]}
 
 @router.get("/reports/list")
-async def reports_list():
-    return {"ok": True, "items": list_reports()}
+def reports_list():
+    return {"ok": True, "items": report_queue.listar()}
+
+@router.get("/reports/{report_id}")
+def reports_status(report_id: int):
+    art = report_queue.get_artifact(report_id)
+    if not art:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado")
+    return {"ok": True, **art}
 
 @router.get("/reports/{report_id}/pdf")
-async def reports_pdf(report_id: int):
-    path = get_pdf_path(report_id)
-    if not path:
+def reports_pdf(report_id: int, request: Request):
+    """
+    PDF do relatório sem carregar o arquivo em memória, com ETag /
+    Last-Modified (304 em GET condicional) e Range (206).
+    """
+    art = report_queue.get_artifact(report_id)
+    if not art:
         raise HTTPException(status_code=404, detail="Relatório não encontrado")
-    try:
-        with open(path, "rb") as f:
-            data = f.read()
-        return StreamingResponse(io.BytesIO(data), media_type="application/pdf",
-                                 headers={"Content-Disposition": f'attachment; filename="report_{report_id}.pdf"'})
-    except FileNotFoundError:
-        raise HTTPException(status_code=404, detail="Arquivo PDF não encontrado")
+    if art["status"] == report_queue.ERRO:
+        raise HTTPException(status_code=500, detail=f"Falha ao gerar o PDF: {art['erro']}")
+    if art["status"] != report_queue.CONCLUIDO:
+        # Ainda na fila: o cliente tenta de novo depois
+        return JSONResponse(
+            {"ok": False, "id": report_id, "status": art["status"]},
+            status_code=202,
+            headers={"Retry-After": "2"},
+        )
+    return servir_arquivo(request, art["arquivo"], "application/pdf", filename=f"report_{report_id}.pdf")
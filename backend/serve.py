@@ -0,0 +1,177 @@
+"""
+Modo de execução com modelos compartilhados entre workers (Gunicorn + preload).
+
+Com ``uvicorn --workers N`` cada worker importa backend/main.py e carrega os
+próprios readers do EasyOCR: a memória cresce linearmente com N. Aqui o
+processo mestre do Gunicorn carrega os modelos uma vez (preload_app) e só
+depois faz o fork dos workers UvicornWorker, que herdam as páginas dos pesos
+por copy-on-write. Para as páginas continuarem compartilhadas:
+
+- os modelos ficam em modo de inferência, sem gradiente (nada escreve nos
+  tensores de peso);
+- ``gc.collect()`` + ``gc.freeze()`` no mestre tiram os objetos carregados do
+  rastreamento do GC, que senão tocaria nos cabeçalhos deles em cada worker;
+- o OCR roda no próprio worker (OCR_WORKERS=0), sem um segundo nível de
+  processos, e OCR_THREADS divide os núcleos entre os workers.
+
+Uso (na raiz do repositório; ver Procfile, entrada ``web-preload``):
+
+    python -m backend.serve                  # sobe o servidor
+    python -m backend.serve --memoria PID    # RSS/PSS/compartilhada do mestre PID e filhos
+
+Configuração por variáveis de ambiente:
+  PORT              porta (padrão 10000)
+  WEB_CONCURRENCY   nº de workers (padrão 2)
+  WEB_TIMEOUT       timeout do worker em segundos (padrão 120)
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+WORKERS = int(os.getenv("WEB_CONCURRENCY", "2"))
+
+
+# ==========================================================
+# 📏 Memória por processo (/proc/<pid>/smaps_rollup)
+# ==========================================================
+def memoria_processo(pid: int) -> Dict[str, Any]:
+    """
+    RSS, PSS e memória compartilhada/privada (MB) de um processo. PSS divide
+    cada página compartilhada pelo número de processos que a usam: a soma do
+    PSS dos workers é o custo real em RAM.
+    """
+    campos: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for linha in f:
+                partes = linha.split()
+                if len(partes) >= 3 and partes[-1] == "kB":
+                    campos[partes[0].rstrip(":")] = int(partes[1])
+    except OSError:
+        return {"pid": pid, "erro": "smaps_rollup indisponível"}
+    mb = lambda *chaves: round(sum(campos.get(c, 0) for c in chaves) / 1024, 1)  # noqa: E731
+    return {
+        "pid": pid,
+        "rss_mb": mb("Rss"),
+        "pss_mb": mb("Pss"),
+        "compartilhada_mb": mb("Shared_Clean", "Shared_Dirty"),
+        "privada_mb": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+def _filhos(pid: int) -> List[int]:
+    filhos: List[int] = []
+    for tarefa in Path(f"/proc/{pid}/task").glob("*"):
+        try:
+            filhos.extend(int(p) for p in (tarefa / "children").read_text().split())
+        except OSError:
+            continue
+    return filhos
+
+
+def memoria_arvore(pid: int) -> Dict[str, Any]:
+    """
+    Memória do processo ``pid`` e de todos os descendentes, com totais.
+    """
+    pids, pendentes = [], [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        pids.append(atual)
+        pendentes.extend(_filhos(atual))
+    processos = [memoria_processo(p) for p in pids]
+    validos = [p for p in processos if "erro" not in p]
+    return {
+        "processos": processos,
+        "total_rss_mb": round(sum(p["rss_mb"] for p in validos), 1),
+        "total_pss_mb": round(sum(p["pss_mb"] for p in validos), 1),
+    }
+
+
+# ==========================================================
+# 🚀 Gunicorn
+# ==========================================================
+def _carregar_modelos() -> None:
+    import torch
+
+    from backend.ocr_engines import registry
+
+    torch.set_grad_enabled(False)
+    registry.warmup(background=False)
+    for reader in list(registry._readers.values()):
+        for nome in ("recognizer", "detector"):
+            modelo = getattr(reader, nome, None)
+            if isinstance(modelo, torch.nn.Module):
+                modelo.eval()
+                for p in modelo.parameters():
+                    p.requires_grad_(False)
+
+
+def _post_fork(server, worker) -> None:
+    from backend import ocr_quant
+
+    ocr_quant.apos_fork()
+
+
+def _post_worker_init(worker) -> None:
+    m = memoria_processo(os.getpid())
+    worker.log.info(
+        "worker %s: rss %.0f MB, pss %.0f MB, compartilhada %.0f MB",
+        m["pid"], m.get("rss_mb", 0), m.get("pss_mb", 0), m.get("compartilhada_mb", 0),
+    )
+
+
+def main() -> None:
+    from gunicorn.app.base import BaseApplication
+
+    # Antes de importar o app: OCR dentro do worker e núcleos divididos entre eles
+    os.environ.setdefault("OCR_WORKERS", "0")
+    os.environ.setdefault("OCR_THREADS", str(max(1, (os.cpu_count() or 1) // max(1, WORKERS))))
+    os.environ["SERVE_MESTRE_PID"] = str(os.getpid())  # lido por GET /memoria nos workers
+
+    class Servidor(BaseApplication):
+        def __init__(self, opcoes: Dict[str, Any]):
+            self.opcoes = opcoes
+            super().__init__()
+
+        def load_config(self):
+            for chave, valor in self.opcoes.items():
+                self.cfg.set(chave, valor)
+
+        def load(self):
+            # Roda uma vez no mestre (preload_app) antes do fork
+            if os.getenv("OCR_WARMUP", "1") != "0":
+                _carregar_modelos()
+            from backend.main import app
+
+            gc.collect()
+            gc.freeze()
+            return app
+
+    Servidor({
+        "bind": f"0.0.0.0:{os.getenv('PORT', '10000')}",
+        "workers": WORKERS,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        "preload_app": True,
+        "timeout": int(os.getenv("WEB_TIMEOUT", "120")),
+        "post_fork": _post_fork,
+        "post_worker_init": _post_worker_init,
+    }).run()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Servidor AgroVet com modelos pré-carregados.")
+    ap.add_argument("--memoria", type=int, metavar="PID", help="mostra a memória do mestre PID e filhos")
+    args, _ = ap.parse_known_args()
+    if args.memoria:
+        rel = memoria_arvore(args.memoria)
+        for p in rel["processos"]:
+            print(p)
+        print(f"total: rss {rel['total_rss_mb']} MB, pss {rel['total_pss_mb']} MB")
+        sys.exit(0)
+    sys.argv = sys.argv[:1]  # o Gunicorn lê sys.argv; a configuração vem das opções acima
+    main()
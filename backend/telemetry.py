@@ -0,0 +1,226 @@
+"""
+Instrumentação leve: contadores, histogramas e gauges em memória, expostos em
+GET /metrics no formato texto do Prometheus, e o cabeçalho Server-Timing com o
+tempo de cada etapa da requisição.
+
+- ``medir(metrica, **labels)`` cronometra um bloco (ou função, como
+  decorador) num histograma e soma o tempo à requisição atual;
+- ``contar(metrica, n, **labels)`` incrementa um contador;
+- ``registrar_coletor(fn)`` adiciona valores lidos na hora da coleta
+  (tamanho de filas, estatísticas que os módulos já mantêm).
+
+As etapas do OCR rodam nos processos do pool (backend/ocr_pool.py), que não
+compartilham memória com a API; por isso o pipeline devolve os próprios
+tempos no resultado e ``registrar_ocr()`` os registra no processo da API.
+
+Os valores são por processo: com vários workers web (backend/serve.py) cada
+coleta vê o worker que atendeu, identificado pelo label ``pid`` de
+``agrovet_processo_info``.
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+AJUDA = {
+    "agrovet_etapa_segundos": "Tempo por etapa do processamento (decode, preprocess, parse, pdf...)",
+    "agrovet_motor_segundos": "Tempo de cada motor de OCR executado",
+    "agrovet_db_segundos": "Tempo das consultas ao SQLite (backend/db.py)",
+    "agrovet_http_segundos": "Tempo até a resposta HTTP (cabeçalhos), por rota",
+    "agrovet_ocr_motor_escolhido_total": "Fichas resolvidas por motor",
+    "agrovet_ocr_fallbacks_total": "Motores extras tentados após o primeiro (cascata/ROI)",
+    "agrovet_ocr_sem_aprovacao_total": "Fichas em que nenhum motor atingiu a confiança mínima",
+    "agrovet_processo_info": "Processo que respondeu a esta coleta",
+    "agrovet_ocr_pool_pendentes": "Imagens em execução ou na fila do pool de OCR",
+    "agrovet_ocr_cache_hits_total": "Acertos do cache de OCR por nível",
+    "agrovet_ocr_cache_misses_total": "Consultas ao cache de OCR sem resultado",
+    "agrovet_fila_itens": "Itens por status nas filas persistidas (jobs de OCR, PDFs)",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_contadores: Dict[str, Dict[Labels, float]] = {}
+_histogramas: Dict[str, Dict[Labels, List[float]]] = {}  # [contagem por bucket..., +Inf, soma]
+_coletores: List[Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]] = []
+
+# Tempos da requisição atual: {nome: segundos}, lido pelo middleware
+_tempos_req: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar(
+    "agrovet_tempos_req", default=None
+)
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+# ==========================================================
+# 📈 Registro
+# ==========================================================
+def contar(metrica: str, n: float = 1, **labels) -> None:
+    chave = _labels(labels)
+    with _lock:
+        serie = _contadores.setdefault(metrica, {})
+        serie[chave] = serie.get(chave, 0) + n
+
+
+def observar(metrica: str, segundos: float, **labels) -> None:
+    chave = _labels(labels)
+    with _lock:
+        h = _histogramas.setdefault(metrica, {}).get(chave)
+        if h is None:
+            h = _histogramas[metrica][chave] = [0.0] * (len(BUCKETS) + 2)
+        for i, limite in enumerate(BUCKETS):
+            if segundos <= limite:
+                h[i] += 1
+                break
+        else:
+            h[len(BUCKETS)] += 1
+        h[-1] += segundos
+
+
+def tempo_requisicao(nome: str, segundos: float) -> None:
+    tempos = _tempos_req.get()
+    if tempos is not None:
+        tempos[nome] = tempos.get(nome, 0.0) + segundos
+
+
+@contextmanager
+def medir(metrica: str, **labels):
+    """
+    Cronometra o bloco no histograma ``metrica``; o tempo entra também no
+    Server-Timing da requisição, com o valor do primeiro label (prefixado
+    pelo grupo da métrica, ex.: ``db_kpis``, exceto nas etapas).
+    """
+    nome = str(next(iter(labels.values()), ""))
+    if metrica != "agrovet_etapa_segundos":
+        nome = f"{metrica.split('_')[1]}_{nome}".rstrip("_")
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        observar(metrica, dt, **labels)
+        tempo_requisicao(nome, dt)
+
+
+def registrar_coletor(fn: Callable[[], Iterable[Tuple[str, str, Dict[str, Any], float]]]) -> None:
+    """
+    ``fn()`` devolve [(métrica, tipo, labels, valor)], com tipo "gauge" ou
+    "counter"; é chamada a cada coleta de /metrics.
+    """
+    _coletores.append(fn)
+
+
+def registrar_ocr(resultado: Dict[str, Any]) -> None:
+    """
+    Registra os tempos que o pipeline devolveu (``etapas`` e ``tempos`` por
+    motor) e a escolha da cascata. Chamado só quando o OCR rodou de fato,
+    não em acerto de cache.
+    """
+    for etapa, dt in (resultado.get("etapas") or {}).items():
+        observar("agrovet_etapa_segundos", dt, etapa=etapa)
+        tempo_requisicao(etapa, dt)
+    tempos = resultado.get("tempos") or {}
+    for motor, dt in tempos.items():
+        observar("agrovet_motor_segundos", dt, motor=motor)
+        tempo_requisicao(f"ocr_{motor}", dt)
+    if resultado.get("motor"):
+        contar("agrovet_ocr_motor_escolhido_total", motor=resultado["motor"])
+    if len(tempos) > 1:
+        contar("agrovet_ocr_fallbacks_total", len(tempos) - 1)
+    if tempos and resultado.get("aprovado") is False:
+        contar("agrovet_ocr_sem_aprovacao_total")
+
+
+# ==========================================================
+# 🧾 Formato texto do Prometheus
+# ==========================================================
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    labels = list(labels)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in labels) + "}"
+
+
+def _fmt_valor(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def _cabecalho(linhas: List[str], metrica: str, tipo: str) -> None:
+    linhas.append(f"# HELP {metrica} {AJUDA.get(metrica, metrica)}")
+    linhas.append(f"# TYPE {metrica} {tipo}")
+
+
+def exportar() -> str:
+    linhas: List[str] = []
+    _cabecalho(linhas, "agrovet_processo_info", "gauge")
+    linhas.append(f'agrovet_processo_info{{pid="{os.getpid()}"}} 1')
+
+    with _lock:
+        contadores = {m: dict(s) for m, s in _contadores.items()}
+        histogramas = {m: {k: list(h) for k, h in s.items()} for m, s in _histogramas.items()}
+
+    for metrica, serie in sorted(contadores.items()):
+        _cabecalho(linhas, metrica, "counter")
+        for labels, valor in sorted(serie.items()):
+            linhas.append(f"{metrica}{_fmt_labels(labels)} {_fmt_valor(valor)}")
+
+    for metrica, serie in sorted(histogramas.items()):
+        _cabecalho(linhas, metrica, "histogram")
+        for labels, h in sorted(serie.items()):
+            acumulado = 0.0
+            for limite, n in zip(BUCKETS + (float("inf"),), h[:-1]):
+                acumulado += n
+                le = "+Inf" if limite == float("inf") else repr(limite)
+                linhas.append(f"{metrica}_bucket{_fmt_labels(labels + (('le', le),))} {_fmt_valor(acumulado)}")
+            linhas.append(f"{metrica}_sum{_fmt_labels(labels)} {repr(h[-1])}")
+            linhas.append(f"{metrica}_count{_fmt_labels(labels)} {_fmt_valor(acumulado)}")
+
+    vistos = set()
+    for fn in _coletores:
+        try:
+            amostras = list(fn())
+        except Exception:
+            continue  # coletor com erro (ex.: tabela ainda não criada) não derruba a coleta
+        for metrica, tipo, labels, valor in amostras:
+            if metrica not in vistos:
+                _cabecalho(linhas, metrica, tipo)
+                vistos.add(metrica)
+            linhas.append(f"{metrica}{_fmt_labels(_labels(labels))} {_fmt_valor(valor)}")
+    return "\n".join(linhas) + "\n"
+
+
+# ==========================================================
+# ⏱️ Server-Timing por requisição
+# ==========================================================
+async def middleware_server_timing(request, call_next):
+    """
+    Abre o acumulador de tempos da requisição, mede o total e devolve tudo no
+    cabeçalho Server-Timing (ms). Em respostas em streaming o total vai até o
+    envio dos cabeçalhos.
+    """
+    tempos: Dict[str, float] = {}
+    token = _tempos_req.set(tempos)
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _tempos_req.reset(token)
+    total = time.perf_counter() - t0
+    rota = getattr(request.scope.get("route"), "path", "desconhecida")
+    observar("agrovet_http_segundos", total, rota=rota, metodo=request.method, status=response.status_code)
+    partes = [f"{nome};dur={1000 * dt:.1f}" for nome, dt in tempos.items()]
+    partes.append(f"total;dur={1000 * total:.1f}")
+    response.headers["Server-Timing"] = ", ".join(partes)
+    return response
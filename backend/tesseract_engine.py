@@ -0,0 +1,130 @@
+"""
+Motor Tesseract dentro do processo, via tesserocr (API C do libtesseract).
+
+O pytesseract grava a imagem num arquivo temporário, dispara um processo
+``tesseract`` que carrega o ``por.traineddata`` do zero e lê a saída em TSV, a
+cada chamada. Aqui cada thread mantém um ``PyTessBaseAPI`` já inicializado e
+recebe o buffer NumPy pré-processado direto por ``SetImageBytes``, sem
+arquivo nem processo novo.
+
+Sem tesserocr instalado (ou com TESSERACT_BACKEND=pytesseract) o motor cai
+no pytesseract, com a mesma saída: ``[(texto da linha, confiança 0..1)]``,
+confiança da linha = menor confiança entre as palavras.
+
+Configuração por variáveis de ambiente:
+  TESSERACT_LANG      idiomas (padrão por)
+  TESSERACT_BACKEND   auto | tesserocr | pytesseract (padrão auto)
+  TESSDATA_PREFIX     pasta dos traineddata (padrão do sistema)
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+LANG = os.getenv("TESSERACT_LANG", "por")
+BACKEND = os.getenv("TESSERACT_BACKEND", "auto")
+
+try:
+    if BACKEND == "pytesseract":
+        raise ImportError
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+_local = threading.local()
+_status: Dict[str, Any] = {"handles": 0, "tempo_carga_s": None, "erro": None}
+_status_lock = threading.Lock()
+
+
+def backend_ativo() -> str:
+    return "tesserocr" if tesserocr is not None and _status["erro"] is None else "pytesseract"
+
+
+def _api():
+    api = getattr(_local, "api", None)
+    if api is None:
+        t0 = time.perf_counter()
+        kwargs = {"lang": LANG, "psm": tesserocr.PSM.AUTO}
+        if os.getenv("TESSDATA_PREFIX"):
+            kwargs["path"] = os.environ["TESSDATA_PREFIX"]
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        _local.api = api
+        with _status_lock:
+            _status["handles"] += 1
+            _status["tempo_carga_s"] = round(time.perf_counter() - t0, 3)
+    return api
+
+
+def warmup() -> None:
+    """
+    Abre o handle da thread atual (chamado no initializer dos workers do
+    pool, que executam o OCR nessa mesma thread).
+    """
+    if tesserocr is None:
+        return
+    try:
+        _api()
+    except RuntimeError as e:
+        _status["erro"] = str(e)
+
+
+def _tesserocr(image: np.ndarray) -> List[Tuple[str, float]]:
+    img = np.ascontiguousarray(image, dtype=np.uint8)
+    altura, largura = img.shape[:2]
+    canais = 1 if img.ndim == 2 else img.shape[2]
+    api = _api()
+    api.SetImageBytes(img.tobytes(), largura, altura, canais, largura * canais)
+    api.Recognize()
+
+    linhas: List[Tuple[str, float]] = []
+    palavras: List[Tuple[str, float]] = []
+    ri = api.GetIterator()
+    nivel = tesserocr.RIL.WORD
+    if ri is not None:
+        for w in tesserocr.iterate_level(ri, nivel):
+            if palavras and w.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                linhas.append((" ".join(p for p, _ in palavras), min(c for _, c in palavras)))
+                palavras = []
+            texto = (w.GetUTF8Text(nivel) or "").strip()
+            conf = w.Confidence(nivel)
+            if texto and conf >= 0:
+                palavras.append((texto, conf / 100.0))
+    if palavras:
+        linhas.append((" ".join(p for p, _ in palavras), min(c for _, c in palavras)))
+    api.Clear()
+    return linhas
+
+
+def _pytesseract(image: np.ndarray) -> List[Tuple[str, float]]:
+    import pytesseract
+
+    dados = pytesseract.image_to_data(image, lang=LANG, output_type=pytesseract.Output.DICT)
+    linhas = {}
+    for i, palavra in enumerate(dados["text"]):
+        conf = float(dados["conf"][i])
+        if not palavra.strip() or conf < 0:
+            continue
+        chave = (dados["block_num"][i], dados["par_num"][i], dados["line_num"][i])
+        linhas.setdefault(chave, []).append((palavra, conf / 100.0))
+    return [
+        (" ".join(p for p, _ in palavras), min(c for _, c in palavras))
+        for _, palavras in sorted(linhas.items())
+    ]
+
+
+def reconhecer(image: np.ndarray) -> List[Tuple[str, float]]:
+    if tesserocr is not None and _status["erro"] is None:
+        try:
+            return _tesserocr(image)
+        except RuntimeError as e:
+            # Falha ao iniciar a API (traineddata ausente etc.): fica no pytesseract
+            _status["erro"] = str(e)
+    return _pytesseract(image)
+
+
+def status() -> Dict[str, Any]:
+    return {"backend": backend_ativo(), "lang": LANG, **_status}
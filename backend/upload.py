@@ -0,0 +1,189 @@
+"""
+Recebimento de uploads de imagem: leitura em blocos com limite de tamanho,
+identificação do formato pelos primeiros bytes e dimensões lidas do
+cabeçalho, sem decodificar a imagem.
+
+O corpo multipart já chega ao UploadFile num arquivo temporário do Starlette;
+aqui ele é lido em blocos de CHUNK_BYTES e a leitura para assim que passa do
+limite (413) ou assim que o primeiro bloco não tem assinatura de imagem (415),
+antes de qualquer trabalho de OCR.
+
+As dimensões do cabeçalho servem ao pré-processamento (backend/ocr.py) para
+escolher a decodificação reduzida do OpenCV (IMREAD_REDUCED_GRAYSCALE_2/4/8):
+no JPEG a redução acontece dentro do libjpeg (escala na DCT), então uma foto
+de 48MP nunca é expandida em resolução cheia.
+
+Configuração por variáveis de ambiente:
+  UPLOAD_MAX_MB       tamanho máximo de cada imagem (padrão 25)
+  UPLOAD_MAX_ZIP_MB   tamanho máximo de um .zip no envio em lote (padrão 200)
+  UPLOAD_MAX_LOTE_MB  total descompactado de um envio em lote (padrão 512)
+"""
+from __future__ import annotations
+
+import os
+import struct
+import tempfile
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "25")) * 1024 * 1024)
+MAX_ZIP_BYTES = int(float(os.getenv("UPLOAD_MAX_ZIP_MB", "200")) * 1024 * 1024)
+MAX_LOTE_BYTES = int(float(os.getenv("UPLOAD_MAX_LOTE_MB", "512")) * 1024 * 1024)
+CHUNK_BYTES = 1024 * 1024
+
+IMAGENS = ("jpeg", "png", "webp", "bmp", "tiff")
+EXTENSAO = {"jpeg": ".jpg", "png": ".png", "webp": ".webp", "bmp": ".bmp", "tiff": ".tif", "zip": ".zip"}
+
+
+class UploadInvalido(Exception):
+    def __init__(self, status_code: int, mensagem: str):
+        super().__init__(mensagem)
+        self.status_code = status_code
+
+
+# ==========================================================
+# 🔎 Formato e dimensões pelo cabeçalho
+# ==========================================================
+def formato(cabecalho: bytes) -> Optional[str]:
+    if cabecalho[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if cabecalho[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if cabecalho[:4] == b"RIFF" and cabecalho[8:12] == b"WEBP":
+        return "webp"
+    if cabecalho[:2] == b"BM":
+        return "bmp"
+    if cabecalho[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    if cabecalho[:4] == b"PK\x03\x04":
+        return "zip"
+    return None
+
+
+def _dimensoes_jpeg(dados: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    while i + 9 < len(dados):
+        if dados[i] != 0xFF:
+            i += 1
+            continue
+        marcador = dados[i + 1]
+        if marcador in (0xD8, 0x01) or 0xD0 <= marcador <= 0xD7 or marcador == 0xFF:
+            i += 1 if marcador == 0xFF else 2
+            continue
+        tamanho = struct.unpack(">H", dados[i + 2:i + 4])[0]
+        # SOF0..SOF15, exceto DHT (C4), JPG (C8) e DAC (CC)
+        if 0xC0 <= marcador <= 0xCF and marcador not in (0xC4, 0xC8, 0xCC):
+            altura, largura = struct.unpack(">HH", dados[i + 5:i + 9])
+            return largura, altura
+        i += 2 + tamanho
+    return None
+
+
+def dimensoes(dados: bytes) -> Optional[Tuple[int, int]]:
+    """
+    (largura, altura) lidas do cabeçalho, ou None quando o formato não é
+    reconhecido ou o cabeçalho está truncado. Não considera a orientação EXIF
+    (o lado maior é o mesmo).
+    """
+    try:
+        fmt = formato(dados[:16])
+        if fmt == "jpeg":
+            return _dimensoes_jpeg(dados)
+        if fmt == "png" and dados[12:16] == b"IHDR":
+            return struct.unpack(">II", dados[16:24])
+        if fmt == "webp":
+            pedaco = dados[12:16]
+            if pedaco == b"VP8 ":
+                largura, altura = struct.unpack("<HH", dados[26:30])
+                return largura & 0x3FFF, altura & 0x3FFF
+            if pedaco == b"VP8L":
+                b = dados[21:25]
+                largura = 1 + (((b[1] & 0x3F) << 8) | b[0])
+                altura = 1 + (((b[3] & 0x0F) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+                return largura, altura
+            if pedaco == b"VP8X":
+                return 1 + int.from_bytes(dados[24:27], "little"), 1 + int.from_bytes(dados[27:30], "little")
+        if fmt == "bmp":
+            largura, altura = struct.unpack("<ii", dados[18:26])
+            return largura, abs(altura)
+    except (struct.error, IndexError):
+        pass
+    return None
+
+
+def fator_reducao(dados: bytes, lado_alvo: int) -> int:
+    """
+    Maior fator (1, 2, 4 ou 8) que ainda deixa o lado maior da imagem acima de
+    ``lado_alvo``; o redimensionamento fino continua no pré-processamento.
+    """
+    dim = dimensoes(dados)
+    if not dim:
+        return 1
+    lado = max(dim)
+    fator = 1
+    while fator < 8 and lado // (fator * 2) >= lado_alvo:
+        fator *= 2
+    return fator
+
+
+# ==========================================================
+# 📥 Leitura do UploadFile
+# ==========================================================
+async def _blocos(arquivo, limite: int, formatos: Iterable[str]):
+    lidos = 0
+    primeiro = True
+    while True:
+        bloco = await arquivo.read(CHUNK_BYTES)
+        if not bloco:
+            if primeiro:
+                raise UploadInvalido(400, "Arquivo vazio")
+            return
+        if primeiro:
+            fmt = formato(bloco[:16])
+            if fmt not in formatos:
+                raise UploadInvalido(415, f"Formato não suportado: envie {', '.join(formatos)}")
+            primeiro = False
+        lidos += len(bloco)
+        if lidos > limite:
+            raise UploadInvalido(413, f"Arquivo maior que {limite // (1024 * 1024)} MB")
+        yield bloco
+
+
+async def ler_upload(arquivo, limite: int = MAX_BYTES, formatos: Iterable[str] = IMAGENS) -> bytes:
+    """
+    Lê o UploadFile em blocos e devolve os bytes; levanta UploadInvalido (400,
+    413 ou 415) sem ler o restante do arquivo.
+    """
+    formatos = tuple(formatos)
+    size = getattr(arquivo, "size", None)
+    if size is not None and size > limite:
+        raise UploadInvalido(413, f"Arquivo maior que {limite // (1024 * 1024)} MB")
+    buf = bytearray()
+    async for bloco in _blocos(arquivo, limite, formatos):
+        buf += bloco
+    return bytes(buf)
+
+
+async def salvar_upload(arquivo, limite: int = MAX_BYTES, formatos: Iterable[str] = IMAGENS) -> Path:
+    """
+    Como ler_upload, mas grava os blocos num arquivo temporário (extensão do
+    formato detectado) e devolve o caminho; quem chama remove o arquivo.
+    """
+    formatos = tuple(formatos)
+    size = getattr(arquivo, "size", None)
+    if size is not None and size > limite:
+        raise UploadInvalido(413, f"Arquivo maior que {limite // (1024 * 1024)} MB")
+    fd, nome = tempfile.mkstemp(prefix="upload_")
+    caminho = Path(nome)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for bloco in _blocos(arquivo, limite, formatos):
+                if f.tell() == 0:
+                    fmt = formato(bloco[:16])
+                f.write(bloco)
+        final = caminho.with_suffix(EXTENSAO[fmt])
+        os.replace(caminho, final)
+        return final
+    except BaseException:
+        caminho.unlink(missing_ok=True)
+        raise
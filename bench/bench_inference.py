@@ -0,0 +1,151 @@
+"""
+Comparação de precisão e latência dos modos de inferência do EasyOCR
+(backend/ocr_quant.py: torch / int8 / onnx) sobre um conjunto fixo de imagens.
+
+Cada modo roda num processo novo (OCR_INFERENCE é lido no import) com as
+mesmas threads. Para cada imagem: pré-processamento do pipeline, readtext com
+o reader "pt" e extração das métricas. Reporta carga do modelo, mediana/p95
+por imagem, pico de RSS, acerto por campo e concordância do texto com o modo
+torch (float32).
+
+Sem ``--imagens`` usa fichas sintéticas com valores conhecidos. Com uma pasta
+de fotos, as métricas esperadas vêm de ``esperado.json`` na mesma pasta
+({"arquivo.jpg": {"taxa_prenhez": 78, ...}}); sem ele só a concordância é
+medida.
+
+    python bench/bench_inference.py [--imagens fichas/] [--modos torch,int8,onnx] [--threads 2]
+"""
+import argparse
+import difflib
+import json
+import multiprocessing as mp
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+CAMPOS = ("taxa_prenhez", "taxa_concepcao", "taxa_servico", "partos_estimados")
+EXTENSOES = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp"}
+
+
+def fichas_sinteticas(n, seed=0):
+    import cv2
+    import numpy as np
+
+    rng = random.Random(seed)
+    conjunto = []
+    for i in range(n):
+        esperado = {
+            "taxa_prenhez": rng.randint(30, 95),
+            "taxa_concepcao": rng.randint(30, 95),
+            "taxa_servico": rng.randint(30, 95),
+            "partos_estimados": rng.randint(10, 900),
+        }
+        img = np.full((1200, 1600, 3), 205, np.uint8)
+        img += np.random.default_rng(i).integers(0, 35, img.shape, dtype=np.uint8)
+        linhas = [
+            f"Fazenda {rng.choice(['Boa Vista', 'Sao Joao', 'Santa Fe'])}",
+            f"Taxa de prenhez: {esperado['taxa_prenhez']}%",
+            f"Taxa de concepcao: {esperado['taxa_concepcao']}%",
+            f"Taxa de servico: {esperado['taxa_servico']}%",
+            f"Partos estimados: {esperado['partos_estimados']}",
+        ]
+        for j, linha in enumerate(linhas):
+            cv2.putText(img, linha, (140, 220 + j * 170), cv2.FONT_HERSHEY_SIMPLEX, 1.9, (25, 25, 25), 4)
+        ok, enc = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 88])
+        conjunto.append((f"sintetica_{i:02d}.jpg", enc.tobytes(), esperado))
+    return conjunto
+
+
+def carregar_pasta(pasta):
+    pasta = Path(pasta)
+    esperado = {}
+    if (pasta / "esperado.json").exists():
+        esperado = json.loads((pasta / "esperado.json").read_text(encoding="utf-8"))
+    return [
+        (p.name, p.read_bytes(), esperado.get(p.name))
+        for p in sorted(pasta.iterdir())
+        if p.suffix.lower() in EXTENSOES
+    ]
+
+
+def _rodar(modo, threads, conjunto, fila):
+    os.environ["OCR_INFERENCE"] = modo
+    os.environ["OCR_THREADS"] = str(threads)
+    from backend.metrics_parser import metricas_simples
+    from backend.ocr import preprocess_image
+    from backend.ocr_engines import LANGS_PT, registry
+
+    t0 = time.perf_counter()
+    reader = registry.get_reader(LANGS_PT)
+    carga = time.perf_counter() - t0
+
+    tempos, textos, acertos, total = [], {}, 0, 0
+    for nome, dados, esperado in conjunto:
+        img = preprocess_image(dados)
+        t0 = time.perf_counter()
+        linhas = reader.readtext(img, detail=0)
+        tempos.append(time.perf_counter() - t0)
+        texto = " ".join(linhas)
+        textos[nome] = texto
+        if esperado:
+            obtido = metricas_simples(texto)
+            for campo in CAMPOS:
+                if campo in esperado:
+                    total += 1
+                    acertos += obtido.get(campo) == esperado[campo]
+    fila.put({
+        "modo": modo,
+        "carga_s": carga,
+        "tempos": tempos,
+        "pico_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "acertos": acertos,
+        "total": total,
+        "textos": textos,
+        "inferencia": registry.status().get("inferencia"),
+    })
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--imagens", help="pasta com as imagens (padrão: fichas sintéticas)")
+    ap.add_argument("--n", type=int, default=12, help="fichas sintéticas")
+    ap.add_argument("--modos", default="torch,int8,onnx")
+    ap.add_argument("--threads", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    args = ap.parse_args()
+
+    conjunto = carregar_pasta(args.imagens) if args.imagens else fichas_sinteticas(args.n)
+    ctx = mp.get_context("spawn")
+    resultados = []
+    for modo in args.modos.split(","):
+        fila = ctx.Queue()
+        p = ctx.Process(target=_rodar, args=(modo.strip(), args.threads, conjunto, fila))
+        p.start()
+        resultados.append(fila.get())
+        p.join()
+
+    base = next((r for r in resultados if r["modo"] == "torch"), resultados[0])
+    print(f"{len(conjunto)} imagens, {args.threads} threads por processo\n")
+    for r in resultados:
+        ts = sorted(r["tempos"])
+        p95 = ts[min(len(ts) - 1, int(0.95 * len(ts)))]
+        conc = statistics.mean(
+            difflib.SequenceMatcher(None, base["textos"][k], r["textos"][k]).ratio() for k in r["textos"]
+        )
+        acerto = f"{100 * r['acertos'] / r['total']:.1f}%" if r["total"] else "—"
+        print(
+            f"== {r['modo']:<6} carga {r['carga_s']:.1f}s  mediana {1000 * statistics.median(ts):.0f} ms  "
+            f"p95 {1000 * p95:.0f} ms  pico {r['pico_mb']:.0f} MB  acerto {acerto}  "
+            f"concordância c/ {base['modo']} {100 * conc:.1f}%"
+        )
+        if r["inferencia"] and r["inferencia"].get("erro"):
+            print(f"   ⚠️ {r['inferencia']['erro']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark do parsing de métricas: as cinco regex antigas de parse_metrics
+contra o extrator de uma passada (backend/metrics_parser.py).
+
+O corpus é sintético: fichas limpas, grafias trocadas pelo OCR, campos fora de
+ordem e casos patológicos (textos longos do Tesseract sem nenhum '%', onde os
+``.*?`` antigos viram O(n²)). Mede tempo por texto e acertos por campo.
+
+    python bench/bench_parse_metrics.py [--n 200] [--seed 0]
+"""
+import argparse
+import random
+import re
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend.metrics_parser import metricas_simples
+
+CAMPOS = ("taxa_prenhez", "taxa_concepcao", "taxa_servico", "partos_estimados")
+ROTULOS = {
+    "taxa_prenhez": ["Taxa de prenhez", "prenhes", "PRENHEZ", "Prenhez"],
+    "taxa_concepcao": ["Taxa de concepção", "concepcao", "Concepçao", "CONCEPÇÃO"],
+    "taxa_servico": ["Taxa de serviço", "servico", "Serviço", "seruiço"],
+    "partos_estimados": ["Partos estimados", "partos", "Parto", "PARTOS"],
+}
+RUIDO = "lote vacas IATF 12/03 obs ok ... | -- ~ n° animais brinco 3344 mn".split()
+
+
+def parse_antigo(texto):
+    # Versão anterior de parse_metrics (cinco re.search com .*?)
+    nome = re.search(r"(?i)(fazenda[:\- ]*)([A-Za-zÀ-ÿ0-9 ]+)", texto)
+    prenhez = re.search(r"(?i)prenhe[z|s]?.*?(\d{1,3})\s*%", texto)
+    concepcao = re.search(r"(?i)concep[cç][aã]o.*?(\d{1,3})\s*%", texto)
+    servico = re.search(r"(?i)servi[cç]o.*?(\d{1,3})\s*%", texto)
+    partos = re.search(r"(?i)parto[s]?.*?(\d{1,3})", texto)
+    return {
+        "nome_da_fazenda": nome.group(2).strip() if nome else "Extraído via OCR",
+        "taxa_prenhez": int(prenhez.group(1)) if prenhez else None,
+        "taxa_concepcao": int(concepcao.group(1)) if concepcao else None,
+        "taxa_servico": int(servico.group(1)) if servico else None,
+        "partos_estimados": int(partos.group(1)) if partos else None,
+    }
+
+
+def gerar_corpus(n, rng):
+    corpus = []
+    for i in range(n):
+        esperado = {
+            "taxa_prenhez": rng.randint(30, 95),
+            "taxa_concepcao": rng.randint(30, 95),
+            "taxa_servico": rng.randint(30, 95),
+            "partos_estimados": rng.randint(10, 900),
+        }
+        campos = list(CAMPOS)
+        if i % 3 == 1:
+            rng.shuffle(campos)  # ordem trocada
+        partes = [f"Fazenda {rng.choice(['Boa Vista', 'Sao Joao', 'Santa Fe'])},"]
+        for campo in campos:
+            if rng.random() < 0.3:
+                partes.extend(rng.choices(RUIDO, k=rng.randint(1, 4)))
+            sufixo = "%" if campo.startswith("taxa_") else ""
+            espaco = " " if rng.random() < 0.3 else ""
+            partes.append(f"{rng.choice(ROTULOS[campo])}: {esperado[campo]}{espaco}{sufixo}")
+        corpus.append(("ficha", " ".join(partes), esperado))
+
+    # Patológicos: saída longa e suja, com rótulos mas sem nenhum '%'
+    for tamanho in (5_000, 20_000, 50_000):
+        lixo = " ".join(rng.choices(RUIDO + ["prenhez", "concepção", "serviço"], k=tamanho // 5))
+        corpus.append((f"patologico_{tamanho}", lixo[:tamanho], {c: None for c in CAMPOS}))
+    return corpus
+
+
+def medir(fn, corpus):
+    tempos, acertos, total = {}, 0, 0
+    for tipo, texto, esperado in corpus:
+        t0 = time.perf_counter()
+        obtido = fn(texto)
+        tempos.setdefault(tipo if tipo.startswith("patologico") else "ficha", []).append(
+            time.perf_counter() - t0
+        )
+        if tipo == "ficha":
+            for campo in CAMPOS:
+                total += 1
+                acertos += obtido.get(campo) == esperado[campo]
+    return tempos, acertos, total
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200, help="fichas sintéticas no corpus")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    corpus = gerar_corpus(args.n, random.Random(args.seed))
+
+    for nome, fn in (("antigo", parse_antigo), ("uma_passada", metricas_simples)):
+        tempos, acertos, total = medir(fn, corpus)
+        print(f"== {nome}: acertos {acertos}/{total} ({100 * acertos / total:.1f}%)")
+        for tipo, ts in tempos.items():
+            print(f"   {tipo:<20} mediana {statistics.median(ts) * 1e6:>12.1f} µs   máx {max(ts) * 1e6:>12.1f} µs")
+
+
+if __name__ == "__main__":
+    main()
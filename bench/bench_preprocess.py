@@ -0,0 +1,101 @@
+"""
+Micro-benchmark do pré-processamento: pipeline antigo (PIL + reencode PNG)
+contra o atual (backend.ocr.preprocess_image, NumPy/OpenCV num único buffer).
+
+Cada variante roda num processo novo para que o pico de RSS medido seja só
+dela. Uso (na raiz do repositório):
+
+    python bench/bench_preprocess.py [--mp 12] [--repeticoes 5] [--imagem foto.jpg]
+"""
+import argparse
+import io
+import multiprocessing as mp
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+
+def preprocess_antigo(image_bytes):
+    # Versão anterior de preprocess_image + o reencode PNG feito antes do OCR
+    image = Image.open(io.BytesIO(image_bytes)).convert("L")
+    image = ImageEnhance.Contrast(image).enhance(2.5)
+    image = image.filter(ImageFilter.MedianFilter(size=3))
+    np_img = np.array(image)
+    _, thresh = cv2.threshold(np_img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    image = Image.fromarray(thresh)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def preprocess_novo(image_bytes):
+    from backend.ocr import preprocess_image
+    return preprocess_image(image_bytes)
+
+
+VARIANTES = {"antigo": preprocess_antigo, "novo": preprocess_novo}
+
+
+def ficha_sintetica(megapixels):
+    """
+    JPEG de uma 'ficha' com texto e ruído, no tamanho de uma foto de celular.
+    """
+    w = int((megapixels * 1e6 * 4 / 3) ** 0.5)
+    h = int(w * 3 / 4)
+    rng = np.random.default_rng(0)
+    img = np.full((h, w, 3), 200, np.uint8)
+    img += rng.integers(0, 40, img.shape, dtype=np.uint8)
+    linhas = ["Fazenda Boa Vista", "Taxa de prenhez: 78%", "Taxa de concepcao: 61%",
+              "Taxa de servico: 74%", "Partos estimados: 132"]
+    for i, linha in enumerate(linhas):
+        cv2.putText(img, linha, (w // 10, h // 6 + i * h // 8), cv2.FONT_HERSHEY_SIMPLEX,
+                    w / 1200, (20, 20, 20), max(2, w // 800))
+    ok, enc = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return enc.tobytes()
+
+
+def _medir(nome, image_bytes, repeticoes, fila):
+    fn = VARIANTES[nome]
+    fn(image_bytes)  # aquece imports/alocador
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn(image_bytes)
+        tempos.append(time.perf_counter() - t0)
+    pico_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    fila.put((nome, statistics.median(tempos), min(tempos), pico_kb))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mp", type=float, default=12.0, help="megapixels da imagem sintética")
+    ap.add_argument("--repeticoes", type=int, default=5)
+    ap.add_argument("--imagem", help="usa uma foto real em vez da sintética")
+    args = ap.parse_args()
+
+    image_bytes = Path(args.imagem).read_bytes() if args.imagem else ficha_sintetica(args.mp)
+    print(f"imagem: {len(image_bytes) / 1024:.0f} KB, {args.repeticoes} repetições")
+    print(f"{'variante':<10}{'mediana (ms)':>14}{'mínimo (ms)':>14}{'pico RSS (MB)':>16}")
+
+    ctx = mp.get_context("spawn")
+    for nome in VARIANTES:
+        fila = ctx.Queue()
+        p = ctx.Process(target=_medir, args=(nome, image_bytes, args.repeticoes, fila))
+        p.start()
+        nome, mediana, minimo, pico_kb = fila.get()
+        p.join()
+        # ru_maxrss inclui o próprio interpretador; o pico após o aquecimento
+        # já contém o maior working set de uma execução da variante.
+        print(f"{nome:<10}{mediana * 1000:>14.1f}{minimo * 1000:>14.1f}{pico_kb / 1024:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark do motor Tesseract: pytesseract (processo + arquivo temporário por
+chamada) contra o handle persistente do tesserocr (backend/tesseract_engine.py).
+
+Gera uma ficha sintética com cv2.putText, pré-processa como o pipeline e mede
+a latência por chamada de cada backend (a primeira chamada do tesserocr, que
+carrega o traineddata, é reportada à parte).
+
+    python bench/bench_tesseract.py [--n 20]
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend import tesseract_engine
+
+LINHAS = [
+    "Fazenda Boa Vista",
+    "Taxa de prenhez: 78%",
+    "Taxa de concepcao: 61%",
+    "Taxa de servico: 55%",
+    "Partos estimados: 120",
+]
+
+
+def ficha():
+    img = np.full((700, 1200), 255, np.uint8)
+    for i, linha in enumerate(LINHAS):
+        cv2.putText(img, linha, (60, 120 + i * 110), cv2.FONT_HERSHEY_SIMPLEX, 1.6, 0, 3, cv2.LINE_AA)
+    _, img = cv2.threshold(img, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    return img
+
+
+def medir(fn, img, n):
+    tempos, saida = [], None
+    for _ in range(n):
+        t0 = time.perf_counter()
+        saida = fn(img)
+        tempos.append(time.perf_counter() - t0)
+    return tempos, saida
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20)
+    args = ap.parse_args()
+    img = ficha()
+
+    backends = [("pytesseract", tesseract_engine._pytesseract)]
+    if tesseract_engine.tesserocr is not None:
+        t0 = time.perf_counter()
+        tesseract_engine.warmup()
+        print(f"tesserocr: carga do handle {1000 * (time.perf_counter() - t0):.0f} ms")
+        backends.append(("tesserocr", tesseract_engine._tesserocr))
+    else:
+        print("tesserocr não instalado: medindo só o pytesseract")
+
+    for nome, fn in backends:
+        tempos, saida = medir(fn, img, args.n)
+        print(f"== {nome}: mediana {1000 * statistics.median(tempos):.1f} ms   máx {1000 * max(tempos):.1f} ms")
+        for texto, conf in saida:
+            print(f"     {conf:.2f}  {texto}")
+
+
+if __name__ == "__main__":
+    main()
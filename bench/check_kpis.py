@@ -0,0 +1,99 @@
+"""
+Confere que db.kpis() (agregados mensais + pontas do intervalo) bate com a
+contagem e as médias calculadas sobre db.list_relatorios() com os mesmos
+filtros: buscas com acento e caixa diferente (FTS trigram), buscas curtas
+(LIKE), intervalos dentro de um mês, atravessando meses e invertidos.
+
+Cria um banco temporário com ``--linhas`` registros e termina com código 1
+se algum caso divergir.
+
+    python bench/check_kpis.py [--linhas 20000]
+"""
+import argparse
+import math
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend import db
+
+CASOS = [
+    {},
+    {"search": "São João"},
+    {"search": "SÃO JOÃO"},
+    {"search": "são joão 1"},
+    {"search": "Fé"},
+    {"search": "vista"},
+    {"date_from": "2024-02-10", "date_to": "2024-02-20"},
+    {"date_from": "2024-02-10", "date_to": "2024-05-03"},
+    {"date_from": "2024-03-15", "date_to": "2024-02-10"},
+    {"date_from": "2024-03-15", "date_to": "2024-03-01"},
+    {"search": "SÃO JOÃO", "date_from": "2023-11-20", "date_to": "2024-02-07"},
+    {"search": "SÃO JOÃO", "date_from": "2024-03-15", "date_to": "2024-02-10"},
+    {"date_from": "2024-01-01"},
+    {"date_to": "2023-06-15"},
+]
+
+CAMPOS = {
+    "prenhez": "taxa_prenhez",
+    "concepcao": "taxa_concepcao",
+    "servico": "taxa_servico",
+    "partos": "partos_estimados",
+}
+
+
+def popular(linhas, rng):
+    fazendas = [f"{p} {i}" for p in ("Boa Vista", "São João", "Santa Fé", "Recanto") for i in range(20)]
+    lote = []
+    for _ in range(linhas):
+        lote.append((
+            rng.choice(fazendas),
+            f"20{rng.randint(22, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            rng.choice([None, rng.uniform(40, 95)]), rng.uniform(30, 90), rng.uniform(40, 95), rng.randint(10, 500),
+        ))
+    db.insert_relatorios(lote)
+
+
+def esperado(cols, rows):
+    linhas = [dict(zip(cols, r)) for r in rows]
+    out = {"total_registros": len(linhas)}
+    for k, col in CAMPOS.items():
+        valores = [r[col] for r in linhas if r[col] is not None]
+        out[f"media_{k}"] = sum(valores) / len(valores) if valores else None
+    return out
+
+
+def igual(a, b):
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--linhas", type=int, default=20_000)
+    args = ap.parse_args()
+
+    db.DB_PATH = Path(tempfile.mkdtemp()) / "kpis.db"
+    db.init_db()
+    popular(args.linhas, random.Random(0))
+    if not db.tem_fts(db.conn()):
+        print("-- SQLite sem FTS5/trigram: buscas conferidas só pelo LIKE")
+
+    falhas = 0
+    for filtros in CASOS:
+        obtido = db.kpis(**filtros)
+        ref = esperado(*db.list_relatorios(limit=None, **filtros))
+        ok = all(igual(obtido[k], ref[k]) for k in ref)
+        falhas += not ok
+        print(f"{'OK ' if ok else 'FALHOU'} {filtros}: n={obtido['total_registros']} (tabela {ref['total_registros']})")
+        if not ok:
+            print(f"     kpis   {obtido}\n     tabela {ref}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Verifica via EXPLAIN QUERY PLAN que as consultas do histórico usam os índices
+de backend/db.py (data, fazenda+data e FTS5) em vez de varrer a tabela.
+
+Cria um banco temporário com ``--linhas`` registros, imprime o plano e o tempo
+de cada consulta e termina com código 1 se algum plano não usar índice.
+
+    python bench/explain_relatorios.py [--linhas 200000]
+"""
+import argparse
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from backend import db
+
+CASOS = [
+    ({}, "idx_relatorios_data"),
+    ({"order": "antigos"}, "idx_relatorios_data"),
+    ({"order": "nome"}, "idx_relatorios_fazenda_data"),
+    ({"date_from": "2023-03-01", "date_to": "2023-03-31"}, "idx_relatorios_data"),
+    ({"search": "Vista"}, "relatorios_fts"),
+    ({"search": "Vista", "date_from": "2023-01-01", "order": "antigos"}, "relatorios_fts"),
+]
+
+
+def popular(linhas, rng):
+    fazendas = [f"{p} {i}" for p in ("Boa Vista", "São João", "Santa Fé", "Recanto") for i in range(250)]
+    lote = []
+    for _ in range(linhas):
+        lote.append((
+            rng.choice(fazendas),
+            f"20{rng.randint(18, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            rng.uniform(40, 95), rng.uniform(30, 90), rng.uniform(40, 95), rng.randint(10, 500),
+        ))
+        if len(lote) >= 10_000:
+            db.insert_relatorios(lote)
+            lote.clear()
+    db.insert_relatorios(lote)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--linhas", type=int, default=200_000)
+    args = ap.parse_args()
+
+    db.DB_PATH = Path(tempfile.mkdtemp()) / "explain.db"
+    db.init_db()
+    popular(args.linhas, random.Random(0))
+
+    falhas = 0
+    c = db.conn()
+    tem_fts = db.tem_fts(c)
+    for filtros, indice in CASOS:
+        if indice == "relatorios_fts" and not tem_fts:
+            print(f"-- {filtros}: SQLite sem FTS5/trigram, ignorado")
+            continue
+        sql, params = db.consulta_relatorios(c, limit=50, **filtros)
+        plano = db.explain(sql, params)
+        t0 = time.perf_counter()
+        db.list_relatorios(limit=50, **filtros)
+        ms = (time.perf_counter() - t0) * 1000
+        ok = any(indice in linha for linha in plano) and not any(
+            linha.startswith("SCAN relatorios") and "INDEX" not in linha for linha in plano
+        )
+        falhas += not ok
+        print(f"{'OK ' if ok else 'FALHOU'} {filtros} ({ms:.1f} ms)")
+        for linha in plano:
+            print(f"     {linha}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Servidor OpenAI-compatível mínimo (POST /v1/chat/completions) para testar
+backend/analise_ia.py sem chave nem rede: responde um parecer fixo depois de
+``--atraso`` segundos, ou devolve 500 com ``--falhar``.
+
+Só o servidor:
+
+    python bench/stub_openai.py --porta 8089 --atraso 3
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 uvicorn backend.main:app
+
+Verificação automática (sobe o stub numa thread e usa um banco temporário):
+
+    python bench/stub_openai.py --verificar
+
+confere que a heurística sai na hora mesmo com o modelo lento, que o callback
+de atualização chega com o texto do modelo, que a segunda consulta vem do
+cache sem nova chamada e que um modelo mais lento que IA_TIMEOUT não trava
+nada.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+RESPOSTA = "Parecer do modelo: indicadores dentro do esperado. Manter o protocolo."
+
+
+def criar_servidor(porta, atraso=0.0, falhar=False):
+    chamadas = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            corpo = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            chamadas.append(corpo)
+            time.sleep(self.server.atraso)
+            if falhar:
+                self.send_response(500)
+                self.end_headers()
+                return
+            dados = json.dumps({
+                "id": f"stub-{len(chamadas)}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": corpo.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": RESPOSTA},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", porta), Handler)
+    srv.atraso = atraso
+    srv.chamadas = chamadas
+    return srv
+
+
+def verificar():
+    srv = criar_servidor(0, atraso=0.5)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{srv.server_port}/v1"
+    os.environ.setdefault("IA_TIMEOUT", "2")
+
+    from backend import analise_ia, db
+
+    db.DB_PATH = Path(tempfile.mkdtemp()) / "stub.db"
+    db.init_db()
+    metrics = {"nome_da_fazenda": "Boa Vista", "taxa_prenhez": 68, "taxa_concepcao": 55}
+    falhas = 0
+
+    def checar(ok, msg):
+        nonlocal falhas
+        falhas += not ok
+        print(f"{'OK ' if ok else 'FALHOU'} {msg}")
+
+    recebido = threading.Event()
+    textos = []
+    t0 = time.perf_counter()
+    texto = analise_ia.analisar(metrics, ao_atualizar=lambda t: (textos.append(t), recebido.set()))
+    ms = (time.perf_counter() - t0) * 1000
+    checar(texto == analise_ia.heuristica(metrics) and ms < 200, f"heurística imediata ({ms:.1f} ms)")
+    checar(recebido.wait(5) and textos == [RESPOSTA], "callback com o texto do modelo")
+
+    antes = len(srv.chamadas)
+    t0 = time.perf_counter()
+    texto = analise_ia.analisar({**metrics, "taxa_prenhez": 68.0})
+    ms = (time.perf_counter() - t0) * 1000
+    checar(texto == RESPOSTA and len(srv.chamadas) == antes, f"cache por métricas normalizadas ({ms:.1f} ms)")
+
+    srv.atraso = float(os.environ["IA_TIMEOUT"]) + 1
+    t0 = time.perf_counter()
+    texto = analise_ia.analisar({**metrics, "taxa_prenhez": 90}, esperar=True)
+    s = time.perf_counter() - t0
+    checar(
+        texto == analise_ia.heuristica({**metrics, "taxa_prenhez": 90}) and s < srv.atraso,
+        f"timeout cai na heurística ({s:.1f} s)",
+    )
+    print(analise_ia.stats())
+    analise_ia.shutdown()
+    srv.shutdown()
+    sys.exit(1 if falhas else 0)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--porta", type=int, default=8089)
+    ap.add_argument("--atraso", type=float, default=0.0, help="segundos antes de responder")
+    ap.add_argument("--falhar", action="store_true", help="responde sempre 500")
+    ap.add_argument("--verificar", action="store_true", help="roda a verificação de analise_ia")
+    args = ap.parse_args()
+    if args.verificar:
+        verificar()
+        return
+    srv = criar_servidor(args.porta, args.atraso, args.falhar)
+    print(f"stub OpenAI em http://127.0.0.1:{args.porta}/v1 (atraso {args.atraso}s)")
+    srv.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
 #!/usr/bin/env bash
-# Instala o binário Tesseract OCR e dependências do Python
-apt-get update && apt-get install -y tesseract-ocr libtesseract-dev
+# Instala o Tesseract OCR (binário + headers para o tesserocr) e dependências do Python
+apt-get update && apt-get install -y tesseract-ocr tesseract-ocr-por libtesseract-dev libleptonica-dev pkg-config
 pip install -r requirements.txt